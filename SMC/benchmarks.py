@@ -0,0 +1,356 @@
+"""
+SMC V9.1 Benchmark Suite
+回测与实盘热路径的基准测试, 记录耗时与峰值内存, 结果保存为 JSON 基线:
+1. 回测: calculate_features / detect_displacement_fvgs / check_signal / run_backtest
+2. 实盘: calculate_indicators / check_structure / IncrementalIndicators.update
+3. 风控: LocalRiskManager (1万 ~ 100万条交易历史)
+数据集: 仓库自带的全部 CSV (bundled, 按标的分别计时: bundled_BTC / bundled_ETH / bundled_SOL)
+        与合成随机游走K线 (1m = 100万根, 10m = 1000万根)
+
+用法:
+    python benchmarks.py run --out baseline.json                   # bundled + 1m + 1万/10万历史
+    python benchmarks.py run --sizes bundled 1m 10m --history 10k 100k 1m --out full.json
+    python benchmarks.py compare baseline.json current.json --threshold 0.2
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+import live_fvg_monitor as live
+import manual_fvg_v9_1_killzones as v91
+from fvg_store import ActiveFVGStore
+from incremental_indicators import IncrementalIndicators
+from numba_kernel import NUMBA_AVAILABLE
+from portfolio_backtest import PORTFOLIO_FILES
+from trade_store import TradeStore
+
+SIZES = {'1m': 1_000_000, '10m': 10_000_000}
+HISTORY_SIZES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+CHECK_SIGNAL_CALLS = 20_000
+LIVE_SCANS = 1_000
+INCREMENTAL_BARS = 1_000_000
+RISK_QUERIES = 1_000
+
+# ==========================================
+# 1. 计时与内存
+# ==========================================
+
+def measure(fn, repeat=3, memory=True):
+    """
+    返回 {'seconds': 最快一次耗时, 'peak_mb': tracemalloc 峰值 (单独运行一次, 不计入耗时)}
+    fn 每次调用都应从相同状态开始
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - started)
+
+    result = {'seconds': best}
+    if memory:
+        tracemalloc.start()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                fn()
+            result['peak_mb'] = tracemalloc.get_traced_memory()[1] / 2**20
+        finally:
+            tracemalloc.stop()
+    return result
+
+# ==========================================
+# 2. 数据集
+# ==========================================
+
+def synthetic_ohlc(n, seed=7):
+    """合成 15m 随机游走K线 (厚尾收益, 保证有足够的大K线与 FVG)"""
+    rng = np.random.default_rng(seed)
+    returns = rng.standard_t(3, n) * 0.002
+    close = 30000.0 * np.exp(np.cumsum(returns))
+    open_ = np.empty(n)
+    open_[0] = close[0]
+    open_[1:] = close[:-1]
+    wick = np.abs(rng.normal(0, 0.001, (2, n))) * close
+    high = np.maximum(open_, close) + wick[0]
+    low = np.minimum(open_, close) - wick[1]
+    index = pd.date_range("2020-01-01", periods=n, freq="15min", tz="UTC", name="timestamp")
+    return pd.DataFrame({'open': open_, 'high': high, 'low': low, 'close': close,
+                         'volume': rng.uniform(1, 100, n)}, index=index)
+
+
+def iter_datasets(name):
+    """
+    逐个产出 (标签, K线): bundled 展开为仓库自带的每个标的 CSV (bundled_<symbol>),
+    合成数据集只有一个; 逐个加载, 同一时间只持有一份数据
+    """
+    if name == 'bundled':
+        for symbol, path in PORTFOLIO_FILES.items():
+            yield f"bundled_{symbol}", v91.load_data(path).copy()
+        return
+    yield name, synthetic_ohlc(SIZES[name])
+
+
+def to_ohlcv_rows(df):
+    ts = np.asarray((df.index - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(milliseconds=1))
+    cols = [df[c].to_numpy(dtype=float).tolist() for c in ('open', 'high', 'low', 'close', 'volume')]
+    return [[int(t), o, h, l, c, v] for t, o, h, l, c, v in zip(ts.tolist(), *cols)]
+
+# ==========================================
+# 3. 基准项
+# ==========================================
+
+def bench_backtest(name, raw):
+    results = {}
+    n = len(raw)
+    with contextlib.redirect_stdout(io.StringIO()):
+        features = v91.calculate_features(raw.copy())
+        fvgs = v91.detect_displacement_fvgs(features) if n else []
+
+    results['calculate_features'] = measure(lambda: v91.calculate_features(raw.copy()))
+    results['detect_displacement_fvgs'] = measure(lambda: v91.detect_displacement_fvgs(features))
+
+    calls = min(CHECK_SIGNAL_CALLS, max(0, n - 201))
+
+    def run_check_signal():
+        store = ActiveFVGStore([f.copy() for f in fvgs])
+        for i in range(200, 200 + calls):
+            v91.check_signal(i, features, store)
+
+    r = measure(run_check_signal)
+    r['per_call_us'] = r['seconds'] / max(calls, 1) * 1e6
+    results['check_signal'] = r
+
+    results['run_backtest[numpy]'] = measure(lambda: v91.run_backtest(features, backend='numpy'), repeat=1)
+    if NUMBA_AVAILABLE:
+        with contextlib.redirect_stdout(io.StringIO()):
+            v91.run_backtest(features.iloc[:5000], backend='numba')  # 预编译 (不计时, 不输出)
+        results['run_backtest[numba]'] = measure(lambda: v91.run_backtest(features, backend='numba'),
+                                                 repeat=1)
+    return {f"{name}/{k}": dict(v, bars=n) for k, v in results.items()}
+
+
+def bench_live(name, raw):
+    results = {}
+    window = raw.iloc[-live.LIMIT:][['open', 'high', 'low', 'close', 'volume']]
+    rows = to_ohlcv_rows(raw.iloc[-min(len(raw), INCREMENTAL_BARS):])
+
+    def scan_frames():
+        for _ in range(LIVE_SCANS):
+            live.calculate_indicators(window.copy())
+
+    r = measure(scan_frames)
+    r['per_call_us'] = r['seconds'] / LIVE_SCANS * 1e6
+    results['calculate_indicators'] = r
+
+    frame = live.calculate_indicators(window.copy())
+
+    def structure():
+        for _ in range(LIVE_SCANS):
+            live.check_structure(frame)
+
+    r = measure(structure)
+    r['per_call_us'] = r['seconds'] / LIVE_SCANS * 1e6
+    results['check_structure'] = r
+
+    def incremental():
+        state = IncrementalIndicators(live.SMA_PERIOD, live.ATR_PERIOD)
+        state.warm_up(rows)
+
+    r = measure(incremental, repeat=1)
+    r['per_call_us'] = r['seconds'] / max(len(rows), 1) * 1e6
+    r['bars'] = len(rows)
+    results['incremental_update'] = r
+    return {f"{name}/{k}": v for k, v in results.items()}
+
+
+def build_history(path, n, seed=11):
+    """生成 n 条已平仓交易 + 10 笔持仓的交易库"""
+    rng = np.random.default_rng(seed)
+    start = int(datetime(2020, 1, 1, tzinfo=timezone.utc).timestamp() * 1000)
+    results = rng.choice(['WIN', 'LOSS', 'BE'], size=n, p=[0.5, 0.3, 0.2])
+    store = TradeStore(path)
+    rows = []
+    for k in range(n + 10):
+        t = start + k * 15 * 60 * 1000
+        iso = datetime.fromtimestamp(t / 1000, tz=timezone.utc).isoformat()
+        closed = k < n
+        rows.append(('ETH/USDT', iso, t, 'LONG', 100.0, 99.0, 102.0,
+                     'CLOSED' if closed else 'OPEN', results[k] if closed else 'PENDING'))
+    with store.conn:
+        store.conn.executemany(
+            "INSERT INTO trades (symbol, time, time_ms, type, entry, sl, tp, status, result) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+        )
+    store.close()
+    return start + (n + 10) * 15 * 60 * 1000
+
+
+def bench_risk(label, n):
+    results = {}
+    workdir = tempfile.mkdtemp(prefix="smc_bench_")
+    try:
+        db = os.path.join(workdir, "trades.db")
+        end_ms = build_history(db, n)
+        live.set_clock(lambda: datetime.fromtimestamp(end_ms / 1000, tz=timezone.utc))
+        missing_json = os.path.join(workdir, "none.json")
+
+        results['risk_manager_init'] = measure(lambda: live.LocalRiskManager(db, missing_json))
+        mgr = live.LocalRiskManager(db, missing_json)
+
+        def stats():
+            for _ in range(RISK_QUERIES):
+                mgr.get_risk_info(100.0, 99.0)
+
+        r = measure(stats)
+        r['per_call_us'] = r['seconds'] / RISK_QUERIES * 1e6
+        results['risk_info'] = r
+
+        # 持仓结算: 10 笔持仓 x 250 根未触及的K线 (只评估, 不平仓)
+        candles = [[end_ms + k * 900_000, 100.0, 100.5, 99.5, 100.0, 1.0] for k in range(live.LIMIT)]
+
+        def resolve():
+            for t in mgr.open_positions.values():
+                t['last_bar_ms'] = None
+            mgr.resolve_open_trades('ETH/USDT', candles)
+
+        results['resolve_open_trades'] = measure(resolve)
+    finally:
+        live.set_clock(None)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {f"history_{label}/{k}": dict(v, trades=n) for k, v in results.items()}
+
+# ==========================================
+# 4. 运行 / 对比
+# ==========================================
+
+def run(sizes, histories, only=None):
+    report = {
+        'meta': {
+            'created': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'numba': NUMBA_AVAILABLE,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+        },
+        'results': {},
+    }
+    results = report['results']
+
+    for size in sizes:
+        for name, raw in iter_datasets(size):
+            print(f"[基准] 数据集 {name} ...")
+            if not only or 'backtest' in only:
+                results.update(bench_backtest(name, raw))
+            if not only or 'live' in only:
+                results.update(bench_live(name, raw))
+            del raw
+
+    if not only or 'risk' in only:
+        for label in histories:
+            print(f"[基准] 交易历史 {label} ...")
+            results.update(bench_risk(label, HISTORY_SIZES[label]))
+
+    return report
+
+
+def print_report(report):
+    print(f"\n{'基准项':<48}{'耗时(s)':>12}{'单次(µs)':>12}{'峰值(MB)':>12}")
+    for name, r in report['results'].items():
+        per_call = f"{r['per_call_us']:.1f}" if 'per_call_us' in r else '-'
+        peak = f"{r['peak_mb']:.1f}" if 'peak_mb' in r else '-'
+        print(f"{name:<48}{r['seconds']:>12.4f}{per_call:>12}{peak:>12}")
+
+
+def compare(baseline, current, threshold=0.2, mem_threshold=0.2, min_seconds=0.005):
+    """
+    对比两份结果, 返回 (行列表, 是否存在退化)
+    耗时增加超过 threshold 或峰值内存增加超过 mem_threshold 视为退化
+    (基线耗时低于 min_seconds 的项噪声太大, 只报告不判定)
+    """
+    rows = []
+    regressed = False
+    base, cur = baseline['results'], current['results']
+    for name in sorted(set(base) | set(cur)):
+        if name not in base or name not in cur:
+            rows.append((name, None, None, 'missing' if name in base else 'new'))
+            continue
+        b, c = base[name], cur[name]
+        ratio = c['seconds'] / b['seconds'] if b['seconds'] > 0 else float('inf')
+        mem_ratio = None
+        if b.get('peak_mb') and c.get('peak_mb') is not None:
+            mem_ratio = c['peak_mb'] / b['peak_mb']
+
+        status = 'ok'
+        if b['seconds'] >= min_seconds and ratio > 1 + threshold:
+            status = 'SLOWER'
+        if mem_ratio is not None and b['peak_mb'] >= 1 and mem_ratio > 1 + mem_threshold:
+            status = 'MORE-MEM' if status == 'ok' else status + '+MEM'
+        if status == 'ok' and b['seconds'] >= min_seconds and ratio < 1 - threshold:
+            status = 'faster'
+        regressed |= status not in ('ok', 'faster')
+        rows.append((name, ratio, mem_ratio, status))
+    return rows, regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SMC V9.1 基准测试")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_run = sub.add_parser('run', help="运行基准并保存 JSON")
+    p_run.add_argument('--sizes', nargs='+', default=['bundled', '1m'],
+                       choices=['bundled'] + list(SIZES), help="K线数据集")
+    p_run.add_argument('--history', nargs='+', default=['10k', '100k'],
+                       choices=list(HISTORY_SIZES), help="交易历史规模")
+    p_run.add_argument('--only', nargs='+', choices=['backtest', 'live', 'risk'], default=None)
+    p_run.add_argument('--out', default="benchmark_results.json", help="结果 JSON")
+
+    p_cmp = sub.add_parser('compare', help="与基线对比, 存在退化时返回码为 1")
+    p_cmp.add_argument('baseline')
+    p_cmp.add_argument('current')
+    p_cmp.add_argument('--threshold', type=float, default=0.2, help="耗时退化阈值 (0.2 = 慢 20%%)")
+    p_cmp.add_argument('--mem-threshold', type=float, default=0.2, help="内存退化阈值")
+    args = parser.parse_args()
+
+    # 基准只输出错误日志 (不写入实盘 smc_monitor.log)
+    logging.basicConfig(level=logging.ERROR)
+
+    if args.command == 'run':
+        report = run(args.sizes, args.history, args.only)
+        print_report(report)
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n[输出] 结果已写入 {args.out}")
+        return
+
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(args.current, 'r', encoding='utf-8') as f:
+        current = json.load(f)
+
+    rows, regressed = compare(baseline, current, args.threshold, args.mem_threshold)
+    print(f"{'基准项':<48}{'耗时比':>10}{'内存比':>10}  状态")
+    for name, ratio, mem_ratio, status in rows:
+        r = f"{ratio:.2f}x" if ratio is not None else '-'
+        m = f"{mem_ratio:.2f}x" if mem_ratio is not None else '-'
+        print(f"{name:<48}{r:>10}{m:>10}  {status}")
+    print(f"\n{'❌ 存在性能退化' if regressed else '✅ 无性能退化'}")
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Local OHLCV Candle Store (SMC V9.1 Live)
+每个 symbol/timeframe 一个只追加的本地K线文件, 只增量拉取上次之后的新K线 (since=):
+1. 首次启动拉取最近 keep 根; 之后每次只请求 last_ts + tf 之后的K线
+2. 停机后自动分页回补缺口 (最多回补 keep 根, 更早的K线对指标没有意义);
+   仍有未平仓持仓时从其最后评估K线之后全部回补, 缺口K线先交给调用方结算再裁剪
+3. 只持久化已收盘K线; 最新一根 (跳动中) 单独返回, 不写入文件
+4. 内存中保留最近 keep 根已收盘K线, 直接供 check_structure / 指标使用
+"""
+import os
+from collections import deque
+
+FETCH_PAGE_LIMIT = 1000  # 单次分页请求根数 (Binance 合约上限 1500)
+TAIL_BLOCK = 1 << 16
+
+
+def _parse_line(line):
+    parts = line.strip().split(',')
+    if len(parts) != 6:
+        return None
+    try:
+        return [int(parts[0])] + [float(x) for x in parts[1:]]
+    except ValueError:
+        return None
+
+
+def _read_tail_lines(path, n):
+    """从文件末尾向前读取最后 n 行 (不整文件读入)"""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        data = b''
+        while pos > 0 and data.count(b'\n') <= n:
+            step = min(TAIL_BLOCK, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+    return data.decode('utf-8', errors='ignore').splitlines()[-n:]
+
+
+class CandleStore:
+    """单个 symbol/timeframe 的只追加K线存储"""
+
+    def __init__(self, symbol, timeframe, tf_ms, root="candle_store", keep=250):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.tf_ms = tf_ms
+        self.keep = keep
+        self.path = os.path.join(root, f"{symbol.replace('/', '').replace(':', '_')}_{timeframe}.csv")
+        self.candles = deque(maxlen=keep)  # 最近 keep 根已收盘K线
+        self.forming = None
+
+        os.makedirs(root, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        """加载文件尾部; 崩溃留下的半行会被截掉"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb+') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if size:
+                f.seek(size - 1)
+                if f.read(1) != b'\n':
+                    f.seek(0)
+                    content = f.read()
+                    f.truncate(content.rfind(b'\n') + 1)
+
+        for line in _read_tail_lines(self.path, self.keep):
+            candle = _parse_line(line)
+            if candle and (not self.candles or candle[0] > self.candles[-1][0]):
+                self.candles.append(candle)
+
+    @property
+    def last_time(self):
+        return self.candles[-1][0] if self.candles else None
+
+    def append(self, closed):
+        """追加已收盘K线 (自动跳过重复与乱序), 返回实际新增的K线"""
+        new = []
+        last = self.last_time
+        for c in closed:
+            if last is None or c[0] > last:
+                new.append([int(c[0])] + [float(x) for x in c[1:6]])
+                last = c[0]
+        if not new:
+            return new
+
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(''.join(f"{c[0]},{c[1]!r},{c[2]!r},{c[3]!r},{c[4]!r},{c[5]!r}\n" for c in new))
+            f.flush()
+            os.fsync(f.fileno())
+        self.candles.extend(new)
+        return new
+
+    def _start(self, now_ms, resume_ms=None):
+        """本次同步的起点 (since, limit)"""
+        if now_ms is not None:
+            return self.backfill_start(now_ms, resume_ms), FETCH_PAGE_LIMIT
+        if self.last_time is None:
+            return None, self.keep + 1
+        return self.last_time + self.tf_ms, FETCH_PAGE_LIMIT
+
+    @staticmethod
+    def _accept(page, since, limit):
+        """过滤一页结果, 返回 (有效K线, 下一页 since 或 None)"""
+        if since is not None:
+            page = [c for c in page if c[0] >= since]
+        if not page or since is None or len(page) < limit:
+            return page, None
+        return page, page[-1][0] + 1
+
+    def _finish(self, fetched, since):
+        # 停机缺口超过内存窗口: 跳过的K线不再回补, 丢弃不连续的旧K线
+        # (请求成功后才丢弃, 请求失败时内存窗口保持不变)
+        if since is not None and self.last_time is not None and since > self.last_time + self.tf_ms:
+            self.candles.clear()
+        if not fetched:
+            # 没有新K线: 跳动中的K线沿用上次
+            return []
+        # 最后一根为跳动中的K线, 其余为已收盘
+        self.forming = fetched[-1]
+        return self.append(fetched[:-1])
+
+    def sync(self, fetch, now_ms=None, resume_ms=None):
+        """
+        增量同步
+        fetch(since, limit) -> K线列表 或 None (请求失败)
+        now_ms: 当前时间, 提供时停机缺口最多回补 keep 根
+        resume_ms: 未平仓持仓最早的已评估K线时间; 提供时该时间之后的K线全部回补
+        返回本次新增的已收盘K线列表 (可能多于内存中保留的 keep 根); 请求失败返回 None
+        """
+        start, limit = self._start(now_ms, resume_ms)
+        since = start
+        fetched = []
+        while True:
+            page = fetch(since, limit)
+            if page is None:
+                return None
+            page, since = self._accept(page, since, limit)
+            fetched.extend(page)
+            if since is None:
+                break
+        return self._finish(fetched, start)
+
+    async def sync_async(self, fetch, now_ms=None, resume_ms=None):
+        """sync 的异步版本 (fetch 为协程函数)"""
+        start, limit = self._start(now_ms, resume_ms)
+        since = start
+        fetched = []
+        while True:
+            page = await fetch(since, limit)
+            if page is None:
+                return None
+            page, since = self._accept(page, since, limit)
+            fetched.extend(page)
+            if since is None:
+                break
+        return self._finish(fetched, start)
+
+    def push(self, closed, forming=None, allow_gap=False):
+        """
+        流式推送一根刚收盘的K线
+        返回新增K线列表 (重复推送为空列表); 与本地库不连续时返回 None (需 REST 回补)
+        allow_gap=True: 回补后仍不连续 (交易所本身缺K线) 时直接追加
+        """
+        last = self.last_time
+        if last is not None and closed[0] <= last:
+            return []
+        if not allow_gap and (last is None or closed[0] != last + self.tf_ms):
+            return None
+        new = self.append([closed])
+        if forming is None:
+            c = float(closed[4])
+            forming = [closed[0] + self.tf_ms, c, c, c, c, 0.0]
+        self.forming = forming
+        return new
+
+    def backfill_start(self, now_ms, resume_ms=None):
+        """
+        停机过久时, 只需回补最近 keep 根
+        resume_ms 不为 None (仍有持仓需按K线路径结算) 时, 从 resume_ms 之后第一根起回补
+        """
+        earliest = now_ms - (self.keep + 1) * self.tf_ms
+        if resume_ms is not None:
+            earliest = min(earliest, resume_ms + 1)
+        if self.last_time is None or self.last_time < earliest:
+            return earliest
+        return self.last_time + self.tf_ms
+
+    def tail(self, n=None):
+        """最近 n 根已收盘K线 [[ts, o, h, l, c, v], ...]"""
+        candles = list(self.candles)
+        return candles if n is None else candles[-n:]
+
+    def window(self, n):
+        """最近 n-1 根已收盘K线 + 跳动中的K线 (与 fetch_ohlcv(limit=n) 的形状一致)"""
+        if self.forming is None:
+            return None
+        return self.tail(n - 1) + [self.forming]
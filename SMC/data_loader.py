@@ -0,0 +1,199 @@
+"""
+OHLC Data Loader (V9.1)
+历史K线 CSV (BTC/ETH/SOL_15m_Real.csv, Binance open_time 导出) 的快速列式加载:
+1. 只读取需要的列, 显式 dtype, 固定格式解析时间戳 (失败时回退通用解析)
+2. 可选 float32 价格列, 大样本下内存减半
+3. 首次加载后转换为每列一个 .npy 的二进制目录, 之后以 mmap 方式近乎瞬时加载
+   (源 CSV 的大小/修改时间变化时自动重新转换)
+4. 分块读取 (iter_ohlc_chunks): 流式回测只持有一块数据, 不整体读入内存
+5. 按需 mmap 列访问 (open_ohlc_columns): 子周期K线只切片读取需要的区间
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from feature_cache import load_frame, save_frame
+
+PRICE_COLUMNS = ['open', 'high', 'low', 'close']
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S%z"
+BINARY_SUFFIX = ".npycols"
+
+
+def _read_header(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.readline().strip().split(',')
+
+
+def _parse_timestamp(values):
+    """固定格式解析 '2025-10-24 00:15:00+00:00', 格式不符时回退通用解析"""
+    try:
+        return pd.to_datetime(values, format=TIMESTAMP_FORMAT)
+    except (ValueError, TypeError):
+        try:
+            return pd.to_datetime(values, format=TIMESTAMP_FORMAT[:-2])
+        except (ValueError, TypeError):
+            return pd.to_datetime(values)
+
+
+def _csv_layout(path, float32=False):
+    """CSV 列布局: 返回 read_csv 的 (usecols, dtype)"""
+    header = _read_header(path)
+    lower = {c.lower(): c for c in header}
+
+    price_dtype = np.float32 if float32 else np.float64
+    dtype = {lower[c]: price_dtype for c in PRICE_COLUMNS if c in lower}
+
+    if 'open_time' in lower:
+        time_col = lower['open_time']
+        dtype[time_col] = np.int64
+    elif 'timestamp' in lower:
+        time_col = lower['timestamp']
+    else:
+        raise ValueError(f"{path} 缺少 timestamp / open_time 列")
+
+    usecols = [time_col] + [lower[c] for c in PRICE_COLUMNS + ['volume'] if c in lower]
+    return usecols, dtype
+
+
+def _to_ohlc_frame(df):
+    """read_csv 原始列 -> 以 'timestamp' 为索引的 OHLC DataFrame"""
+    df.columns = [c.lower() for c in df.columns]
+
+    if 'open_time' in df.columns:
+        index = pd.to_datetime(df.pop('open_time'), unit='ms')
+    else:
+        index = _parse_timestamp(df.pop('timestamp'))
+
+    df.index = pd.DatetimeIndex(index, name='timestamp')
+
+    return df[[c for c in PRICE_COLUMNS + ['volume'] if c in df.columns]]
+
+
+def read_ohlc_csv(path, float32=False):
+    """
+    读取 OHLC CSV, 返回以 'timestamp' 为索引的 DataFrame
+    支持 'timestamp' 字符串列与 Binance 'open_time' (毫秒) 列
+    """
+    usecols, dtype = _csv_layout(path, float32)
+    df = pd.read_csv(path, usecols=usecols, dtype=dtype, engine='c')
+    return _to_ohlc_frame(df)
+
+
+def binary_path(path, float32=False):
+    """CSV 对应的二进制列目录"""
+    suffix = "-f32" + BINARY_SUFFIX if float32 else BINARY_SUFFIX
+    return os.path.splitext(path)[0] + suffix
+
+
+def _source_stamp(path):
+    st = os.stat(path)
+    return {'source_size': st.st_size, 'source_mtime_ns': st.st_mtime_ns}
+
+
+def convert_to_binary(path, float32=False, out_dir=None):
+    """CSV -> 每列一个 .npy 的二进制目录, 返回 (DataFrame, 目录)"""
+    out_dir = out_dir or binary_path(path, float32)
+    df = read_ohlc_csv(path, float32=float32)
+    save_frame(df, out_dir)
+    with open(os.path.join(out_dir, "source.json"), 'w', encoding='utf-8') as f:
+        json.dump(_source_stamp(path), f)
+    return df, out_dir
+
+
+def _binary_is_fresh(path, out_dir):
+    stamp_path = os.path.join(out_dir, "source.json")
+    if not os.path.exists(stamp_path):
+        return False
+    with open(stamp_path, 'r', encoding='utf-8') as f:
+        return json.load(f) == _source_stamp(path)
+
+
+def load_ohlc(path, float32=False, use_binary=True):
+    """
+    加载 OHLC 数据
+    use_binary=True: 优先从二进制列目录 mmap 加载, 过期或不存在时从 CSV 转换一次
+    """
+    if not use_binary:
+        return read_ohlc_csv(path, float32=float32)
+
+    out_dir = binary_path(path, float32)
+    if _binary_is_fresh(path, out_dir):
+        try:
+            df = load_frame(out_dir)
+            if df is not None:
+                return df
+        except Exception as e:
+            print(f"[数据] 二进制缓存损坏, 重新转换: {e}")
+
+    try:
+        df, _ = convert_to_binary(path, float32=float32, out_dir=out_dir)
+    except OSError as e:
+        print(f"[数据] 二进制转换失败 (回退 CSV): {e}")
+        df = read_ohlc_csv(path, float32=float32)
+    return df
+
+
+def _open_binary(out_dir):
+    """二进制列目录 -> (meta, 时间索引 mmap, {列名: mmap}), 不读入任何数据"""
+    with open(os.path.join(out_dir, "meta.json"), 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    index = np.load(os.path.join(out_dir, "__index__.npy"), mmap_mode='r')
+    data = {col: np.load(os.path.join(out_dir, f"{col}.npy"), mmap_mode='r')
+            for col in meta['columns']}
+    return meta, index, data
+
+
+def open_ohlc_columns(path, float32=False):
+    """
+    以 mmap 打开 OHLC 列 (二进制目录过期或不存在时先从 CSV 转换一次)
+    返回 (meta, 时间索引, {列名: 数组}); 时间索引为去掉时区后的 datetime64, 时区见 meta['tz']
+    只有被切片访问的页才会读入内存 (子周期K线按需加载用)
+    """
+    out_dir = binary_path(path, float32)
+    if not (_binary_is_fresh(path, out_dir) and os.path.exists(os.path.join(out_dir, "meta.json"))):
+        convert_to_binary(path, float32=float32, out_dir=out_dir)
+    return _open_binary(out_dir)
+
+
+def _iter_binary_chunks(out_dir, chunk_size, start):
+    """二进制列目录按 mmap 切片分块 (时间索引也按块读取)"""
+    meta, index, data = _open_binary(out_dir)
+
+    for lo in range(start, len(index), chunk_size):
+        hi = lo + chunk_size
+        chunk_index = pd.DatetimeIndex(np.array(index[lo:hi]), name=meta['index_name'])
+        if meta['tz']:
+            chunk_index = chunk_index.tz_localize(meta['tz'])
+        yield pd.DataFrame({col: np.array(data[col][lo:hi]) for col in meta['columns']},
+                           index=chunk_index)
+
+
+def iter_ohlc_chunks(path, chunk_size, start=0, float32=False, use_binary=True):
+    """
+    按固定K线数分块读取 OHLC (从第 start 根开始), 每块为与 load_ohlc 格式一致的 DataFrame
+    有最新的二进制列目录时按 mmap 切片, 否则分块解析 CSV (不做整文件二进制转换)
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size 必须为正整数")
+
+    out_dir = binary_path(path, float32)
+    if use_binary and _binary_is_fresh(path, out_dir) and \
+            os.path.exists(os.path.join(out_dir, "meta.json")):
+        yield from _iter_binary_chunks(out_dir, chunk_size, start)
+        return
+
+    usecols, dtype = _csv_layout(path, float32)
+    skipped = 0
+    reader = pd.read_csv(path, usecols=usecols, dtype=dtype, engine='c', chunksize=chunk_size)
+    with reader:
+        for raw in reader:
+            # 从第 start 根开始: 之前的块只解析不保留
+            if skipped + len(raw) <= start:
+                skipped += len(raw)
+                continue
+            if skipped < start:
+                raw = raw.iloc[start - skipped:]
+                skipped = start
+            yield _to_ohlc_frame(raw)
@@ -0,0 +1,224 @@
+"""
+Array Execution Engine (V9.1)
+基于纯 NumPy 数组 (high/low/atr) 的回测撮合, 替代 run_backtest 中逐根 df.iloc:
+1. 信号匹配: ActiveFVGStore 二分查找首个被触及的 FVG
+2. 持仓模拟: 对前向窗口做向量化 "首次触及" 搜索 (SL -> TP -> BE 触发)
+规则与 run_backtest 完全一致: 同一根K线先判止损, 再判止盈, 最后才激活保本
+"""
+import numpy as np
+
+from fvg_store import ActiveFVGStore
+from instrumentation import stage
+from records import Direction, Result, TradeRecord
+
+SEARCH_WINDOW = 256  # 首次触及搜索的初始窗口 (按需倍增)
+
+
+def _first_true(mask):
+    """返回布尔数组中第一个 True 的位置, 不存在返回 len(mask)"""
+    k = int(mask.argmax())
+    if mask[k]:
+        return k
+    return len(mask)
+
+
+def _first_event(highs, lows, start, is_long, stop, tp, be_trigger):
+    """
+    从 start 开始搜索第一个事件K线
+    返回 (j, event): event 为 'SL' / 'TP' / 'BE', 无事件返回 (None, None)
+    be_trigger=None 表示已处于保本阶段, 不再搜索保本触发
+    """
+    n = len(highs)
+    lo = start
+    width = SEARCH_WINDOW
+
+    # 止盈与保本触发在同一侧: 只需搜索较近的那个价位, 命中后再按标量区分
+    if is_long:
+        target = tp if be_trigger is None else min(tp, be_trigger)
+    else:
+        target = tp if be_trigger is None else max(tp, be_trigger)
+
+    while lo < n:
+        hi = min(n, lo + width)
+        h = highs[lo:hi]
+        l = lows[lo:hi]
+
+        if is_long:
+            hit = (l <= stop) | (h >= target)
+        else:
+            hit = (h >= stop) | (l <= target)
+
+        k = _first_true(hit)
+        if k < len(hit):
+            # 同一根K线的优先级: 止损 > 止盈 > 保本触发
+            hk, lk = h[k], l[k]
+            if (lk <= stop) if is_long else (hk >= stop):
+                return lo + k, 'SL'
+            if (hk >= tp) if is_long else (lk <= tp):
+                return lo + k, 'TP'
+            return lo + k, 'BE'
+
+        lo = hi
+        width *= 2
+
+    return None, None
+
+
+def resume_trade(highs, lows, start, direction, entry, sl, tp, be_trigger, be_active=False):
+    """
+    从第 start 根K线继续模拟一笔持仓 (可分段调用: 实盘每次只传入新收盘的K线)
+    direction: Direction; be_active: 之前的K线是否已激活保本 (止损已移至入场价)
+    返回 (outcome, exit_idx, be_active): outcome 为 Result (WIN / LOSS / BE / RUNNING),
+    RUNNING 时 exit_idx 为 None, be_active 为截至最后一根K线的保本状态
+    """
+    is_long = direction == Direction.LONG
+
+    if not be_active:
+        j, event = _first_event(highs, lows, start, is_long, sl, tp, be_trigger)
+        if j is None:
+            return Result.RUNNING, None, False
+        if event == 'SL':
+            return Result.LOSS, j, False
+        if event == 'TP':
+            return Result.WIN, j, False
+        # 保本已激活: 从下一根K线起止损移至入场价
+        start = j + 1
+
+    j, event = _first_event(highs, lows, start, is_long, entry, tp, None)
+    if j is None:
+        return Result.RUNNING, None, True
+    if event == 'SL':
+        return Result.BE, j, True
+    return Result.WIN, j, True
+
+
+def simulate_trade(highs, lows, i, direction, entry, sl, tp, be_trigger):
+    """
+    模拟第 i 根K线入场的持仓 (持仓不受时间限制)
+    返回 (outcome, exit_idx): outcome 为 Result
+    """
+    outcome, j, _ = resume_trade(highs, lows, i + 1, direction, entry, sl, tp, be_trigger)
+    if j is None:
+        return outcome, len(highs) - 1
+    return outcome, j
+
+
+def trade_levels(fvg, atr_i, sl_padding_atr, target_rr, be_trigger_rr):
+    """
+    被触及的 FVG -> 交易价位 (direction, entry, sl, tp, be_trigger), direction 为 Direction
+    风险为 0 (入场价 = 止损价) 时返回 None
+    """
+    direction = fvg.direction
+    if direction == Direction.LONG:
+        entry = fvg.top
+        sl = fvg.bottom - (sl_padding_atr * atr_i)
+    else:
+        entry = fvg.bottom
+        sl = fvg.top + (sl_padding_atr * atr_i)
+
+    risk = abs(entry - sl)
+    if risk == 0:
+        return None
+
+    if direction == Direction.LONG:
+        tp = entry + (risk * target_rr)
+        be_trigger = entry + (risk * be_trigger_rr)
+    else:
+        tp = entry - (risk * target_rr)
+        be_trigger = entry - (risk * be_trigger_rr)
+    return direction, entry, sl, tp, be_trigger
+
+
+def trade_pnl(outcome, risk_amt, target_rr):
+    """平仓盈亏: Win = +target_rr R, Loss = -1R, BE = 0"""
+    if outcome == Result.WIN:
+        return risk_amt * target_rr
+    if outcome == Result.LOSS:
+        return -risk_amt
+    return 0.0
+
+
+def run_backtest_arrays(highs, lows, atr, fvgs, initial_capital, risk_per_trade,
+                        target_rr, be_trigger_rr, sl_padding_atr, first_bar=200, last_bar=None,
+                        fill_model=None):
+    """
+    数组版回测主循环
+    first_bar / last_bar: 只在 [first_bar, last_bar) 内入场 (滚动窗口分析), 持仓按全部K线结算
+    fill_model: 可选成交模型 (如 intrabar_fill.IntrabarModel), 提供
+        simulate(highs, lows, i, direction, entry, sl, tp, be_trigger, atr_i) -> (outcome, exit_idx),
+        outcome 为 None 表示限价单未成交 (FVG 保持有效); 为 None 时使用整根K线规则 simulate_trade
+    返回 (trades, capital): trades 为 TradeRecord 列表, capital 为 float
+    """
+    highs = np.asarray(highs, dtype=np.float64)
+    lows = np.asarray(lows, dtype=np.float64)
+    atr = np.asarray(atr, dtype=np.float64)
+    n = len(highs)
+
+    # 标量访问走 Python list, 避免逐根构造 NumPy 标量
+    high_list = highs.tolist()
+    low_list = lows.tolist()
+    atr_list = atr.tolist()
+
+    store = fvgs if isinstance(fvgs, ActiveFVGStore) else ActiveFVGStore(fvgs)
+
+    trades = []
+    capital = float(initial_capital)
+    i = max(200, first_bar)
+    end = n - 1 if last_bar is None else min(n - 1, last_bar)
+
+    # ATR 无效的K线不会产生信号: 预先换成永远触及不到的价格, 扫描时少一次掩码运算
+    valid_atr = ~np.isnan(atr)
+    scan_lows = np.where(valid_atr, lows, np.inf)
+    scan_highs = np.where(valid_atr, highs, -np.inf)
+
+    # 计时器在循环外取一次 (未启用时为共享空上下文)
+    scan_timer = stage("signal_scan")
+    simulation_timer = stage("trade_simulation")
+
+    while i < end:
+        # 活跃集合不变的区间内, 向量化跳过不可能触及任何 FVG 的K线
+        store.advance(i)
+        stop = min(end, store.next_change())
+        max_top, min_bottom = store.bounds()
+        touch = (scan_lows[i:stop] <= max_top) | (scan_highs[i:stop] >= min_bottom)
+        k = _first_true(touch)
+        if k == len(touch):
+            i = stop
+            continue
+        i += k
+
+        atr_i = atr_list[i]
+        with scan_timer:
+            fvg = store.first_touched(i, low_list[i], high_list[i])
+        if fvg is None:
+            i += 1
+            continue
+
+        levels = trade_levels(fvg, atr_i, sl_padding_atr, target_rr, be_trigger_rr)
+        if levels is None:
+            i += 1
+            continue
+        direction, entry, sl, tp, be_trigger = levels
+
+        risk_amt = capital * risk_per_trade
+
+        with simulation_timer:
+            if fill_model is None:
+                outcome, j = simulate_trade(highs, lows, i, direction, entry, sl, tp, be_trigger)
+            else:
+                outcome, j = fill_model.simulate(highs, lows, i, direction, entry, sl, tp,
+                                                 be_trigger, atr_i)
+        if outcome is None:
+            i += 1
+            continue
+        store.mitigate(fvg)
+
+        if outcome != Result.RUNNING:
+            pnl = trade_pnl(outcome, risk_amt, target_rr)
+            capital += pnl
+            trades.append(TradeRecord(i, j, direction, outcome, entry, sl, tp, pnl, capital))
+            i = j
+
+        i += 1
+
+    return trades, capital
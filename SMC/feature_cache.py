@@ -0,0 +1,138 @@
+"""
+Feature Cache (V9.1)
+把 "读取 CSV + 解析时间 + 计算特征" 的结果缓存到磁盘 (每列一个 .npy):
+- 缓存键 = 源文件内容哈希 + SMA_PERIOD / ATR_PERIOD + FVG 标记参数 (动能阈值 / Killzone) + 格式版本
+- CSV 内容变化或指标参数变化时自动失效, 同一文件的旧缓存会被清理
+- 列以 mmap 方式加载, 参数扫描 / 反复研究时几乎零启动成本
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+
+import numpy as np
+import pandas as pd
+
+CACHE_DIR = ".feature_cache"
+FORMAT_VERSION = 2  # v2: 特征帧含信号流水线的 in_kz / fvg 列
+HASH_CHUNK = 1 << 20
+KEY_DIGEST_SIZE = 12  # 缓存键为 2 * KEY_DIGEST_SIZE 位小写十六进制
+
+
+def file_hash(path):
+    """源文件内容哈希 (blake2b, 分块读取)"""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def cache_key(path, sma_period, atr_period, signal_params=()):
+    """缓存键: 文件哈希 + 指标参数 + FVG 标记参数 + 格式版本"""
+    raw = f"{file_hash(path)}|sma={sma_period}|atr={atr_period}|sig={tuple(signal_params)}|v={FORMAT_VERSION}"
+    return hashlib.blake2b(raw.encode('utf-8'), digest_size=KEY_DIGEST_SIZE).hexdigest()
+
+
+def _entry_prefix(path):
+    return os.path.splitext(os.path.basename(path))[0] + "-"
+
+
+def save_frame(df, entry_dir):
+    """把特征帧按列写成 .npy + meta.json"""
+    tmp_dir = entry_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    index = df.index
+    tz = str(index.tz) if getattr(index, 'tz', None) is not None else None
+    index_values = index.tz_localize(None) if tz else index
+    np.save(os.path.join(tmp_dir, "__index__.npy"), np.asarray(index_values))
+
+    for col in df.columns:
+        np.save(os.path.join(tmp_dir, f"{col}.npy"), df[col].to_numpy())
+
+    meta = {
+        'format_version': FORMAT_VERSION,
+        'columns': list(df.columns),
+        'index_name': index.name,
+        'tz': tz,
+    }
+    with open(os.path.join(tmp_dir, "meta.json"), 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+
+    # 整目录替换, 写到一半崩溃不会留下半成品缓存
+    shutil.rmtree(entry_dir, ignore_errors=True)
+    os.replace(tmp_dir, entry_dir)
+
+
+def load_frame(entry_dir, mmap=True):
+    """从缓存目录恢复特征帧, 缓存不存在或版本不符返回 None"""
+    meta_path = os.path.join(entry_dir, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get('format_version') != FORMAT_VERSION:
+        return None
+
+    mode = 'c' if mmap else None  # copy-on-write: 修改只影响内存
+    index = pd.DatetimeIndex(np.load(os.path.join(entry_dir, "__index__.npy")),
+                             name=meta['index_name'])
+    if meta['tz']:
+        index = index.tz_localize(meta['tz'])
+
+    data = {col: np.load(os.path.join(entry_dir, f"{col}.npy"), mmap_mode=mode)
+            for col in meta['columns']}
+    return pd.DataFrame(data, index=index, columns=meta['columns'], copy=False)
+
+
+def default_cache_dir(path):
+    """缓存目录默认放在数据文件旁边"""
+    return os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIR)
+
+
+def prune_stale(path, keep_key, cache_dir):
+    """
+    删除同一源文件的旧缓存
+    只匹配 "<文件名>-<缓存键>" 格式的目录 (不误删同前缀的其他数据文件的缓存或 .tmp 半成品)
+    """
+    if not os.path.isdir(cache_dir):
+        return
+    pattern = re.compile(re.escape(_entry_prefix(path)) + f"([0-9a-f]{{{2 * KEY_DIGEST_SIZE}}})")
+    for name in os.listdir(cache_dir):
+        match = pattern.fullmatch(name)
+        if match and match.group(1) != keep_key:
+            shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+
+
+def load_cached_features(path, build, sma_period, atr_period, cache_dir=None, signal_params=()):
+    """
+    带缓存的特征加载
+    build(path) -> DataFrame: 缓存未命中时调用 (读取 + 计算特征)
+    signal_params: 影响 fvg 列的参数 (动能阈值, Killzone 区间), 变化时缓存失效
+    """
+    cache_dir = cache_dir or default_cache_dir(path)
+    key = cache_key(path, sma_period, atr_period, signal_params)
+    entry_dir = os.path.join(cache_dir, _entry_prefix(path) + key)
+
+    try:
+        df = load_frame(entry_dir)
+    except Exception as e:
+        print(f"[缓存] 读取失败, 重新计算: {e}")
+        df = None
+
+    if df is not None:
+        print(f"[缓存] 命中特征缓存 {entry_dir}")
+        return df
+
+    print("[预处理] 计算特征...")
+    df = build(path)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        save_frame(df, entry_dir)
+        prune_stale(path, key, cache_dir)
+    except OSError as e:
+        print(f"[缓存] 写入失败 (不影响回测): {e}")
+    return df
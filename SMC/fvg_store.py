@@ -0,0 +1,190 @@
+"""
+Active FVG Store (V9.1)
+只保留 "活跃窗口" 内的 FVG (records.FVGZone), 替代 check_signal 中对全量 fvgs 列表的线性扫描:
+1. 按 created_at 先进先出过期 (超过 max_age 根K线)
+2. 被吃掉 (mitigated) 的 FVG 立即移出
+3. Bullish / Bearish 各一棵按创建顺序排列的线段树 (节点存子区间 top 最大值 / bottom 最小值),
+   自根向下找最左的被触及槽位 = 最早创建的被触及 FVG, 每根K线 O(log n)
+"""
+from records import Direction, FVGStatus
+
+FVG_MAX_AGE = 200  # 与 check_signal 中的 200 根K线寿命一致
+
+_EMPTY = float('-inf')
+
+
+class _SlotTree:
+    """
+    按插入顺序编号的槽位上的 max 线段树
+    支持 追加 / 清空单个槽位 / 查找最左侧值 >= x 的槽位, 均为 O(log n)
+    槽位全部用完时压缩掉已清空的槽位 (内存只与活跃 FVG 数有关)
+    """
+
+    def __init__(self):
+        self.size = 1
+        self.tree = [_EMPTY, _EMPTY]
+        self.items = []   # 槽位 -> FVG (已清空为 None)
+        self.slots = {}   # created_at -> 槽位
+        self.head = 0     # 此前的槽位全部已清空
+
+    def __len__(self):
+        return len(self.slots)
+
+    def top(self):
+        return self.tree[1]
+
+    def _set(self, pos, value):
+        node = pos + self.size
+        tree = self.tree
+        tree[node] = value
+        node >>= 1
+        while node:
+            left, right = tree[2 * node], tree[2 * node + 1]
+            tree[node] = left if left >= right else right
+            node >>= 1
+
+    def _rebuild(self):
+        """压缩已清空的槽位, 必要时容量翻倍"""
+        live = [(self.tree[self.size + pos], item)
+                for pos, item in enumerate(self.items[self.head:], self.head) if item is not None]
+        while self.size < 2 * (len(live) + 1):
+            self.size *= 2
+        tree = [_EMPTY] * (2 * self.size)
+        for pos, (value, _) in enumerate(live):
+            tree[self.size + pos] = value
+        for node in range(self.size - 1, 0, -1):
+            tree[node] = max(tree[2 * node], tree[2 * node + 1])
+        self.tree = tree
+        self.items = [item for _, item in live]
+        self.slots = {item.created_at: pos for pos, item in enumerate(self.items)}
+        self.head = 0
+
+    def append(self, value, item):
+        if len(self.items) == self.size:
+            self._rebuild()
+        pos = len(self.items)
+        self.items.append(item)
+        self.slots[item.created_at] = pos
+        self._set(pos, value)
+
+    def discard(self, created_at):
+        pos = self.slots.pop(created_at, None)
+        if pos is None:
+            return False
+        self.items[pos] = None
+        self._set(pos, _EMPTY)
+        while self.head < len(self.items) and self.items[self.head] is None:
+            self.head += 1
+        return True
+
+    def first_at_least(self, x):
+        """最左侧值 >= x 的槽位上的 FVG, 不存在 (或 x 为 NaN) 返回 None"""
+        tree = self.tree
+        if not tree[1] >= x:
+            return None
+        node = 1
+        while node < self.size:
+            node *= 2
+            if not tree[node] >= x:
+                node += 1
+        return self.items[node - self.size]
+
+
+class ActiveFVGStore:
+    """活跃 FVG 索引 (要求查询的 K 线序号 i 单调递增)"""
+
+    def __init__(self, fvgs, max_age=FVG_MAX_AGE):
+        # detect_displacement_fvgs 输出已按 created_at 升序
+        self._pending = sorted(fvgs, key=lambda f: f.created_at)
+        self._next = 0
+        self.max_age = max_age
+
+        self._live = []       # 按创建顺序排列的已纳入 FVG (含已移出的, 过期时跳过)
+        self._head = 0
+        self._bull = _SlotTree()   # 值为 top: 被触及 <=> top >= low
+        self._bear = _SlotTree()   # 值为 -bottom: 被触及 <=> -bottom >= -high
+
+    def __len__(self):
+        return len(self._bull) + len(self._bear)
+
+    def _tree(self, fvg):
+        return self._bull if fvg.direction == Direction.LONG else self._bear
+
+    def _insert(self, fvg):
+        if fvg.direction == Direction.LONG:
+            self._bull.append(fvg.top, fvg)
+        else:
+            self._bear.append(-fvg.bottom, fvg)
+        self._live.append(fvg)
+
+    def _remove(self, fvg):
+        self._tree(fvg).discard(fvg.created_at)
+
+    def extend(self, fvgs):
+        """追加新检测到的 FVG (流式回测逐块追加, created_at 须晚于已有的 FVG)"""
+        if self._next:
+            del self._pending[:self._next]  # 已纳入的不再保留, 内存只与活跃窗口有关
+            self._next = 0
+        self._pending.extend(fvgs)
+
+    def advance(self, i):
+        """推进到第 i 根K线: 纳入 created_at < i 的新 FVG，淘汰过期的旧 FVG"""
+        pending = self._pending
+        while self._next < len(pending) and pending[self._next].created_at < i:
+            fvg = pending[self._next]
+            self._next += 1
+            if fvg.status == FVGStatus.ACTIVE:
+                self._insert(fvg)
+
+        # created_at 单调递增, 过期只会发生在队头
+        live = self._live
+        while self._head < len(live) and i - live[self._head].created_at > self.max_age:
+            self._remove(live[self._head])
+            self._head += 1
+        if self._head > 64 and self._head * 2 > len(live):
+            del live[:self._head]
+            self._head = 0
+
+    def next_change(self):
+        """下一根会改变活跃集合的K线序号 (新 FVG 纳入或队头过期)"""
+        bar = float('inf')
+        if self._next < len(self._pending):
+            bar = self._pending[self._next].created_at + 1
+        if self._head < len(self._live):
+            bar = min(bar, self._live[self._head].created_at + self.max_age + 1)
+        return bar
+
+    def bounds(self):
+        """
+        返回 (最高 Bullish top, 最低 Bearish bottom)
+        K线 low > 前者且 high < 后者时不可能触及任何 FVG
+        """
+        return self._bull.top(), -self._bear.top()
+
+    def mitigate(self, fvg):
+        """标记 FVG 已被吃掉并立即移出索引"""
+        fvg.status = FVGStatus.MITIGATED
+        self._remove(fvg)
+
+    def first_touched(self, i, low, high):
+        """
+        返回第 i 根K线第一个触及的 FVG (按创建顺序, 与原线性扫描一致)
+        Bullish: low <= top;  Bearish: high >= bottom
+        """
+        self.advance(i)
+
+        while True:
+            # NaN 价格不触及任何 FVG (比较恒为 False)
+            bull = self._bull.first_at_least(low)
+            bear = self._bear.first_at_least(-high)
+            if bull is None or (bear is not None and bear.created_at < bull.created_at):
+                fvg = bear
+            else:
+                fvg = bull
+
+            if fvg is None:
+                return None
+            if fvg.status == FVGStatus.ACTIVE:
+                return fvg
+            # 外部直接改写了 mitigated 标记: 惰性清理后重新查找
+            self._remove(fvg)
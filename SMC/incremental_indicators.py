@@ -0,0 +1,244 @@
+"""
+Incremental Indicator Engine (SMC V9.1 Live)
+实盘每根收盘K线 O(1) 更新 SMA200 / ATR14, 替代每次扫描都重算整段 rolling:
+1. SMA: 收盘价滚动均值 (signal_pipeline.rolling_mean_push, 与批量内核同一实现, 逐条复刻 pandas rolling.mean)
+2. ATR: TR 滚动均值, TR = max(high-low, |high-prev_close|) (与 calculate_indicators 一致)
+3. 最近几根K线的环形缓冲 (check_structure 需要 i, i-1, i-2, 直接读取, 不构造 DataFrame)
+   Killzone 掩码与 FVG 标记在推入时用 signal_pipeline.bar_flag 一次算好, 与批量流水线同一判定
+4. 状态每 CHECKPOINT_EVERY 根K线 checkpoint 到磁盘, 重启后从 checkpoint 续算
+   (其后的K线由本地K线库补推), 无需重新预热
+
+从同一根K线开始预热时, 结果与批量 calculate_indicators 逐位一致。
+"""
+import json
+import os
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from signal_pipeline import (KZ_LONDON_START, KZ_LONDON_END, KZ_NY_START, KZ_NY_END,
+                             FVG_NONE, MEAN_STATE_SIZE, bar_flag, rolling_mean_fill,
+                             rolling_mean_push)
+
+STATE_VERSION = 3  # v3: 滚动均值状态改为 signal_pipeline 的数组格式
+CHECKPOINT_EVERY = 64  # 根K线 (须小于本地K线库保留的根数, 重启时才能补推)
+
+INDICATOR_COLUMNS = ['open', 'high', 'low', 'close', 'volume', 'trend', 'tr', 'atr', 'body_size',
+                     'in_kz', 'fvg']
+DEFAULT_KILLZONES = (KZ_LONDON_START, KZ_LONDON_END, KZ_NY_START, KZ_NY_END)
+
+
+class RollingMean:
+    """
+    固定窗口滚动均值, O(1) 更新
+    计算委托给 signal_pipeline.rolling_mean_push (与批量信号内核同一实现),
+    与 rolling(period).mean() 从同一起点计算时逐位一致
+    """
+
+    def __init__(self, period):
+        self.period = period
+        self.state = np.zeros(MEAN_STATE_SIZE)
+        self.ring = np.full(period, np.nan)  # 窗口环形缓冲
+        self.count = 0                       # 已推入个数
+        self.value = float('nan')            # 当前均值 (有效样本不足窗口长度时为 NaN)
+
+    def push(self, value):
+        """加入新值, 返回当前均值"""
+        self.value = float(rolling_mean_push(self.state, self.ring, self.count, float(value)))
+        self.count += 1
+        return self.value
+
+    def push_many(self, values):
+        """依次加入一组值, 返回对应的均值列表 (分块续算用, 整块在内核中循环)"""
+        values = np.ascontiguousarray(values, dtype=np.float64)
+        out = np.empty(len(values))
+        rolling_mean_fill(self.state, self.ring, self.count, values, out)
+        self.count += len(values)
+        if len(values):
+            self.value = float(out[-1])
+        return out.tolist()
+
+    def to_dict(self):
+        return {
+            'period': self.period,
+            'state': self.state.tolist(),
+            'ring': self.ring.tolist(),
+            'count': self.count,
+            'value': self.value,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        obj = cls(data['period'])
+        obj.state[:] = [np.nan if v is None else v for v in data['state']]
+        obj.ring[:] = [np.nan if v is None else v for v in data['ring']]
+        obj.count = data['count']
+        obj.value = float('nan') if data['value'] is None else data['value']
+        return obj
+
+
+class IncrementalIndicators:
+    """实盘增量指标状态 (只接收已收盘K线)"""
+
+    def __init__(self, sma_period=200, atr_period=14, history=3, atr_multiplier=1.0,
+                 killzones=DEFAULT_KILLZONES):
+        self.sma = RollingMean(sma_period)
+        self.atr = RollingMean(atr_period)
+        self.atr_multiplier = atr_multiplier
+        self.killzones = tuple(killzones)  # (伦敦起, 伦敦止, 纽约起, 纽约止) UTC 小时
+        self.candles = deque(maxlen=history)  # 环形缓冲: 最近几根已收盘K线 (含指标)
+        self.prev_close = None
+        self.last_time = None  # 最后一根已收盘K线的开盘时间 (ms)
+        self.count = 0
+        self.saved_count = 0   # 上次 checkpoint 时的 count
+
+    @property
+    def ready(self):
+        """SMA/ATR 均已有效, 且环形缓冲已满"""
+        if len(self.candles) < self.candles.maxlen:
+            return False
+        last = self.candles[-1]
+        return last['trend'] == last['trend'] and last['atr'] == last['atr']
+
+    def reset(self):
+        self.__init__(self.sma.period, self.atr.period, self.candles.maxlen,
+                      self.atr_multiplier, self.killzones)
+
+    def update(self, ts, o, h, l, c, v=0.0):
+        """
+        推入一根已收盘K线 (ts 为毫秒时间戳), 返回该K线的指标快照
+        时间戳不大于 last_time 的K线会被忽略 (重复推送)
+        """
+        if self.last_time is not None and ts <= self.last_time:
+            return None
+
+        trend = self.sma.push(c)
+        if self.prev_close is None or self.prev_close != self.prev_close:
+            tr = float('nan')  # 与 close.shift(1) 首行 / 缺失收盘价的 NaN 传播一致 (内置 max 会吞掉 NaN)
+        else:
+            tr = max(h - l, abs(h - self.prev_close))
+        atr = self.atr.push(tr)
+        body_size = abs(c - o)
+
+        london_start, london_end, ny_start, ny_end = self.killzones
+        hour = (ts // 3600000) % 24
+        in_kz = london_start <= hour <= london_end or ny_start <= hour <= ny_end
+        if len(self.candles) >= 2:
+            prev2 = self.candles[-2]  # 推入前的 [-2] 即第 i-2 根
+            flag = int(bar_flag(c, l, h, prev2['low'], prev2['high'], trend, atr, body_size,
+                                in_kz, self.atr_multiplier))
+        else:
+            flag = FVG_NONE
+
+        candle = {
+            'time': ts,
+            'open': o, 'high': h, 'low': l, 'close': c, 'volume': v,
+            'trend': trend,
+            'tr': tr,
+            'atr': atr,
+            'body_size': body_size,
+            'in_kz': in_kz,
+            'fvg': flag,
+        }
+        self.candles.append(candle)
+        self.prev_close = c
+        self.last_time = ts
+        self.count += 1
+        return candle
+
+    def warm_up(self, ohlcv):
+        """用一段 [ts, o, h, l, c, v] 已收盘K线预热"""
+        for row in ohlcv:
+            self.update(row[0], row[1], row[2], row[3], row[4], row[5] if len(row) > 5 else 0.0)
+
+    def frame(self, forming=None):
+        """
+        环形缓冲转为 DataFrame (列与 calculate_indicators 输出一致)
+        forming: 正在跳动的K线 [ts, o, h, l, c, v], 追加为最后一行 (指标为 NaN, 无 FVG 标记)
+        """
+        rows = list(self.candles)
+        if forming is not None:
+            o, h, l, c = forming[1], forming[2], forming[3], forming[4]
+            rows.append({
+                'time': forming[0], 'open': o, 'high': h, 'low': l, 'close': c,
+                'volume': forming[5] if len(forming) > 5 else 0.0,
+                'trend': float('nan'), 'tr': float('nan'), 'atr': float('nan'),
+                'body_size': abs(c - o), 'in_kz': False, 'fvg': FVG_NONE,
+            })
+        df = pd.DataFrame(rows, columns=['time'] + INDICATOR_COLUMNS)
+        df['time'] = pd.to_datetime(df['time'], unit='ms', utc=True)
+        df.set_index('time', inplace=True)
+        return df
+
+    # ========== checkpoint ==========
+
+    def to_dict(self):
+        return {
+            'version': STATE_VERSION,
+            'sma': self.sma.to_dict(),
+            'atr': self.atr.to_dict(),
+            'history': self.candles.maxlen,
+            'atr_multiplier': self.atr_multiplier,
+            'killzones': list(self.killzones),
+            'candles': list(self.candles),
+            'prev_close': self.prev_close,
+            'last_time': self.last_time,
+            'count': self.count,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('version') != STATE_VERSION:
+            raise ValueError(f"指标状态版本不匹配: {data.get('version')}")
+        obj = cls(data['sma']['period'], data['atr']['period'], data['history'],
+                  data['atr_multiplier'], data['killzones'])
+        obj.sma = RollingMean.from_dict(data['sma'])
+        obj.atr = RollingMean.from_dict(data['atr'])
+        for candle in data['candles']:
+            obj.candles.append({k: (float('nan') if v is None else v) for k, v in candle.items()})
+        obj.prev_close = data['prev_close']
+        obj.last_time = data['last_time']
+        obj.count = data['count']
+        obj.saved_count = obj.count
+        return obj
+
+    def save(self, path):
+        """原子写入 checkpoint (NaN 存为 null)"""
+        data = _nan_to_none(self.to_dict())
+        tmp = path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+        self.saved_count = self.count
+
+    def checkpoint_due(self, every=CHECKPOINT_EVERY):
+        """距上次 checkpoint 已推入 every 根K线"""
+        return self.count - self.saved_count >= every
+
+    @classmethod
+    def load(cls, path, sma_period=200, atr_period=14, history=3, atr_multiplier=1.0,
+             killzones=DEFAULT_KILLZONES):
+        """加载 checkpoint; 不存在、损坏或参数不一致时返回全新状态"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                obj = cls.from_dict(json.load(f))
+            if obj.sma.period == sma_period and obj.atr.period == atr_period \
+                    and obj.candles.maxlen == history and obj.atr_multiplier == atr_multiplier \
+                    and obj.killzones == tuple(killzones):
+                return obj
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError, TypeError):
+            pass
+        return cls(sma_period, atr_period, history, atr_multiplier, killzones)
+
+
+def _nan_to_none(obj):
+    if isinstance(obj, float) and obj != obj:
+        return None
+    if isinstance(obj, dict):
+        return {k: _nan_to_none(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_nan_to_none(v) for v in obj]
+    return obj
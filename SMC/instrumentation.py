@@ -0,0 +1,232 @@
+"""
+Stage Instrumentation (SMC V9.1)
+轻量级分阶段计时, 定位延迟来源 (交易所 / 指标 / 信号 / 风控 / Telegram):
+1. with stage("fetch"): ...  记录该阶段耗时到直方图; 未启用时返回共享的空上下文, 几乎零开销
+2. 导出 Prometheus 文本格式: 写入文件 (node_exporter textfile) 或本地 HTTP /metrics
+3. 可选整次运行的 cProfile / pyinstrument 采样 (profile_run)
+
+环境变量:
+    SMC_METRICS=1                 启用计时
+    SMC_METRICS_FILE=path.prom    每轮扫描后写入 Prometheus 文本文件
+    SMC_METRICS_PORT=9108         启动本地 HTTP /metrics
+    SMC_PROFILE=cprofile|pyinstrument   profile_run 采样器 (未设置时不采样)
+    SMC_PROFILE_DIR=profiles      采样结果目录
+"""
+import contextlib
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+# 直方图桶 (秒): 覆盖 0.1ms 的内存计算到 30s 的网络重试
+BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+           1.0, 2.5, 5.0, 10.0, 30.0)
+
+ENABLED = os.getenv("SMC_METRICS", "0") == "1"
+METRICS_FILE = os.getenv("SMC_METRICS_FILE")
+METRICS_PORT = int(os.getenv("SMC_METRICS_PORT", "0") or 0)
+PROFILER = os.getenv("SMC_PROFILE", "")
+PROFILE_DIR = os.getenv("SMC_PROFILE_DIR", "profiles")
+
+
+class Histogram:
+    """累积直方图 (Prometheus histogram 语义)"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds):
+        k = 0
+        while k < len(BUCKETS) and seconds > BUCKETS[k]:
+            k += 1
+        with self.lock:
+            self.counts[k] += 1
+            self.sum += seconds
+            self.count += 1
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.counts), self.sum, self.count
+
+
+HISTOGRAMS = {}
+_HISTOGRAMS_LOCK = threading.Lock()
+
+
+def _histogram(name):
+    h = HISTOGRAMS.get(name)
+    if h is None:
+        with _HISTOGRAMS_LOCK:
+            h = HISTOGRAMS.setdefault(name, Histogram())
+    return h
+
+
+def observe(name, seconds):
+    """直接记录一个耗时 (例如 K线收盘到信号推送的端到端延迟)"""
+    if ENABLED:
+        _histogram(name).observe(seconds)
+
+
+class _Timer:
+    __slots__ = ('hist', 'started')
+
+    def __init__(self, hist):
+        self.hist = hist
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.started)
+        return False
+
+
+_NULL = contextlib.nullcontext()
+
+
+def stage(name):
+    """阶段计时上下文; 未启用时返回共享空上下文"""
+    if not ENABLED:
+        return _NULL
+    return _Timer(_histogram(name))
+
+
+def timed(name):
+    """函数装饰器版 stage"""
+    def decorator(fn):
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            with _Timer(_histogram(name)):
+                return fn(*args, **kwargs)
+        wrapper.__name__ = fn.__name__
+        wrapper.__doc__ = fn.__doc__
+        wrapper.__wrapped__ = fn
+        return wrapper
+    return decorator
+
+
+def enable(flag=True):
+    global ENABLED
+    ENABLED = flag
+
+
+def reset():
+    with _HISTOGRAMS_LOCK:
+        HISTOGRAMS.clear()
+
+# ==========================================
+# 导出
+# ==========================================
+
+def render_prometheus(prefix="smc_stage_seconds"):
+    """所有阶段直方图 -> Prometheus 文本格式"""
+    lines = [
+        f"# HELP {prefix} SMC V9.1 per-stage latency in seconds",
+        f"# TYPE {prefix} histogram",
+    ]
+    for name in sorted(HISTOGRAMS):
+        counts, total, count = HISTOGRAMS[name].snapshot()
+        cumulative = 0
+        for le, n in zip(BUCKETS, counts):
+            cumulative += n
+            lines.append(f'{prefix}_bucket{{stage="{name}",le="{le}"}} {cumulative}')
+        lines.append(f'{prefix}_bucket{{stage="{name}",le="+Inf"}} {count}')
+        lines.append(f'{prefix}_sum{{stage="{name}"}} {total:.6f}')
+        lines.append(f'{prefix}_count{{stage="{name}"}} {count}')
+    return "\n".join(lines) + "\n"
+
+
+def summary():
+    """{阶段: (次数, 总耗时, 平均耗时)} 便于打印"""
+    out = {}
+    for name in sorted(HISTOGRAMS):
+        _, total, count = HISTOGRAMS[name].snapshot()
+        out[name] = (count, total, total / count if count else 0.0)
+    return out
+
+
+def write_prometheus(path=None):
+    """原子写入 Prometheus 文本文件 (未配置路径或未启用时不写)"""
+    path = path or METRICS_FILE
+    if not ENABLED or not path:
+        return
+    tmp = path + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(render_prometheus())
+    os.replace(tmp, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip('/') != '/metrics':
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = render_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_http_server(port=None, host="127.0.0.1"):
+    """后台线程提供 http://host:port/metrics; 返回 server (端口为 0 / 未配置时不启动)"""
+    port = port or METRICS_PORT
+    if not port:
+        return None
+    server = HTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+# ==========================================
+# 采样分析
+# ==========================================
+
+@contextlib.contextmanager
+def profile_run(label, profiler=None, out_dir=None):
+    """
+    整段代码的 cProfile / pyinstrument 采样, 结果写入 out_dir/<label>-<时间>.prof/.html
+    profiler 为空 (默认读取 SMC_PROFILE) 时不采样
+    """
+    profiler = PROFILER if profiler is None else profiler
+    if not profiler:
+        yield None
+        return
+
+    out_dir = out_dir or PROFILE_DIR
+    os.makedirs(out_dir, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+
+    if profiler == "pyinstrument":
+        from pyinstrument import Profiler
+        p = Profiler()
+        p.start()
+        try:
+            yield p
+        finally:
+            p.stop()
+            path = os.path.join(out_dir, f"{label}-{stamp}.html")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(p.output_html())
+            print(f"[采样] pyinstrument 结果已写入 {path}")
+        return
+
+    import cProfile
+    p = cProfile.Profile()
+    p.enable()
+    try:
+        yield p
+    finally:
+        p.disable()
+        path = os.path.join(out_dir, f"{label}-{stamp}.prof")
+        p.dump_stats(path)
+        print(f"[采样] cProfile 结果已写入 {path} (python -m pstats {path})")
@@ -0,0 +1,376 @@
+"""
+Intrabar Fill Model (SMC V9.1)
+用 1m / 5m 子K线解析 15m 回测中 "同一根K线内先后顺序不确定" 的情况:
+1. 歧义出场K线: 同一根K线同时触及止损与止盈, 或保本触发后同根回到入场价 (含触及止损)。
+   现行模型按 止损 > 止盈 > 保本触发 (下一根生效) 的保守顺序处理, 这里按子K线顺序逐根判定
+2. 入场K线: 限价单在 FVG 边缘的成交时刻取首根触及的子K线, 可要求穿越 fill_buffer_atr 个 ATR
+   才算成交; 成交后同一根K线剩余子K线内的止损 / 止盈 / 保本一并判定 (现行模型从下一根才开始)
+3. 保本: 子K线触发后, 从下一根子K线起止损移至入场价
+4. 子K线按需加载: 二进制列目录 mmap, 只对需要解析的K线按时间 searchsorted 切片,
+   其余K线沿用整根K线规则 — 读入的数据量只与歧义K线数有关, 与历史长度无关
+5. 报告: 与现行模型逐笔对比 (结果改变 / 离场K线改变 / 单边独有) 与资金差异
+成交子K线本身不判定出场 (与现行模型对入场K线的约定相同); 单根子K线内仍有歧义时按保守顺序处理并计数;
+缺少子K线数据的K线回退到整根K线规则
+(实盘 resolve_open_trades 与回测共用 resume_trade, 同样是止损优先)
+
+用法:
+    python intrabar_fill.py --data BTC_15m_Real.csv --sub BTC_1m_Real.csv
+    python intrabar_fill.py --data ETH_15m_Real.csv --sub-tf 5m --fill-buffer-atr 0.05 --out diff.csv
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import manual_fvg_v9_1_killzones as v91
+from data_loader import open_ohlc_columns
+from execution_engine import _first_event, _first_true, run_backtest_arrays
+from instrumentation import stage
+from records import Direction, Result
+
+SUB_TIMEFRAME = "1m"
+FILL_BUFFER_ATR = 0.0    # 限价单需穿越的 ATR 倍数 (0 = 触及即成交)
+
+STAT_KEYS = ('entry_bars', 'exit_bars', 'sub_bars', 'sub_ambiguous', 'missing', 'no_fill')
+
+# ==========================================
+# 1. 子K线数据 (mmap 按需切片)
+# ==========================================
+
+class SubBarSource:
+    """子周期K线 (1m / 5m) 的 mmap 列, 按父K线时间区间切片读取"""
+
+    def __init__(self, path, float32=False):
+        self.path = path
+        self.float32 = float32
+        self.tz = None
+        self._index = None
+        self._high = None
+        self._low = None
+        self.requests = 0
+        self.loaded = 0   # 已读入的子K线数
+
+    def _open(self):
+        if self._index is not None:
+            return
+        meta, index, data = open_ohlc_columns(self.path, self.float32)
+        self.tz = meta['tz']
+        self._index = index
+        self._high = data['high']
+        self._low = data['low']
+
+    def __len__(self):
+        self._open()
+        return len(self._index)
+
+    def align(self, index):
+        """父K线 DatetimeIndex -> 与子K线时间同基准 (同时区、同精度) 的 datetime64 数组"""
+        self._open()
+        if index.tz is not None:
+            index = index.tz_convert(self.tz or 'UTC').tz_localize(None)
+        return np.asarray(index.values).astype(self._index.dtype)
+
+    def bars(self, start, end):
+        """[start, end) 内的子K线, 返回 (highs, lows) 副本"""
+        self._open()
+        lo = int(np.searchsorted(self._index, start, side='left'))
+        hi = int(np.searchsorted(self._index, end, side='left'))
+        self.requests += 1
+        self.loaded += hi - lo
+        return (np.array(self._high[lo:hi], dtype=np.float64),
+                np.array(self._low[lo:hi], dtype=np.float64))
+
+
+def default_sub_path(path, sub_tf=SUB_TIMEFRAME):
+    """BTC_15m_Real.csv -> BTC_1m_Real.csv"""
+    head, name = os.path.split(path)
+    return os.path.join(head, name.replace("_15m", f"_{sub_tf}", 1))
+
+# ==========================================
+# 2. 持仓状态机 (整根K线与子K线共用)
+# ==========================================
+
+class _Position:
+    """持仓价位与保本状态; step 对一根 (子) K线应用与 resume_trade 相同的规则"""
+    __slots__ = ('is_long', 'entry', 'sl', 'tp', 'be_trigger', 'be_active')
+
+    def __init__(self, is_long, entry, sl, tp, be_trigger, be_active=False):
+        self.is_long = is_long
+        self.entry = entry
+        self.sl = sl
+        self.tp = tp
+        self.be_trigger = be_trigger
+        self.be_active = be_active
+
+    def copy(self):
+        return _Position(self.is_long, self.entry, self.sl, self.tp, self.be_trigger, self.be_active)
+
+    def step(self, h, l):
+        """
+        止损 > 止盈 > 保本触发 (下一根生效)
+        返回 (结果或 None, 是否歧义): 歧义 = 同根触及止损与止盈, 或保本触发后又回到入场价
+        (触及止盈时保本是否先触发不影响结果, 不算歧义)
+        """
+        stop = self.entry if self.be_active else self.sl
+        if self.is_long:
+            hit_sl = l <= stop
+            hit_tp = h >= self.tp
+            hit_be = not self.be_active and h >= self.be_trigger
+            back = hit_be and l <= self.entry
+        else:
+            hit_sl = h >= stop
+            hit_tp = l <= self.tp
+            hit_be = not self.be_active and l <= self.be_trigger
+            back = hit_be and h >= self.entry
+        # h / l 可能是 NumPy 标量: 比较结果为 np.bool_, 不能相加计数
+        ambiguous = bool((hit_sl and hit_tp) or back)
+
+        if hit_sl:
+            return (Result.BE if self.be_active else Result.LOSS), ambiguous
+        if hit_tp:
+            return Result.WIN, ambiguous
+        if hit_be:
+            self.be_active = True
+        return None, ambiguous
+
+    def walk(self, highs, lows):
+        """按顺序推进一组子K线, 返回 (结果或 None, 仍有歧义的子K线数)"""
+        ambiguous = 0
+        for h, l in zip(highs.tolist(), lows.tolist()):
+            outcome, amb = self.step(h, l)
+            ambiguous += amb
+            if outcome is not None:
+                return outcome, ambiguous
+        return None, ambiguous
+
+# ==========================================
+# 3. 子K线成交模型
+# ==========================================
+
+class IntrabarModel:
+    """
+    run_backtest_arrays 的 fill_model: 只在入场K线与歧义出场K线上读取子K线
+    index: 父K线时间索引; bar_delta: 父K线周期 (默认取索引最小间隔)
+    """
+
+    def __init__(self, source, index, bar_delta=None, fill_buffer_atr=FILL_BUFFER_ATR):
+        self.source = source
+        self.starts = source.align(index)
+        if bar_delta is None:
+            if len(self.starts) < 2:
+                raise ValueError("父K线不足两根, 无法推断周期, 请指定 bar_delta")
+            bar_delta = np.diff(self.starts).min()
+        self.bar_delta = np.timedelta64(bar_delta).astype(self.starts.dtype.str.replace('M8', 'm8'))
+        self.fill_buffer_atr = fill_buffer_atr
+        self.stats = dict.fromkeys(STAT_KEYS, 0)
+
+    def _sub_bars(self, j):
+        start = self.starts[j]
+        with stage("sub_bar_load"):
+            highs, lows = self.source.bars(start, start + self.bar_delta)
+        if len(highs) == 0:
+            return None
+        self.stats['sub_bars'] += len(highs)
+        return highs, lows
+
+    def simulate(self, highs, lows, i, direction, entry, sl, tp, be_trigger, atr_i):
+        """
+        第 i 根K线挂单入场的持仓, 接口与 simulate_trade 一致
+        返回 (outcome, exit_idx); 限价单未成交时返回 (None, None)
+        """
+        pos = _Position(direction == Direction.LONG, entry, sl, tp, be_trigger)
+
+        filled, outcome = self._entry_bar(highs[i], lows[i], i, pos, atr_i)
+        if not filled:
+            return None, None
+        if outcome is not None:
+            return outcome, i
+
+        # 向量化跳到下一根触及任一价位的K线, 只在该K线有歧义时读取子K线
+        j = i + 1
+        while True:
+            stop = pos.entry if pos.be_active else pos.sl
+            j, _ = _first_event(highs, lows, j, pos.is_long, stop, tp,
+                                None if pos.be_active else be_trigger)
+            if j is None:
+                return Result.RUNNING, len(highs) - 1
+            outcome = self._exit_bar(highs[j], lows[j], j, pos)
+            if outcome is not None:
+                return outcome, j
+            j += 1
+
+    def _entry_bar(self, h, l, i, pos, atr_i):
+        """入场K线: 返回 (是否成交, 同根K线内的平仓结果或 None)"""
+        buffer = self.fill_buffer_atr * atr_i
+        if pos.is_long:
+            fill = pos.entry - buffer
+            filled = l <= fill
+            touches = l <= pos.sl or h >= pos.tp or h >= pos.be_trigger
+        else:
+            fill = pos.entry + buffer
+            filled = h >= fill
+            touches = h >= pos.sl or l <= pos.tp or l <= pos.be_trigger
+        if not filled:
+            self.stats['no_fill'] += 1
+            return False, None
+        if not touches:
+            return True, None   # 成交后本根K线不可能触及任何出场价位
+
+        self.stats['entry_bars'] += 1
+        sub = self._sub_bars(i)
+        if sub is not None:
+            sub_highs, sub_lows = sub
+            k = _first_true(sub_lows <= fill if pos.is_long else sub_highs >= fill)
+            if k < len(sub_highs):
+                outcome, ambiguous = pos.walk(sub_highs[k + 1:], sub_lows[k + 1:])
+                self.stats['sub_ambiguous'] += ambiguous
+                return True, outcome
+        # 子K线缺失或与父K线不一致: 沿用现行模型 (出场从下一根K线开始判定)
+        self.stats['missing'] += 1
+        return True, None
+
+    def _exit_bar(self, h, l, j, pos):
+        """出场候选K线: 无歧义时按整根K线规则, 有歧义时按子K线顺序"""
+        probe = pos.copy()
+        bar_outcome, ambiguous = probe.step(h, l)
+        if not ambiguous:
+            pos.be_active = probe.be_active
+            return bar_outcome
+
+        self.stats['exit_bars'] += 1
+        sub = self._sub_bars(j)
+        if sub is not None:
+            walk = pos.copy()
+            outcome, sub_ambiguous = walk.walk(*sub)
+            # 整根K线必然平仓而子K线未平仓: 子K线数据不完整
+            if outcome is not None or bar_outcome is None:
+                self.stats['sub_ambiguous'] += sub_ambiguous
+                pos.be_active = walk.be_active
+                return outcome
+        self.stats['missing'] += 1
+        pos.be_active = probe.be_active
+        return bar_outcome
+
+# ==========================================
+# 4. 回测与对比
+# ==========================================
+
+def run_fill_comparison(df, sub_path, params=None, fill_buffer_atr=FILL_BUFFER_ATR):
+    """
+    同一组 FVG 分别用现行整根K线模型与子K线模型回测
+    返回 (base_trades, base_capital, intrabar_trades, intrabar_capital, model)
+    """
+    p = v91.resolve_params(params)
+    if 'ema200' not in df.columns:
+        df = v91.calculate_features(df)
+    highs, lows, atr = (df[c].to_numpy(dtype=np.float64) for c in ('high', 'low', 'atr'))
+    fvgs = v91.detect_fvgs_arrays(
+        highs, lows, df['close'].to_numpy(dtype=np.float64), df['ema200'].to_numpy(dtype=np.float64),
+        atr, df['body_size'].to_numpy(dtype=np.float64), v91.killzone_mask(df.index, p),
+        p['atr_multiplier'], times=df.index, flags=v91.feature_flags(df, p)
+    )
+    engine = dict(initial_capital=p['initial_capital'], risk_per_trade=p['risk_per_trade'],
+                  target_rr=p['target_rr'], be_trigger_rr=p['be_trigger_rr'],
+                  sl_padding_atr=p['sl_padding_atr'])
+
+    base, base_capital = run_backtest_arrays(highs, lows, atr, [f.copy() for f in fvgs], **engine)
+
+    model = IntrabarModel(SubBarSource(sub_path), df.index, fill_buffer_atr=fill_buffer_atr)
+    with stage("intrabar_backtest"):
+        trades, capital = run_backtest_arrays(highs, lows, atr, [f.copy() for f in fvgs],
+                                              fill_model=model, **engine)
+    return base, base_capital, trades, capital, model
+
+
+def compare_trades(base, intrabar, index):
+    """按入场K线逐笔对比, 返回 DataFrame (status: same / result / exit / base_only / intrabar_only)"""
+    base_by_bar = {t.bar: t for t in base}
+    intrabar_by_bar = {t.bar: t for t in intrabar}
+    rows = []
+    for bar in sorted(set(base_by_bar) | set(intrabar_by_bar)):
+        b = base_by_bar.get(bar)
+        t = intrabar_by_bar.get(bar)
+        if b is None:
+            status = 'intrabar_only'
+        elif t is None:
+            status = 'base_only'
+        elif b.result != t.result:
+            status = 'result'
+        elif b.exit_bar != t.exit_bar:
+            status = 'exit'
+        else:
+            status = 'same'
+        ref = b or t
+        rows.append({
+            'Time': index[bar],
+            'Type': Direction(ref.direction).label,
+            'BaseResult': Result(b.result).label if b else None,
+            'IntrabarResult': Result(t.result).label if t else None,
+            'BaseExit': index[b.exit_bar] if b else None,
+            'IntrabarExit': index[t.exit_bar] if t else None,
+            'Status': status,
+        })
+    return pd.DataFrame(rows, columns=['Time', 'Type', 'BaseResult', 'IntrabarResult',
+                                       'BaseExit', 'IntrabarExit', 'Status'])
+
+
+def print_report(diff, base_capital, capital, model, initial_capital, n_bars):
+    counts = diff['Status'].value_counts()
+    roi = lambda c: (c - initial_capital) / initial_capital * 100
+    stats = model.stats
+    print(f"\n[对比] 现行模型: {int((diff['BaseResult'].notna()).sum())} 笔, "
+          f"余额 ${base_capital:,.2f} (ROI {roi(base_capital):.2f}%)")
+    print(f"       子K线模型: {int((diff['IntrabarResult'].notna()).sum())} 笔, "
+          f"余额 ${capital:,.2f} (ROI {roi(capital):.2f}%) | 差异 ${capital - base_capital:+,.2f}")
+    print(f"  结果改变 {counts.get('result', 0)} | 离场K线改变 {counts.get('exit', 0)} | "
+          f"仅现行模型 {counts.get('base_only', 0)} | 仅子K线模型 {counts.get('intrabar_only', 0)}")
+    changed = diff[diff['Status'] == 'result']
+    if not changed.empty:
+        moves = changed.groupby(['BaseResult', 'IntrabarResult']).size()
+        print("  结果迁移: " + " | ".join(f"{a} -> {b}: {k}" for (a, b), k in moves.items()))
+    print(f"  子K线解析: 入场K线 {stats['entry_bars']} | 歧义出场K线 {stats['exit_bars']} | "
+          f"未成交 {stats['no_fill']} | 子K线内仍歧义 {stats['sub_ambiguous']} | 缺数据 {stats['missing']}")
+    print(f"  按需读取子K线 {stats['sub_bars']:,} 根 ({model.source.requests} 次切片, "
+          f"子K线总数 {len(model.source):,}, 父K线 {n_bars:,} 根)")
+
+# ==========================================
+# 主程序
+# ==========================================
+
+def main():
+    parser = argparse.ArgumentParser(description="SMC V9.1 子K线成交模型 (与现行模型对比)")
+    parser.add_argument('--data', default=v91.DATA_FILE, help="15m OHLC CSV")
+    parser.add_argument('--sub', default=None, help="子周期 OHLC CSV (默认按 --sub-tf 推断文件名)")
+    parser.add_argument('--sub-tf', default=SUB_TIMEFRAME, help="子周期, 如 1m / 5m")
+    parser.add_argument('--fill-buffer-atr', type=float, default=FILL_BUFFER_ATR,
+                        help="限价单需穿越的 ATR 倍数")
+    parser.add_argument('--out', default=None, help="逐笔对比 CSV")
+    args = parser.parse_args()
+
+    sub_path = args.sub or default_sub_path(args.data, args.sub_tf)
+    if not os.path.exists(sub_path):
+        parser.error(f"找不到子周期数据: {sub_path}")
+
+    print("=" * 60)
+    print(" SMC V9.1 INTRABAR FILL MODEL")
+    print("=" * 60)
+
+    df = v91.load_features(args.data)
+    started = time.perf_counter()
+    base, base_capital, trades, capital, model = run_fill_comparison(
+        df, sub_path, fill_buffer_atr=args.fill_buffer_atr)
+    elapsed = time.perf_counter() - started
+
+    diff = compare_trades(base, trades, df.index)
+    print_report(diff, base_capital, capital, model, v91.INITIAL_CAPITAL, len(df))
+    print(f"  耗时 {elapsed:.2f}s")
+
+    if args.out:
+        diff.to_csv(args.out, index=False)
+        print(f"\n[输出] 逐笔对比已写入 {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Kline Feed (SMC V9.1 Live)
+可插拔的收盘K线事件源, 供实盘流式模式 (MONITOR_MODE=stream) 使用:
+1. CcxtProFeed: ccxt.pro watch_ohlcv WebSocket 订阅, K线收盘即刻推送 (亚秒级延迟)
+2. ReplayFeed: 按时间顺序回放本地K线, 代替交易所用于测试 / 本地回放服务
+
+接口约定: closed_klines() 为异步生成器, 逐个产出 (symbol, closed, forming)
+    closed  = 刚收盘的K线 [ts, o, h, l, c, v]
+    forming = 新开始跳动的K线 (未知时为 None)
+连接断开时抛出异常, 由调用方回退到 REST 轮询并稍后重连。
+"""
+import asyncio
+from abc import ABC, abstractmethod
+
+try:
+    import ccxt.pro as ccxtpro
+    CCXT_PRO_AVAILABLE = True
+except ImportError:
+    CCXT_PRO_AVAILABLE = False
+
+
+class KlineFeed(ABC):
+    """收盘K线事件源基类 (子类必须实现 closed_klines, 否则无法实例化)"""
+
+    @abstractmethod
+    async def closed_klines(self, symbols, timeframe):
+        """异步生成器: 逐个产出 (symbol, closed, forming), 连接断开时抛出异常"""
+
+    async def close(self):
+        pass
+
+
+class CcxtProFeed(KlineFeed):
+    """
+    ccxt.pro WebSocket 订阅
+    watch_ohlcv 每次成交都会推送跳动中的K线; 出现新开盘时间时,
+    上一根 (最后一次推送的版本) 即为收盘K线
+    """
+
+    def __init__(self, exchange_id='binance', config=None):
+        if not CCXT_PRO_AVAILABLE:
+            raise RuntimeError("ccxt.pro 不可用, 无法使用 WebSocket 订阅")
+        self.exchange = getattr(ccxtpro, exchange_id)(config or {})
+
+    async def _watch(self, symbol, timeframe, queue):
+        last = None
+        while True:
+            candles = await self.exchange.watch_ohlcv(symbol, timeframe)
+            for c in candles:
+                if last is not None and c[0] > last[0]:
+                    await queue.put((symbol, list(last), list(c)))
+                if last is None or c[0] >= last[0]:
+                    last = c
+
+    async def closed_klines(self, symbols, timeframe):
+        queue = asyncio.Queue()
+        tasks = [asyncio.create_task(self._watch(s, timeframe, queue)) for s in symbols]
+        try:
+            while True:
+                get = asyncio.create_task(queue.get())
+                done, _ = await asyncio.wait([get] + tasks, return_when=asyncio.FIRST_COMPLETED)
+                if get in done:
+                    yield get.result()
+                    continue
+                get.cancel()
+                # 任一订阅任务结束 (断线 / 异常): 抛出, 交给调用方回退
+                for t in tasks:
+                    if t.done():
+                        t.result()
+                raise ConnectionError("K线订阅意外结束")
+        finally:
+            for t in tasks:
+                t.cancel()
+
+    async def close(self):
+        await self.exchange.close()
+
+
+class ReplayFeed(KlineFeed):
+    """
+    本地回放: candles = {symbol: [[ts, o, h, l, c, v], ...]}
+    按开盘时间顺序逐根推送 (每根后一根作为 forming), delay 为每个事件间隔秒数
+    """
+
+    def __init__(self, candles, delay=0.0):
+        self.candles = candles
+        self.delay = delay
+
+    async def closed_klines(self, symbols, timeframe):
+        events = []
+        for symbol in symbols:
+            rows = self.candles.get(symbol, [])
+            for k in range(len(rows) - 1):
+                events.append((rows[k][0], symbol, rows[k], rows[k + 1]))
+        events.sort(key=lambda e: e[0])
+
+        for _, symbol, closed, forming in events:
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            yield symbol, list(closed), list(forming)
@@ -8,23 +8,37 @@ Features:
 4. [BUGFIX] Added signal deduplication (idempotency) to prevent duplicate pushes
 5. [LOCAL] Dynamic position sizing based on LOCAL trade history (5%/3%/2%/1% tiers)
 6. [CIRCUIT] Daily loss limit: 3 trades triggers circuit breaker
-7. [NO-API] No private API calls - uses local JSON state tracking
+7. [NO-API] No private API calls - uses local SQLite state tracking
+8. [PATH] Open trades resolved along every closed candle (SL -> TP -> BE, same as backtest)
+9. [PARITY] Indicators / killzones / FVG rule shared with the backtest via signal_pipeline
 """
 import os
 import sys
+import asyncio
 import ccxt
+import ccxt.async_support as ccxt_async
 import pandas as pd
 import numpy as np
 import time
 import schedule
 import logging
-import requests
 import json
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+import bisect
 from dotenv import load_dotenv
 from datetime import datetime, timedelta, timezone
 
+from incremental_indicators import IncrementalIndicators
+from candle_store import CandleStore
+from kline_feed import CcxtProFeed
+from trade_store import TradeStore
+from execution_engine import resume_trade
+from records import Direction, Result
+from risk_tiers import RISK_TIERS, DAILY_LOSS_LIMIT, tier_risk_percent
+from telegram_notifier import TelegramNotifier
+from instrumentation import stage, timed, observe, write_prometheus, start_http_server
+from signal_pipeline import (KZ_LONDON_START, KZ_LONDON_END, KZ_NY_START, KZ_NY_END,
+                             FVG_BULL, FVG_BEAR, killzone_hours, compute_signals)
+
 # 加载环境变量
 load_dotenv()
 
@@ -32,184 +46,311 @@ load_dotenv()
 TG_TOKEN = os.getenv("TG_TOKEN")
 TG_CHAT_ID = os.getenv("TG_CHAT_ID")
 
-if not TG_TOKEN or not TG_CHAT_ID:
-    print("[CRITICAL] Telegram config not found!")
-    print("Please check .env file for TG_TOKEN and TG_CHAT_ID")
-    sys.exit(1)
+def require_telegram_config():
+    """启动实盘前强制检查 Telegram 配置 (导入本模块的回放 / 基准工具不需要)"""
+    if not TG_TOKEN or not TG_CHAT_ID:
+        print("[CRITICAL] Telegram config not found!")
+        print("Please check .env file for TG_TOKEN and TG_CHAT_ID")
+        sys.exit(1)
 
 # ================= ⚙️ 策略参数 (审计锁定) =================
 SYMBOL = os.getenv("SYMBOL", "ETH/USDT")
 TIMEFRAME = os.getenv("TIMEFRAME", "15m")
 LIMIT = 250
 
+# 多标的异步扫描 (MONITOR_MODE=async): SYMBOLS 逗号分隔, 默认只监控 SYMBOL
+SYMBOLS = [s.strip() for s in os.getenv("SYMBOLS", SYMBOL).split(",") if s.strip()]
+MONITOR_MODE = os.getenv("MONITOR_MODE", "schedule")  # schedule | async | stream
+ASYNC_SCAN_DELAY = 2         # 收盘后延迟秒数 (等待交易所落盘最后一笔成交)
+ASYNC_MAX_CONCURRENCY = 10   # 同时在途的K线请求数
+
+# WebSocket 流式模式 (MONITOR_MODE=stream): 断线后先 REST 轮询若干根K线再重连
+STREAM_FALLBACK_CANDLES = 1
+
 # SMC V9.1 硬参数 (与 manual_fvg_v9_1_killzones.py 严格对齐)
 ATR_PERIOD = 14
 ATR_MULTIPLIER = 1.0     # 动能阈值
 SMA_PERIOD = 200         # 趋势线 (SMA)
 SL_PADDING = 0.5         # 止损缓冲 (ATR倍数)
 RISK_REWARD = 2.0        # 盈亏比
+BE_TRIGGER_RR = 1.0      # 浮盈 1.0R 后止损移至入场价 (与回测一致)
 
 # Killzones (UTC) - [FIXED] 补全回测中的 10:00
-KZ_LONDON = [7, 8, 9, 10]  # UTC 07:00 - 10:59 (回测逻辑为 <=10)
-KZ_NY = [12, 13, 14, 15]   # UTC 12:00 - 15:59
+KZ_LONDON = killzone_hours(KZ_LONDON_START, KZ_LONDON_END)  # UTC 07:00 - 10:59 (与回测共用定义)
+KZ_NY = killzone_hours(KZ_NY_START, KZ_NY_END)              # UTC 12:00 - 15:59
 
-# 本地状态文件
+# 本地状态文件 (SQLite 交易库; 旧 JSON 首次启动时自动迁移)
+TRADE_DB_FILE = "trade_history.db"
 TRADE_HISTORY_FILE = "trade_history.json"
+TELEGRAM_OUTBOX_FILE = "telegram_outbox.jsonl"
+
+# 增量指标 (每根收盘K线 O(1) 更新, checkpoint 到磁盘, 重启免预热)
+INCREMENTAL_INDICATORS = os.getenv("INCREMENTAL_INDICATORS", "1") == "1"
+
+# 本地K线库 (只追加, 增量拉取 since=上次收盘K线之后)
+CANDLE_STORE_DIR = os.getenv("CANDLE_STORE_DIR", "candle_store")
 
 # ================= 🔧 系统初始化 =================
-# 配置 Telegram 会话 (增加重试机制)
-tg_session = requests.Session()
-retries = Retry(total=3, backoff_factor=1, status_forcelist=[500, 502, 503, 504])
-tg_session.mount('https://', HTTPAdapter(max_retries=retries))
-
-# 初始化交易所 (仅公开数据，无需 API Key)
-exchange = ccxt.binance({
-    'enableRateLimit': True,
-    'options': {'defaultType': 'future'},
-    'timeout': 15000  # 15秒超时
-})
-
-# 日志格式
-logging.basicConfig(
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    level=logging.INFO,
-    handlers=[
-        logging.FileHandler("smc_monitor.log", encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
-
-# ================= 🔒 信号去重 (幂等性) =================
-LAST_SIGNAL_TIME = None  # 记录上次推送的信号时间
+# 导入时不创建任何客户端 / 线程 / 日志文件: 首次使用时才初始化, 实盘入口见 __main__
+TELEGRAM = None          # Telegram 后台推送器 (get_telegram 首次调用时创建)
+exchange = None          # 交易所客户端 (get_exchange 首次调用时创建)
+
+# 可替换的数据源 / 通知器 / 时钟 (离线回放注入, 见 live_replay.py)
+NOTIFIER = None          # None: 使用 send_telegram (后台 TELEGRAM 推送器)
+CLOCK = None             # None: 使用系统 UTC 时间
+SIGNAL_LISTENERS = []    # 每个判定出的信号回调 listener(symbol, signal) (去重/风控之前)
+
+def get_telegram():
+    """Telegram 后台推送 (有界队列 + 合并 + retry_after + 未送达消息持久化)"""
+    global TELEGRAM
+    if TELEGRAM is None:
+        TELEGRAM = TelegramNotifier(TG_TOKEN, TG_CHAT_ID, outbox_file=TELEGRAM_OUTBOX_FILE)
+    return TELEGRAM
+
+def get_exchange():
+    """行情数据源 (默认 Binance 合约, 仅公开数据，无需 API Key)"""
+    global exchange
+    if exchange is None:
+        exchange = ccxt.binance({
+            'enableRateLimit': True,
+            'options': {'defaultType': 'future'},
+            'timeout': 15000  # 15秒超时
+        })
+    return exchange
+
+def set_exchange(ex):
+    """替换行情数据源 (需提供 fetch_ohlcv / parse_timeframe)"""
+    global exchange
+    exchange = ex
+
+def set_notifier(fn):
+    global NOTIFIER
+    NOTIFIER = fn
+
+def set_clock(fn):
+    global CLOCK
+    CLOCK = fn
+
+def utc_now():
+    return CLOCK() if CLOCK is not None else datetime.now(timezone.utc)
+
+def setup_logging():
+    """实盘日志格式 (写入 smc_monitor.log + 控制台), 只在实盘入口调用"""
+    logging.basicConfig(
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        level=logging.INFO,
+        handlers=[
+            logging.FileHandler("smc_monitor.log", encoding='utf-8'),
+            logging.StreamHandler()
+        ]
+    )
+
+# ================= 📈 标的状态 (K线库 / 增量指标 / 信号去重) =================
+class SymbolMonitor:
+    """单个标的的实盘状态"""
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.tf_ms = get_exchange().parse_timeframe(TIMEFRAME) * 1000
+        tag = f"{symbol.replace('/', '').replace(':', '_')}_{TIMEFRAME}"
+        self.indicator_state_file = f"indicator_state_{tag}.json"
+        self.store = CandleStore(symbol, TIMEFRAME, self.tf_ms, root=CANDLE_STORE_DIR, keep=LIMIT)
+        self.indicators = None        # 首次扫描时从 checkpoint 加载
+        self.last_signal_time = None  # 🔒 信号去重 (幂等性): 记录上次推送的信号时间
+
+MONITORS = {}
+
+def get_monitor(symbol):
+    """获取 (或创建) 标的状态"""
+    if symbol not in MONITORS:
+        MONITORS[symbol] = SymbolMonitor(symbol)
+    return MONITORS[symbol]
 
 # ================= 💰 本地风控追踪系统 =================
-class LocalRiskManager:
-    """本地状态追踪风控器: 不需要交易所 API"""
+DAY_MS = 86400 * 1000
 
-    def __init__(self, history_file=TRADE_HISTORY_FILE):
+class LocalRiskManager:
+    """
+    本地状态追踪风控器: 不需要交易所 API
+    风控统计 (今日亏损 / 连亏 / 持仓) 为常驻计数器: 构建时从交易库读取一次,
+    之后随开仓/平仓事件增量更新, 每次扫描的档位查询与熔断检查为 O(1)
+    """
+
+    def __init__(self, db_file=TRADE_DB_FILE, history_file=TRADE_HISTORY_FILE):
+        self.db_file = db_file
         self.history_file = history_file
+        self.store = TradeStore(db_file, legacy_json=history_file)
+        self._rebuild_stats()
+
+    # ========== 常驻统计 ==========
+
+    def _rebuild_stats(self):
+        """从交易库重建计数器 (启动 / save_history 覆盖后)"""
+        self.day_start_ms = self._today_start_ms()
+
+        # 今日亏损: 按信号所在 UTC 日计数, 跨日时丢弃旧日
+        self.loss_days = {}
+        for t in self.store.loss_times_since(self.day_start_ms):
+            day = t // DAY_MS
+            self.loss_days[day] = self.loss_days.get(day, 0) + 1
+        self.daily_loss = sum(self.loss_days.values())
+
+        # 连亏: 只需保留最近一笔 WIN 之后的记录 (按写入顺序)
+        tail = []
+        for trade_id, result in self.store.iter_recent():
+            if result == 'WIN':
+                break
+            tail.append((trade_id, result))
+        self.tail = dict(reversed(tail))
+        self._recount_streak()
+
+        # 持仓: {id: trade}
+        self.open_positions = {t['id']: t for t in self.store.open_trades()}
+
+    def _today_start_ms(self):
+        now_ms = int(utc_now().timestamp() * 1000)
+        return now_ms - now_ms % DAY_MS
+
+    def _roll_day(self):
+        """UTC 0点换日: 只保留新一天及之后的亏损计数"""
+        today = self._today_start_ms()
+        if today == self.day_start_ms:
+            return
+        self.day_start_ms = today
+        day = today // DAY_MS
+        self.loss_days = {d: n for d, n in self.loss_days.items() if d >= day}
+        self.daily_loss = sum(self.loss_days.values())
+
+    def _recount_streak(self):
+        """连亏 = tail 末尾的 LOSS 笔数 (跳过 BE, 遇到 PENDING 停止, 与旧逻辑一致)"""
+        streak = 0
+        for result in reversed(self.tail.values()):
+            if result == 'BE':
+                continue
+            if result != 'LOSS':
+                break
+            streak += 1
+        self.consecutive_loss = streak
+
+    def _on_open(self, trade_id, trade):
+        self.open_positions[trade_id] = {**trade, 'id': trade_id}
+        self.tail[trade_id] = 'PENDING'
+        self.consecutive_loss = 0
+
+    def _on_close(self, trade_id, result):
+        self._roll_day()
+        trade = self.open_positions.pop(trade_id, None)
+        if result == 'WIN':
+            # 最近一笔 WIN 之前的记录不再影响连亏
+            self.tail = {i: r for i, r in self.tail.items() if i > trade_id}
+        else:
+            if trade_id in self.tail:
+                self.tail[trade_id] = result
+            if result == 'LOSS' and trade is not None and trade.get('time_ms') is not None:
+                day = trade['time_ms'] // DAY_MS
+                if day >= self.day_start_ms // DAY_MS:
+                    self.loss_days[day] = self.loss_days.get(day, 0) + 1
+                    self.daily_loss += 1
+        self._recount_streak()
+
+    # ========== 持久化 ==========
 
     def load_history(self):
-        """加载交易历史 JSON"""
+        """全部交易历史 (与旧 JSON 格式一致)"""
         try:
-            if os.path.exists(self.history_file):
-                with open(self.history_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            return []
+            return self.store.all_trades()
         except Exception as e:
-            logging.error(f"❌ 读取历史文件失败: {e}")
+            logging.error(f"❌ 读取交易库失败: {e}")
             return []
 
     def save_history(self, history):
-        """保存交易历史到 JSON"""
+        """整表覆盖交易历史 (单事务)"""
         try:
-            with open(self.history_file, 'w', encoding='utf-8') as f:
-                json.dump(history, f, indent=2, ensure_ascii=False, default=str)
+            self.store.replace_all(history)
         except Exception as e:
-            logging.error(f"❌ 保存历史文件失败: {e}")
+            logging.error(f"❌ 保存交易库失败: {e}")
+        self._rebuild_stats()
+
+    def resume_point(self, symbol):
+        """
+        该标的 OPEN 持仓中最早的已评估K线时间 (毫秒): K线库须从其后第一根起回补,
+        停机缺口内触及 SL/TP 的持仓才能按路径结算; 无持仓返回 None
+        """
+        marks = [max(t.get('time_ms') or 0, t.get('last_bar_ms') or 0)
+                 for t in self.open_positions.values() if (t.get('symbol') or SYMBOL) == symbol]
+        marks = [m for m in marks if m > 0]
+        return min(marks) if marks else None
+
+    @timed("risk_state")
+    def resolve_open_trades(self, symbol, candles):
+        """
+        按K线路径结算 OPEN 持仓 (规则与 run_backtest 一致: 同一根K线先判止损再判止盈,
+        达到 BE_TRIGGER_RR 后从下一根K线起止损移至入场价)
+        candles: 已收盘K线 [[ts, o, h, l, c, v], ...] (按时间升序)
+        每笔持仓只评估 信号K线 / 上次评估K线 之后的新K线, 不重复扫描
+        返回本次平仓笔数
+        """
+        trades = [t for t in self.open_positions.values() if (t.get('symbol') or SYMBOL) == symbol]
+        if not trades or not candles:
+            return 0
+
+        times = [c[0] for c in candles]
+        highs = np.array([c[2] for c in candles], dtype=np.float64)
+        lows = np.array([c[3] for c in candles], dtype=np.float64)
+
+        closes = []
+        progress = []
+        for trade in trades:
+            after = max(trade.get('time_ms') or 0, trade.get('last_bar_ms') or 0)
+            start = bisect.bisect_right(times, after)
+            if start >= len(times):
+                continue
 
-    def update_open_trades(self, current_price, current_high, current_low):
-        """检查并更新所有 OPEN 状态的交易"""
-        history = self.load_history()
-        updated = False
+            entry, sl, tp = trade['entry'], trade['sl'], trade['tp']
+            direction = Direction.parse(trade['type'])
+            risk = abs(entry - sl)
+            be_trigger = entry + risk * BE_TRIGGER_RR if direction == Direction.LONG else entry - risk * BE_TRIGGER_RR
 
-        for trade in history:
-            if trade['status'] != 'OPEN':
+            outcome, j, be_active = resume_trade(
+                highs, lows, start, direction, entry, sl, tp, be_trigger, bool(trade.get('be_active'))
+            )
+            if outcome == Result.RUNNING:
+                progress.append((trade['id'], times[-1], be_active))
                 continue
 
-            entry = trade['entry']
-            tp = trade['tp']
-            sl = trade['sl']
-            direction = trade['type']
-
-            # 判断是否触及止盈或止损
-            hit_tp = False
-            hit_sl = False
-
-            if 'LONG' in direction:
-                if current_high >= tp:
-                    hit_tp = True
-                elif current_low <= sl:
-                    hit_sl = True
-            else:  # SHORT
-                if current_low <= tp:
-                    hit_tp = True
-                elif current_high >= sl:
-                    hit_sl = True
-
-            if hit_tp:
-                trade['status'] = 'CLOSED'
-                trade['result'] = 'WIN'
-                trade['close_price'] = tp
-                trade['close_time'] = datetime.now(timezone.utc).isoformat()
-                updated = True
-                logging.info(f"✅ 交易止盈: {direction} @ {entry} -> {tp}")
-            elif hit_sl:
-                trade['status'] = 'CLOSED'
-                trade['result'] = 'LOSS'
-                trade['close_price'] = sl
-                trade['close_time'] = datetime.now(timezone.utc).isoformat()
-                updated = True
-                logging.info(f"❌ 交易止损: {direction} @ {entry} -> {sl}")
-
-        if updated:
-            self.save_history(history)
-
-        return updated
+            result = outcome.store_label
+            price = {'WIN': tp, 'LOSS': sl, 'BE': entry}[result]
+            close_time = datetime.fromtimestamp(times[j] / 1000, tz=timezone.utc).isoformat()
+            closes.append((trade['id'], result, price, close_time, times[j]))
+            icon = {'WIN': '✅ 交易止盈', 'LOSS': '❌ 交易止损', 'BE': '⚪ 交易保本'}[result]
+            logging.info(f"{icon}: {direction.label} @ {entry} -> {price} ({close_time})")
 
-    def calculate_stats(self):
-        """计算统计数据: 连亏笔数和今日亏损笔数"""
-        history = self.load_history()
-
-        # UTC 今天0点
-        today_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-
-        daily_loss_count = 0
-        consecutive_loss_count = 0
-
-        # 统计今日亏损 (遍历所有已关闭交易)
-        for trade in history:
-            if trade['result'] == 'LOSS':
-                try:
-                    trade_time = datetime.fromisoformat(trade['time'].replace('Z', '+00:00'))
-                    if trade_time >= today_start:
-                        daily_loss_count += 1
-                except:
-                    pass
-
-        # 统计连续亏损 (从最新向旧遍历，遇到 WIN 或 OPEN 停止)
-        for trade in reversed(history):
-            if trade['result'] == 'LOSS':
-                consecutive_loss_count += 1
-            elif trade['result'] in ['WIN', 'PENDING']:
-                break  # 遇到盈利或未完成，停止计数
+        try:
+            self.store.close_trades(closes)
+            self.store.update_progress(progress)
+        except Exception as e:
+            logging.error(f"❌ 更新交易库失败: {e}")
+            return 0
 
+        for trade_id, bar_ms, be_active in progress:
+            self.open_positions[trade_id]['last_bar_ms'] = bar_ms
+            self.open_positions[trade_id]['be_active'] = int(be_active)
+        for trade_id, result, _, _, _ in closes:
+            self._on_close(trade_id, result)
+        return len(closes)
+
+    def calculate_stats(self):
+        """统计数据: 连亏笔数和今日亏损笔数 (常驻计数器, O(1))"""
+        self._roll_day()
         return {
-            'daily_loss': daily_loss_count,
-            'consecutive_loss': consecutive_loss_count
+            'daily_loss': self.daily_loss,
+            'consecutive_loss': self.consecutive_loss
         }
 
     def calculate_risk_percent(self):
         """根据战绩动态计算风险比例"""
         stats = self.calculate_stats()
-
-        # 动态风险档位 (基于连续亏损)
-        consecutive = stats['consecutive_loss']
-
-        if consecutive >= 10:
-            risk_percent = 0.01  # 1% 严防死守
-        elif consecutive >= 5:
-            risk_percent = 0.02  # 2% 防守模式
-        elif consecutive >= 2:
-            risk_percent = 0.03  # 3% 谨慎模式
-        else:
-            risk_percent = 0.05  # 5% 正常模式
-
-        # 熔断机制: 今日亏损 >= 3笔 (覆盖其他档位)
-        if stats['daily_loss'] >= 3:
-            return 0  # 停止交易
-
-        return risk_percent
+        return tier_risk_percent(stats['consecutive_loss'], stats['daily_loss'])
 
     def get_risk_tier_name(self, risk_percent):
         """获取风险档位名称"""
@@ -226,31 +367,36 @@ class LocalRiskManager:
         else:
             return f"{risk_percent*100:.0f}% 未知档位"
 
-    def add_signal(self, signal):
+    @timed("risk_state")
+    def add_signal(self, signal, symbol=SYMBOL):
         """添加新信号到历史记录"""
-        history = self.load_history()
-
         # 提取方向类型
-        direction = "LONG" if "LONG" in signal['type'] else "SHORT"
+        direction = Direction.parse(signal['type']).label
 
         new_trade = {
+            'symbol': symbol,
             'time': signal['time_utc'].isoformat(),
             'type': direction,
-            'entry': signal['entry'],
-            'sl': signal['sl'],
-            'tp': signal['tp'],
+            'entry': float(signal['entry']),
+            'sl': float(signal['sl']),
+            'tp': float(signal['tp']),
             'status': 'OPEN',
             'result': 'PENDING'
         }
 
-        history.append(new_trade)
-        self.save_history(history)
+        try:
+            trade_id = self.store.add_trade(new_trade)
+        except Exception as e:
+            logging.error(f"❌ 保存交易库失败: {e}")
+            return
+        self._on_open(trade_id, {**new_trade, 'time_ms': int(signal['time_utc'].timestamp() * 1000)})
         logging.info(f"📝 新信号已记录: {direction} @ {signal['entry']}")
 
     def is_circuit_breaker(self):
         """检查是否触发熔断"""
         return self.calculate_risk_percent() == 0
 
+    @timed("risk_state")
     def get_risk_info(self, entry, sl):
         """获取风控信息用于推送"""
         risk_percent = self.calculate_risk_percent()
@@ -268,28 +414,29 @@ class LocalRiskManager:
             'is_circuit_breaker': risk_percent == 0
         }
 
+RISK_MANAGER = None
+
+def get_risk_manager():
+    """进程内共享的风控器 (计数器常驻内存, 不必每次扫描重建)"""
+    global RISK_MANAGER
+    if RISK_MANAGER is None:
+        RISK_MANAGER = LocalRiskManager()
+    return RISK_MANAGER
+
 def send_telegram(message):
-    """发送精美的 Telegram 消息 (带重试)"""
-    url = f"https://api.telegram.org/bot{TG_TOKEN}/sendMessage"
-    payload = {
-        "chat_id": TG_CHAT_ID,
-        "text": message,
-        "parse_mode": "HTML",
-        "disable_web_page_preview": True
-    }
-    try:
-        # 使用带重试的 session 发送
-        response = tg_session.post(url, json=payload, timeout=10)
-        if response.status_code != 200:
-            logging.error(f"推送失败: {response.text}")
-    except Exception as e:
-        logging.error(f"推送出错: {e}")
+    """发送精美的 Telegram 消息 (非阻塞: 入队后由后台线程发送)"""
+    get_telegram().send(message)
+
+def notify(message):
+    """推送消息 (默认 Telegram, 可由 set_notifier 替换)"""
+    (NOTIFIER or send_telegram)(message)
 
-def fetch_data_with_retry(symbol, timeframe, limit=250, max_retries=3):
-    """鲁棒的数据获取函数"""
+def fetch_data_with_retry(symbol, timeframe, limit=250, max_retries=3, since=None):
+    """鲁棒的数据获取函数 (since 为毫秒时间戳时只拉取其后的K线)"""
     for i in range(max_retries):
         try:
-            ohlcv = exchange.fetch_ohlcv(symbol, timeframe, limit=limit)
+            with stage("exchange_fetch"):
+                ohlcv = get_exchange().fetch_ohlcv(symbol, timeframe, since=since, limit=limit)
             return ohlcv
         except Exception as e:
             logging.warning(f"数据获取失败 ({i+1}/{max_retries}): {e}")
@@ -298,21 +445,105 @@ def fetch_data_with_retry(symbol, timeframe, limit=250, max_retries=3):
     return None
 
 def calculate_indicators(df):
-    """计算指标 (严格复刻 V9.1)"""
-    # 1. 趋势: SMA 200 (审计确认: 回测使用 rolling.mean)
-    df['trend'] = df['close'].rolling(SMA_PERIOD).mean()
-
-    # 2. ATR
-    df['tr'] = np.maximum(
-        df['high'] - df['low'],
-        np.abs(df['high'] - df['close'].shift(1))
+    """计算指标 (严格复刻 V9.1): 与回测 calculate_features 共用 signal_pipeline 单次遍历内核"""
+    out = compute_signals(df['open'].values, df['high'].values, df['low'].values,
+                          df['close'].values, df.index.hour, SMA_PERIOD, ATR_PERIOD, ATR_MULTIPLIER)
+    df['trend'] = out['trend']  # SMA 200 (回测列名 ema200)
+    df['tr'] = out['tr']
+    df['atr'] = out['atr']
+    df['body_size'] = out['body_size']
+    df['in_kz'] = out['in_kz']
+    df['fvg'] = out['fvg']    # FVG 标记 (check_structure 直接读取, 不再逐根重算)
+    return df
+
+def sync_candle_store(monitor, risk_mgr):
+    """
+    增量同步本地K线库: 只请求上次收盘K线之后的数据, 停机缺口自动回补
+    (有未平仓持仓时回补其最后评估K线之后的全部K线)
+    成功返回 True, 请求失败返回 False
+    """
+    store = monitor.store
+    now_ms = int(utc_now().timestamp() * 1000)
+    new = store.sync(
+        lambda since, limit: fetch_data_with_retry(monitor.symbol, TIMEFRAME, limit=limit, since=since),
+        now_ms=now_ms, resume_ms=risk_mgr.resume_point(monitor.symbol)
     )
-    df['atr'] = df['tr'].rolling(ATR_PERIOD).mean()
+    return _after_sync(monitor, new, risk_mgr)
+
+def resolve_backfill(monitor, new, risk_mgr):
+    """
+    回补的K线多于内存窗口 (停机缺口超过 keep 根) 时, 先用全部回补K线结算持仓,
+    否则缺口内触及 SL/TP 的持仓会在之后的K线上被误判或永远不平仓
+    """
+    if new and new[0][0] < monitor.store.candles[0][0]:
+        risk_mgr.resolve_open_trades(monitor.symbol, new)
+
+def _after_sync(monitor, new, risk_mgr):
+    if new is None or monitor.store.forming is None:
+        return False
+    resolve_backfill(monitor, new, risk_mgr)
+    if new:
+        logging.info(f"📥 {monitor.symbol} 新增 {len(new)} 根收盘K线 (本地库 {len(monitor.store.candles)} 根)")
+    return True
+
+def build_indicator_frame_incremental(monitor):
+    """
+    增量指标路径: 只把本地库中的新收盘K线推入状态, O(1) 更新 SMA/ATR
+    返回 IncrementalIndicators (check_structure 直接读取其环形缓冲), 失败返回 None
+    """
+    if monitor.indicators is None:
+        monitor.indicators = IncrementalIndicators.load(monitor.indicator_state_file, SMA_PERIOD, ATR_PERIOD,
+                                                        atr_multiplier=ATR_MULTIPLIER)
+    state = monitor.indicators
+    store = monitor.store
+
+    closed = store.tail()
+    new = [c for c in closed if state.last_time is None or c[0] > state.last_time]
+
+    # 状态为空或与本地库断档: 用本地库窗口全量重新预热
+    if not state.ready or (new and new[0][0] != state.last_time + store.tf_ms):
+        if len(closed) + 1 < SMA_PERIOD + 10:
+            logging.warning(f"⚠️ 数据不足 ({len(closed) + 1} 条)，需要至少 {SMA_PERIOD + 10} 条")
+            return None
+        logging.info(f"♻️ {monitor.symbol} 指标状态重新预热")
+        state.reset()
+        new = closed
+
+    state.warm_up(new)
+    # 定期 checkpoint: 重启时 checkpoint 之后的K线从本地K线库补推
+    if state.checkpoint_due():
+        try:
+            state.save(monitor.indicator_state_file)
+        except Exception as e:
+            logging.error(f"❌ 保存指标状态失败: {e}")
+
+    if not state.ready:
+        logging.warning("⚠️ 指标尚未预热完成")
+        return None
 
-    # 3. Body Size
-    df['body_size'] = abs(df['close'] - df['open'])
+    return state
 
-    return df
+@timed("indicators")
+def build_indicator_frame(monitor):
+    """
+    从本地K线库构建指标: 增量模式返回 IncrementalIndicators, 批量模式返回
+    calculate_indicators 的 DataFrame (最后一行为跳动中的K线); 失败返回 None
+    """
+    if INCREMENTAL_INDICATORS:
+        return build_indicator_frame_incremental(monitor)
+
+    ohlcv = monitor.store.window(LIMIT)
+
+    # 数据验证
+    if len(ohlcv) < SMA_PERIOD + 10:
+        logging.warning(f"⚠️ 数据不足 ({len(ohlcv)} 条)，需要至少 {SMA_PERIOD + 10} 条")
+        return None
+
+    df = pd.DataFrame(ohlcv, columns=['time', 'open', 'high', 'low', 'close', 'volume'])
+    df['time'] = pd.to_datetime(df['time'], unit='ms', utc=True)
+    df.set_index('time', inplace=True)
+
+    return calculate_indicators(df)
 
 def get_utc8_str(utc_dt):
     """将 UTC 时间转换为 北京时间字符串"""
@@ -320,16 +551,25 @@ def get_utc8_str(utc_dt):
     return utc8_dt.strftime('%Y-%m-%d %H:%M')
 
 def check_structure(df):
-    """分析最新收盘的 K 线"""
-    # 审计确认: 实盘必须取 iloc[-2] (刚收盘的完整K线)，iloc[-1] 是跳动中的
-    last_closed_idx = -2
+    """
+    分析最新收盘的 K 线
+    df: calculate_indicators 输出的 DataFrame, 或 IncrementalIndicators (直接读环形缓冲, 不构造 DataFrame)
+    """
+    if isinstance(df, IncrementalIndicators):
+        # 环形缓冲只含已收盘K线: [-1] 即刚收盘的K线
+        curr = df.candles[-1]    # i (当前判定K线)
+        prev2 = df.candles[-3]   # i-2
+        time_utc = pd.Timestamp(curr['time'], unit='ms', tz='UTC')
+    else:
+        # 审计确认: 实盘必须取 iloc[-2] (刚收盘的完整K线)，iloc[-1] 是跳动中的
+        last_closed_idx = -2
 
-    curr = df.iloc[last_closed_idx]      # i (当前判定K线)
-    prev = df.iloc[last_closed_idx - 1]  # i-1
-    prev2 = df.iloc[last_closed_idx - 2] # i-2
+        curr = df.iloc[last_closed_idx]      # i (当前判定K线)
+        prev2 = df.iloc[last_closed_idx - 2] # i-2
+        time_utc = curr.name
 
     # 1. 时间过滤 (Killzones) - 使用 UTC 时间判定
-    current_hour_utc = curr.name.hour
+    current_hour_utc = time_utc.hour
 
     session_name = ""
     if current_hour_utc in KZ_LONDON:
@@ -339,43 +579,33 @@ def check_structure(df):
     else:
         return None # 非核心时间
 
-    # 2. 动能过滤 (Body > 1.0 ATR)
-    if curr['body_size'] <= (ATR_MULTIPLIER * curr['atr']):
-        return None
+    # 2. 动能过滤 (Body > 1.0 ATR) + 顺势 FVG 结构: 信号流水线已算出的标记 (与回测 FVG 检测同一份)
+    atr_val = curr['atr']
+    flag = curr['fvg']
 
     signal = None
 
     # 3. BULLISH FVG
-    if curr['close'] > curr['trend']:
-        if curr['low'] > prev2['high']: # FVG 结构
-            atr_val = curr['atr']
-            entry_price = curr['low']
-            sl_price = prev2['high'] - (atr_val * SL_PADDING)
-
-            signal = {
-                'type': '🟢 <b>做多 (LONG)</b>',
-                'entry': entry_price,
-                'sl': sl_price,
-                'price': curr['close'],
-                'session': session_name,
-                'atr': atr_val
-            }
+    if flag == FVG_BULL:
+        signal = {
+            'type': '🟢 <b>做多 (LONG)</b>',
+            'entry': curr['low'],
+            'sl': prev2['high'] - (atr_val * SL_PADDING),
+            'price': curr['close'],
+            'session': session_name,
+            'atr': atr_val
+        }
 
     # 4. BEARISH FVG
-    elif curr['close'] < curr['trend']:
-        if curr['high'] < prev2['low']: # FVG 结构
-            atr_val = curr['atr']
-            entry_price = curr['high']
-            sl_price = prev2['low'] + (atr_val * SL_PADDING)
-
-            signal = {
-                'type': '🔴 <b>做空 (SHORT)</b>',
-                'entry': entry_price,
-                'sl': sl_price,
-                'price': curr['close'],
-                'session': session_name,
-                'atr': atr_val
-            }
+    elif flag == FVG_BEAR:
+        signal = {
+            'type': '🔴 <b>做空 (SHORT)</b>',
+            'entry': curr['high'],
+            'sl': prev2['low'] + (atr_val * SL_PADDING),
+            'price': curr['close'],
+            'session': session_name,
+            'atr': atr_val
+        }
 
     if signal:
         risk = abs(signal['entry'] - signal['sl'])
@@ -383,117 +613,127 @@ def check_structure(df):
             signal['tp'] = signal['entry'] + (risk * RISK_REWARD)
         else:
             signal['tp'] = signal['entry'] - (risk * RISK_REWARD)
-        signal['time_utc'] = curr.name
+        signal['time_utc'] = time_utc
 
     return signal
 
-def job():
-    """核心任务 (带信号去重 + 本地风控追踪)"""
-    global LAST_SIGNAL_TIME
+def evaluate_symbol(monitor, df, risk_mgr):
+    """
+    对一个标的的指标帧执行 持仓更新 -> 信号判定 -> 去重 -> 风控
+    返回需要推送的消息列表 (由调用方同步发送或放入通知队列)
+    """
+    symbol = monitor.symbol
+    messages = []
 
-    try:
-        logging.info(f"⏳ 正在扫描 {SYMBOL} ...")
+    # 💰 先按K线路径结算本地持仓 (TP/SL/保本, 含停机期间的K线)
+    risk_mgr.resolve_open_trades(symbol, monitor.store.tail())
 
-        # 使用带重试的获取函数
-        ohlcv = fetch_data_with_retry(SYMBOL, TIMEFRAME, limit=LIMIT)
-        if ohlcv is None:
-            return
+    with stage("signal_scan"):
+        signal = check_structure(df)
 
-        # 数据验证
-        if len(ohlcv) < SMA_PERIOD + 10:
-            logging.warning(f"⚠️ 数据不足 ({len(ohlcv)} 条)，需要至少 {SMA_PERIOD + 10} 条")
-            return
+    if signal:
+        # K线收盘 -> 信号判定完成 的端到端延迟
+        observe("signal_latency", (utc_now() - signal['time_utc']).total_seconds() - monitor.tf_ms / 1000)
+        for listener in SIGNAL_LISTENERS:
+            listener(symbol, signal)
 
-        df = pd.DataFrame(ohlcv, columns=['time', 'open', 'high', 'low', 'close', 'volume'])
-        df['time'] = pd.to_datetime(df['time'], unit='ms', utc=True)
-        df.set_index('time', inplace=True)
+    if not signal:
+        logging.info(f"💤 {symbol} 扫描完成: 无信号")
+        return messages
 
-        df = calculate_indicators(df)
+    # 🔒 信号去重检查: 防止重复推送同一根K线的信号
+    try:
+        signal_time_str = signal['time_utc'].strftime('%Y-%m-%d %H:%M:%S')
+    except Exception as e:
+        logging.error(f"❌ 时间格式化失败: {e}")
+        signal_time_str = "Unknown"
+
+    if monitor.last_signal_time is not None and signal['time_utc'] == monitor.last_signal_time:
+        logging.info(f"🔄 检测到重复信号 ({signal_time_str})，跳过推送")
+        return messages
+
+    # 💰 获取风控信息
+    risk_info = risk_mgr.get_risk_info(signal['entry'], signal['sl'])
+
+    # 熔断机制: 今日止损触顶
+    if risk_info['is_circuit_breaker']:
+        circuit_msg = (
+            f"🛑 <b>SMC 风控熔断触发</b>\n"
+            f"━━━━━━━━━━━━━━\n"
+            f"📊 <b>标的:</b> {symbol}\n"
+            f"📅 <b>日期:</b> {get_utc8_str(utc_now())} (UTC+8)\n"
+            f"━━━━━━━━━━━━━━\n"
+            f"❌ <b>今日亏损笔数: {risk_info['daily_loss']}</b>\n"
+            f"🚫 <b>系统已暂停推送信号</b>\n"
+            f"━━━━━━━━━━━━━━\n"
+            f"<i>请检查今日交易记录，明日自动恢复。</i>"
+        )
+        logging.warning(f"🛑 熔断触发: 今日亏损 {risk_info['daily_loss']} 笔")
+        messages.append(circuit_msg)
+        return messages
 
-        # 💰 先更新本地持仓状态 (检查是否有 TP/SL 触发)
-        last_candle = df.iloc[-1]
-        risk_mgr = LocalRiskManager()
-        risk_mgr.update_open_trades(
-            current_price=last_candle['close'],
-            current_high=last_candle['high'],
-            current_low=last_candle['low']
+    # 新信号: 推送并更新记录
+    try:
+        time_cn = get_utc8_str(signal['time_utc'])
+
+        # 判断是否处于防守模式
+        is_defensive = risk_info['risk_percent'] < 0.05
+        risk_emoji = "⚠️" if is_defensive else "✅"
+
+        msg = (
+            f"🐯 <b>SMC 狙击信号 (V9.1)</b>\n"
+            f"━━━━━━━━━━━━━━\n"
+            f"📊 <b>标的:</b> #{symbol.replace('/','')} ({TIMEFRAME})\n"
+            f"🧭 <b>方向:</b> {signal['type']}\n"
+            f"🕒 <b>时间:</b> {time_cn} (UTC+8)\n"
+            f"🏙️ <b>时段:</b> {signal['session']}\n"
+            f"━━━━━━━━━━━━━━\n"
+            f"🎯 <b>入场:</b> <code>{signal['entry']:.2f}</code>\n"
+            f"🛡️ <b>止损:</b> <code>{signal['sl']:.2f}</code>\n"
+            f"💰 <b>止盈:</b> <code>{signal['tp']:.2f}</code>\n"
+            f"━━━━━━━━━━━━━━\n"
+            f"📉 <b>连亏/日亏:</b> {risk_info['consecutive_loss']} / {risk_info['daily_loss']}\n"
+            f"{risk_emoji} <b>风控建议:</b> {risk_info['tier_name']}\n"
+            f"🛡️ <b>止损距离:</b> {risk_info['sl_distance_pct']:.2f}%\n"
+            f"━━━━━━━━━━━━━━\n"
+            f"🌊 <b>动能:</b> {signal['atr']:.2f} ATR\n"
+            f"<i>⚠️ 机器自动推送，请复核盘面结构。</i>"
         )
+        logging.info(f"🔥 发现新信号! {symbol} {signal['type']} @ {signal_time_str} | 风险: {risk_info['tier_name']}")
+        messages.append(msg)
 
-        signal = check_structure(df)
+        # 记录信号到本地历史
+        risk_mgr.add_signal(signal, symbol=symbol)
+    except Exception as e:
+        logging.error(f"❌ 信号处理失败: {e}")
 
-        if signal:
-            # 🔒 信号去重检查: 防止重复推送同一根K线的信号
-            try:
-                signal_time_str = signal['time_utc'].strftime('%Y-%m-%d %H:%M:%S')
-            except Exception as e:
-                logging.error(f"❌ 时间格式化失败: {e}")
-                signal_time_str = "Unknown"
+    # 更新最后推送时间 (即使处理失败也要更新, 防止重复)
+    monitor.last_signal_time = signal['time_utc']
+    return messages
 
-            if LAST_SIGNAL_TIME is not None and signal['time_utc'] == LAST_SIGNAL_TIME:
-                logging.info(f"🔄 检测到重复信号 ({signal_time_str})，跳过推送")
-                return
+def job(symbol=None):
+    """核心任务 (带信号去重 + 本地风控追踪)"""
+    symbol = symbol or SYMBOL
+    with stage("scan"):
+        _job(symbol)
+    write_prometheus()
 
-            # 💰 获取风控信息
-            risk_info = risk_mgr.get_risk_info(signal['entry'], signal['sl'])
-
-            # 熔断机制: 今日止损触顶
-            if risk_info['is_circuit_breaker']:
-                circuit_msg = (
-                    f"🛑 <b>SMC 风控熔断触发</b>\n"
-                    f"━━━━━━━━━━━━━━\n"
-                    f"📊 <b>标的:</b> {SYMBOL}\n"
-                    f"📅 <b>日期:</b> {get_utc8_str(datetime.now(timezone.utc))} (UTC+8)\n"
-                    f"━━━━━━━━━━━━━━\n"
-                    f"❌ <b>今日亏损笔数: {risk_info['daily_loss']}</b>\n"
-                    f"🚫 <b>系统已暂停推送信号</b>\n"
-                    f"━━━━━━━━━━━━━━\n"
-                    f"<i>请检查今日交易记录，明日自动恢复。</i>"
-                )
-                logging.warning(f"🛑 熔断触发: 今日亏损 {risk_info['daily_loss']} 笔")
-                send_telegram(circuit_msg)
-                return
+def _job(symbol):
+    try:
+        logging.info(f"⏳ 正在扫描 {symbol} ...")
+        monitor = get_monitor(symbol)
 
-            # 新信号: 推送并更新记录
-            try:
-                time_cn = get_utc8_str(signal['time_utc'])
-
-                # 判断是否处于防守模式
-                is_defensive = risk_info['risk_percent'] < 0.05
-                risk_emoji = "⚠️" if is_defensive else "✅"
-
-                msg = (
-                    f"🐯 <b>SMC 狙击信号 (V9.1)</b>\n"
-                    f"━━━━━━━━━━━━━━\n"
-                    f"📊 <b>标的:</b> #{SYMBOL.replace('/','')} ({TIMEFRAME})\n"
-                    f"🧭 <b>方向:</b> {signal['type']}\n"
-                    f"🕒 <b>时间:</b> {time_cn} (UTC+8)\n"
-                    f"🏙️ <b>时段:</b> {signal['session']}\n"
-                    f"━━━━━━━━━━━━━━\n"
-                    f"🎯 <b>入场:</b> <code>{signal['entry']:.2f}</code>\n"
-                    f"🛡️ <b>止损:</b> <code>{signal['sl']:.2f}</code>\n"
-                    f"💰 <b>止盈:</b> <code>{signal['tp']:.2f}</code>\n"
-                    f"━━━━━━━━━━━━━━\n"
-                    f"📉 <b>连亏/日亏:</b> {risk_info['consecutive_loss']} / {risk_info['daily_loss']}\n"
-                    f"{risk_emoji} <b>风控建议:</b> {risk_info['tier_name']}\n"
-                    f"🛡️ <b>止损距离:</b> {risk_info['sl_distance_pct']:.2f}%\n"
-                    f"━━━━━━━━━━━━━━\n"
-                    f"🌊 <b>动能:</b> {signal['atr']:.2f} ATR\n"
-                    f"<i>⚠️ 机器自动推送，请复核盘面结构。</i>"
-                )
-                logging.info(f"🔥 发现新信号! {signal['type']} @ {signal_time_str} | 风险: {risk_info['tier_name']}")
-                send_telegram(msg)
-
-                # 记录信号到本地历史
-                risk_mgr.add_signal(signal)
-
-                # 更新最后推送时间
-                LAST_SIGNAL_TIME = signal['time_utc']
-            except Exception as e:
-                logging.error(f"❌ 信号处理失败: {e}")
-                # 即使推送失败，也要更新时间防止重复
-                LAST_SIGNAL_TIME = signal['time_utc']
-        else:
-            logging.info("💤 扫描完成: 无信号")
+        # 增量同步本地K线库 (带重试)
+        risk_mgr = get_risk_manager()
+        if not sync_candle_store(monitor, risk_mgr):
+            return
+
+        df = build_indicator_frame(monitor)
+        if df is None:
+            return
+
+        for msg in evaluate_symbol(monitor, df, risk_mgr):
+            notify(msg)
 
     except KeyboardInterrupt:
         logging.info("⏹ 用户中断扫描")
@@ -503,23 +743,207 @@ def job():
         import traceback
         logging.error(traceback.format_exc())
 
+# ================= ⚡ 多标的异步扫描 =================
+async def fetch_data_async(aexchange, symbol, since, limit, max_retries=3):
+    """异步K线请求 (带重试, 重试间隔不阻塞其他标的)"""
+    for i in range(max_retries):
+        try:
+            with stage("exchange_fetch"):
+                return await aexchange.fetch_ohlcv(symbol, TIMEFRAME, since=since, limit=limit)
+        except Exception as e:
+            logging.warning(f"{symbol} 数据获取失败 ({i+1}/{max_retries}): {e}")
+            await asyncio.sleep(2)
+    logging.error(f"❌ {symbol} 数据获取彻底失败，跳过本次扫描")
+    return None
+
+async def scan_symbol_async(aexchange, monitor, risk_mgr, notify_queue, semaphore):
+    """异步扫描单个标的: 并发拉取K线, 判定在事件循环内同步执行 (无竞争)"""
+    try:
+        now_ms = int(utc_now().timestamp() * 1000)
+        async with semaphore:
+            new = await monitor.store.sync_async(
+                lambda since, limit: fetch_data_async(aexchange, monitor.symbol, since, limit),
+                now_ms=now_ms, resume_ms=risk_mgr.resume_point(monitor.symbol)
+            )
+        if not _after_sync(monitor, new, risk_mgr):
+            return
+
+        df = build_indicator_frame(monitor)
+        if df is None:
+            return
+
+        for msg in evaluate_symbol(monitor, df, risk_mgr):
+            await notify_queue.put(msg)
+    except Exception as e:
+        logging.error(f"❌ {monitor.symbol} 扫描错误: {e}")
+        import traceback
+        logging.error(traceback.format_exc())
+
+async def notification_worker(notify_queue):
+    """共享通知队列: 所有标的的消息交给后台推送器 (入队即返回, 不阻塞扫描)"""
+    while True:
+        msg = await notify_queue.get()
+        try:
+            notify(msg)
+        finally:
+            notify_queue.task_done()
+
+def seconds_until_next_close(tf_ms, delay=ASYNC_SCAN_DELAY):
+    """距离下一根K线收盘 (+delay) 的秒数"""
+    now_ms = utc_now().timestamp() * 1000
+    next_close = (now_ms // tf_ms + 1) * tf_ms
+    return (next_close - now_ms) / 1000 + delay
+
+def create_async_exchange():
+    return ccxt_async.binance({
+        'enableRateLimit': True,
+        'options': {'defaultType': 'future'},
+        'timeout': 15000
+    })
+
+async def scan_all_async(aexchange, monitors, risk_mgr, notify_queue, semaphore):
+    started = time.monotonic()
+    await asyncio.gather(*(
+        scan_symbol_async(aexchange, m, risk_mgr, notify_queue, semaphore) for m in monitors
+    ))
+    elapsed = time.monotonic() - started
+    observe("scan", elapsed)
+    logging.info(f"⚡ 扫描 {len(monitors)} 个标的完成, 耗时 {elapsed:.2f}s")
+
+async def run_async_scanner(symbols=None):
+    """多标的异步扫描主循环: 每根K线收盘后并发扫描全部标的"""
+    symbols = symbols or SYMBOLS
+    aexchange = create_async_exchange()
+    monitors = [get_monitor(s) for s in symbols]
+    risk_mgr = get_risk_manager()
+    notify_queue = asyncio.Queue()
+    semaphore = asyncio.Semaphore(ASYNC_MAX_CONCURRENCY)
+    worker = asyncio.create_task(notification_worker(notify_queue))
+
+    try:
+        while True:
+            await scan_all_async(aexchange, monitors, risk_mgr, notify_queue, semaphore)
+            write_prometheus()
+            await asyncio.sleep(seconds_until_next_close(monitors[0].tf_ms))
+    finally:
+        await notify_queue.join()
+        worker.cancel()
+        await aexchange.close()
+
+# ================= 📡 WebSocket 流式模式 =================
+async def on_closed_kline(aexchange, monitor, closed, forming, risk_mgr, notify_queue, semaphore):
+    """
+    收到一根收盘K线: 直接写入本地库并立即判定 (无轮询延迟)
+    与本地库不连续 (漏推 / 重连) 时先走 REST 增量回补
+    """
+    store = monitor.store
+    new = store.push(closed, forming)
+    if new is None:
+        logging.info(f"🧩 {monitor.symbol} 流数据与本地库不连续, REST 回补")
+        async with semaphore:
+            backfill = await store.sync_async(
+                lambda since, limit: fetch_data_async(aexchange, monitor.symbol, since, limit),
+                now_ms=closed[0] + store.tf_ms, resume_ms=risk_mgr.resume_point(monitor.symbol)
+            )
+        new = store.push(closed, forming, allow_gap=True)
+        resolve_backfill(monitor, (backfill or []) + (new or []), risk_mgr)
+    if not new and store.last_time != closed[0]:
+        return  # 重复推送
+
+    df = build_indicator_frame(monitor)
+    if df is None:
+        return
+    for msg in evaluate_symbol(monitor, df, risk_mgr):
+        await notify_queue.put(msg)
+
+async def run_stream_monitor(symbols=None, feed_factory=None, aexchange=None):
+    """
+    流式主循环: 订阅收盘K线事件, 每根K线收盘即刻判定
+    feed_factory() -> KlineFeed (默认 ccxt.pro WebSocket, 测试时可替换为 ReplayFeed)
+    订阅断开时回退到 REST 轮询 STREAM_FALLBACK_CANDLES 根K线, 然后重连
+    """
+    symbols = symbols or SYMBOLS
+    feed_factory = feed_factory or (lambda: CcxtProFeed('binance', {'options': {'defaultType': 'future'}}))
+    own_exchange = aexchange is None
+    aexchange = aexchange or create_async_exchange()
+    monitors = {s: get_monitor(s) for s in symbols}
+    risk_mgr = get_risk_manager()
+    notify_queue = asyncio.Queue()
+    semaphore = asyncio.Semaphore(ASYNC_MAX_CONCURRENCY)
+    worker = asyncio.create_task(notification_worker(notify_queue))
+
+    try:
+        while True:
+            # 订阅前先用 REST 补齐本地库 (启动 / 重连后)
+            await scan_all_async(aexchange, list(monitors.values()), risk_mgr, notify_queue, semaphore)
+
+            feed = feed_factory()
+            try:
+                logging.info(f"📡 订阅收盘K线: {', '.join(symbols)} ({TIMEFRAME})")
+                async for symbol, closed, forming in feed.closed_klines(symbols, TIMEFRAME):
+                    monitor = monitors.get(symbol)
+                    if monitor is None:
+                        continue
+                    try:
+                        with stage("scan"):
+                            await on_closed_kline(aexchange, monitor, closed, forming,
+                                                  risk_mgr, notify_queue, semaphore)
+                        write_prometheus()
+                    except Exception as e:
+                        logging.error(f"❌ {symbol} 流式判定错误: {e}")
+                logging.info("📡 K线流结束")
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.warning(f"⚠️ K线流断开: {e}, 回退 REST 轮询")
+            finally:
+                await feed.close()
+
+            for _ in range(STREAM_FALLBACK_CANDLES):
+                await asyncio.sleep(seconds_until_next_close(next(iter(monitors.values())).tf_ms))
+                await scan_all_async(aexchange, list(monitors.values()), risk_mgr, notify_queue, semaphore)
+    finally:
+        await notify_queue.join()
+        worker.cancel()
+        if own_exchange:
+            await aexchange.close()
+
 def heartbeat():
     """发送心跳"""
     try:
-        ticker = exchange.fetch_ticker(SYMBOL)
+        ticker = get_exchange().fetch_ticker(SYMBOL)
         logging.info(f"[心跳] 系统正常 | 价格: {ticker['last']}")
     except:
         logging.info("[心跳] 系统正常 (行情获取失败)")
 
 # ================= 🏁 启动主程序 =================
 if __name__ == "__main__":
+    require_telegram_config()
+    setup_logging()
+
     print("="*40)
-    print(f" SMC V9.1 Live Monitor (Local Risk) - {SYMBOL}")
+    print(f" SMC V9.1 Live Monitor (Local Risk) - {', '.join(SYMBOLS) if MONITOR_MODE in ('async', 'stream') else SYMBOL}")
     print("="*40)
 
+    # 分阶段耗时导出 (SMC_METRICS=1 + SMC_METRICS_PORT)
+    if start_http_server():
+        logging.info("📈 指标端点已启动: /metrics")
+
     start_time = get_utc8_str(datetime.now(timezone.utc))
     send_telegram(f"🚀 <b>SMC V9.1 监控已上线</b>\n📅 启动时间: {start_time} (UTC+8)\n✅ 本地风控模式 (无需 API)")
 
+    if MONITOR_MODE in ("async", "stream"):
+        runner = run_stream_monitor if MONITOR_MODE == "stream" else run_async_scanner
+        try:
+            asyncio.run(runner(SYMBOLS))
+        except KeyboardInterrupt:
+            logging.info("⏹ 用户停止程序")
+            stop_time = get_utc8_str(datetime.now(timezone.utc))
+            send_telegram(f"⏹ <b>SMC V9.1 监控已停止</b>\n📅 停止时间: {stop_time} (UTC+8)")
+        get_telegram().stop()
+        sys.exit(0)
+
     job()
 
     # 定时任务 (K线收盘后5秒)
@@ -539,6 +963,7 @@ if __name__ == "__main__":
             logging.info("⏹ 用户停止程序")
             stop_time = get_utc8_str(datetime.now(timezone.utc))
             send_telegram(f"⏹ <b>SMC V9.1 监控已停止</b>\n📅 停止时间: {stop_time} (UTC+8)")
+            get_telegram().stop()
             break
         except Exception as e:
             logging.error(f"❌ 主循环异常: {e}")
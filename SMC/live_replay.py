@@ -0,0 +1,267 @@
+"""
+SMC V9.1 Live Replay
+离线回放: 用历史 CSV 逐根K线驱动实盘代码路径 (job -> 本地K线库 -> 指标 -> check_structure
+-> LocalRiskManager), 不访问 Binance / Telegram, 不等待真实时间:
+1. ReplayExchange 代替 ccxt 交易所, 只返回 "当前回放时刻" 之前的K线
+2. 通知器替换为内存收集, 时钟替换为回放时刻
+3. 结束后与回测的 FVG 信号 (run_backtest 使用的 detect_displacement_fvgs) 逐条对账,
+   并报告吞吐量 (bars/sec)
+
+用法:
+    python live_replay.py                          # BTC + ETH + SOL
+    python live_replay.py --symbols BTC --bars 5000
+"""
+import argparse
+import bisect
+import logging
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import ccxt
+
+import live_fvg_monitor as live
+import manual_fvg_v9_1_killzones as v91
+from portfolio_backtest import PORTFOLIO_FILES
+from records import Direction
+
+# ==========================================
+# 1. 可替换组件
+# ==========================================
+
+class ReplayExchange:
+    """
+    回放交易所: candles = {symbol: [[ts, o, h, l, c, v], ...]}
+    cursor[symbol] 为当前跳动中K线的下标, fetch_ohlcv 只返回不晚于它的K线
+    """
+
+    parse_timeframe = staticmethod(ccxt.Exchange.parse_timeframe)
+
+    def __init__(self, candles):
+        self.candles = candles
+        self.times = {s: [c[0] for c in rows] for s, rows in candles.items()}
+        self.cursor = {s: 0 for s in candles}
+        self.calls = 0
+
+    def fetch_ohlcv(self, symbol, timeframe, since=None, limit=None):
+        self.calls += 1
+        rows = self.candles[symbol]
+        end = self.cursor[symbol] + 1
+        if since is None:
+            start = max(0, end - (limit or end))
+        else:
+            start = bisect.bisect_left(self.times[symbol], since, 0, end)
+            if limit:
+                end = min(end, start + limit)
+        return [list(c) for c in rows[start:end]]
+
+    def fetch_ticker(self, symbol):
+        return {'last': self.candles[symbol][self.cursor[symbol]][4]}
+
+
+class ReplayNotifier:
+    """收集推送消息, 不访问网络"""
+
+    def __init__(self):
+        self.messages = []
+
+    def __call__(self, message):
+        self.messages.append(message)
+
+# ==========================================
+# 2. 数据
+# ==========================================
+
+def load_candles(path, bars=None):
+    """CSV -> [[ts_ms, o, h, l, c, v], ...] (与 fetch_ohlcv 格式一致)"""
+    df = v91.load_data(path)
+    if bars:
+        df = df.iloc[:bars]
+    ts = [int(t.timestamp() * 1000) for t in df.index]
+    cols = [df[c].to_numpy(dtype=float).tolist() for c in ('open', 'high', 'low', 'close', 'volume')]
+    return [[t, o, h, l, c, v] for t, o, h, l, c, v in zip(ts, *cols)]
+
+
+def backtest_signals(path, bars=None):
+    """回测侧信号: run_backtest 所用的 FVG 列表, 转为 {(ts_ms, 方向): (entry, 另一侧边界)}"""
+    df = v91.load_features(path)
+    if bars:
+        df = df.iloc[:bars]
+    fvgs = v91.detect_displacement_fvgs(df)
+    out = {}
+    for f in fvgs:
+        ts = int(df.index[f.created_at].timestamp() * 1000)
+        if f.direction == Direction.LONG:
+            out[(ts, 'LONG')] = (f.top, f.bottom)
+        else:
+            out[(ts, 'SHORT')] = (f.bottom, f.top)
+    return out, len(df)
+
+# ==========================================
+# 3. 回放
+# ==========================================
+
+def replay(paths, bars=None, workdir=None):
+    """
+    逐根K线回放全部标的 (按时间交错), 返回报告 dict
+    paths: {symbol: csv 路径}
+    """
+    candles = {s: load_candles(p, bars) for s, p in paths.items()}
+    replay_ex = ReplayExchange(candles)
+    notifier = ReplayNotifier()
+    signals = {s: {} for s in paths}
+
+    def on_signal(symbol, signal):
+        ts = int(signal['time_utc'].timestamp() * 1000)
+        direction = 'LONG' if 'LONG' in signal['type'] else 'SHORT'
+        # 实盘 entry = FVG 近端, 止损以 FVG 远端为基准 (远端 ∓ 0.5 ATR)
+        pad = signal['atr'] * live.SL_PADDING
+        far = signal['sl'] + pad if direction == 'LONG' else signal['sl'] - pad
+        signals[symbol][(ts, direction)] = (signal['entry'], far)
+
+    now = {'ms': 0}
+    live.set_exchange(replay_ex)
+    live.set_notifier(notifier)
+    live.set_clock(lambda: datetime.fromtimestamp(now['ms'] / 1000, tz=timezone.utc))
+    live.SIGNAL_LISTENERS.append(on_signal)
+
+    # 回放状态写在独立目录 (K线库 / 指标 checkpoint / 交易历史)
+    own_dir = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix="smc_replay_")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    live.MONITORS.clear()
+    live.RISK_MANAGER = None
+
+    # 所有标的按时间戳交错推进
+    events = sorted((c[0], s, k) for s, rows in candles.items() for k, c in enumerate(rows))
+    tf_ms = replay_ex.parse_timeframe(live.TIMEFRAME) * 1000
+    started = time.perf_counter()
+    try:
+        for ts, symbol, k in events:
+            replay_ex.cursor[symbol] = k
+            now['ms'] = ts + tf_ms // 2  # 跳动中K线的中段
+            live.job(symbol)
+    finally:
+        elapsed = time.perf_counter() - started
+        live.SIGNAL_LISTENERS.remove(on_signal)
+        risk_mgr = live.get_risk_manager()
+        history = risk_mgr.load_history()
+        risk_mgr.store.close()  # 先关闭交易库再删除回放目录
+        live.RISK_MANAGER = None
+        os.chdir(cwd)
+        if own_dir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'bars': len(events),
+        'elapsed': elapsed,
+        'bars_per_sec': len(events) / elapsed if elapsed > 0 else float('inf'),
+        'fetch_calls': replay_ex.calls,
+        'messages': len(notifier.messages),
+        'signals': signals,
+        'history': history,
+        'candles': candles,
+        'tf_ms': tf_ms,
+    }
+
+
+def warmup_times(candles, tf_ms):
+    """
+    实盘无法判定的K线时间戳: 开头与每个超过本地库窗口的数据缺口之后,
+    本地库被清空, 需要重新积累 SMA_PERIOD+10 根K线
+    (回测在全序列上滚动, 不受缺口影响)
+    """
+    skip = set()
+    since_reset = 0
+    for k, c in enumerate(candles):
+        if k and c[0] - candles[k - 1][0] > live.LIMIT * tf_ms:
+            since_reset = 0
+        if since_reset < live.SMA_PERIOD + 10:
+            skip.add(c[0])
+        since_reset += 1
+    return skip
+
+
+def compare_signals(live_signals, bt_signals, candles, n_bars, tf_ms):
+    """
+    对账: 只比较两边都能判定的K线
+    排除实盘预热区间 (见 warmup_times) 与回测不检测的最后 50 根
+    """
+    skip = warmup_times(candles, tf_ms)
+    end = candles[n_bars - 50][0] if n_bars > 50 else candles[0][0]
+
+    def window(sig):
+        return {k: v for k, v in sig.items() if k[0] < end and k[0] not in skip}
+
+    a, b = window(live_signals), window(bt_signals)
+    matched = [k for k in a if k in b and a[k][0] == b[k][0] and abs(a[k][1] - b[k][1]) <= 1e-9 * abs(b[k][1])]
+    return {
+        'compared': len(set(a) | set(b)),
+        'matched': len(matched),
+        'skipped': sum(1 for k in bt_signals if k[0] in skip),
+        'live_only': sorted(set(a) - set(b)),
+        'backtest_only': sorted(set(b) - set(a)),
+        'mismatched': sorted(k for k in set(a) & set(b) if k not in matched),
+    }
+
+# ==========================================
+# 4. 主程序
+# ==========================================
+
+def main():
+    parser = argparse.ArgumentParser(description="SMC V9.1 实盘离线回放")
+    parser.add_argument('--symbols', nargs='+', default=list(PORTFOLIO_FILES),
+                        help=f"标的列表 (可选: {', '.join(PORTFOLIO_FILES)})")
+    parser.add_argument('--bars', type=int, default=None, help="每个标的只回放前 N 根K线")
+    parser.add_argument('--verbose', action='store_true', help="输出实盘逐根日志")
+    args = parser.parse_args()
+
+    # 回放日志只输出到控制台, 不写入实盘 smc_monitor.log
+    logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s',
+                        level=logging.INFO if args.verbose else logging.ERROR)
+
+    data_dir = os.path.dirname(os.path.abspath(__file__))
+    paths = {f"{s}/USDT": os.path.join(data_dir, PORTFOLIO_FILES[s]) for s in args.symbols}
+
+    print("=" * 60)
+    print(f" SMC V9.1 LIVE REPLAY - {' / '.join(args.symbols)}")
+    print("=" * 60)
+
+    report = replay(paths, bars=args.bars)
+
+    all_ok = True
+    for symbol, path in paths.items():
+        bt, n_bars = backtest_signals(path, args.bars)
+        trades, capital = v91.run_backtest(v91.load_features(path).iloc[:args.bars] if args.bars
+                                           else v91.load_features(path))
+        cmp = compare_signals(report['signals'][symbol], bt, report['candles'][symbol], n_bars,
+                              report['tf_ms'])
+        ok = cmp['matched'] == cmp['compared']
+        all_ok &= ok
+        closed = [t for t in report['history'] if t.get('symbol') == symbol and t['status'] == 'CLOSED']
+
+        print(f"\n[{symbol}] 信号对账: {cmp['matched']}/{cmp['compared']} 一致 "
+              f"{'✅' if ok else '❌'}")
+        print(f"  实盘独有 {len(cmp['live_only'])} | 回测独有 {len(cmp['backtest_only'])} | "
+              f"价格不一致 {len(cmp['mismatched'])} | 预热区间跳过 {cmp['skipped']}")
+        for kind in ('live_only', 'backtest_only', 'mismatched'):
+            for ts, direction in cmp[kind][:5]:
+                t = datetime.fromtimestamp(ts / 1000, tz=timezone.utc)
+                print(f"    {kind}: {t} {direction}")
+        print(f"  回测 (run_backtest): {len(trades)} 笔交易, 余额 ${capital:,.2f}")
+        print(f"  实盘风控记录: {len(closed)} 笔已平仓 "
+              f"(盈 {sum(t['result'] == 'WIN' for t in closed)} / "
+              f"亏 {sum(t['result'] == 'LOSS' for t in closed)})")
+
+    print("\n" + "=" * 60)
+    print(f"回放K线: {report['bars']} 根 | 耗时 {report['elapsed']:.2f}s | "
+          f"吞吐 {report['bars_per_sec']:,.0f} bars/sec")
+    print(f"数据请求: {report['fetch_calls']} 次 | 推送消息: {report['messages']} 条")
+    print(f"对账结果: {'全部一致 ✅' if all_ok else '存在差异 ❌'}")
+
+
+if __name__ == "__main__":
+    main()
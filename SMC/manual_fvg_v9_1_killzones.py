@@ -6,6 +6,16 @@ Core Concept: "Trade only during Prime Sessions"
 import pandas as pd
 import numpy as np
 
+from fvg_store import ActiveFVGStore
+from execution_engine import run_backtest_arrays
+from numba_kernel import NUMBA_AVAILABLE, run_backtest_numba
+from feature_cache import load_cached_features
+from data_loader import load_ohlc
+from instrumentation import stage, profile_run, summary, write_prometheus
+from records import Direction, Signal, fvg_array, zones_from_array, trades_to_frame
+from signal_pipeline import (KZ_LONDON_START, KZ_LONDON_END, KZ_NY_START, KZ_NY_END,
+                             FVG_BULL, compute_signals, compute_fvg_flags)
+
 # ==========================================
 # 核心配置 (V9.1)
 # ==========================================
@@ -15,13 +25,43 @@ TARGET_RR = 2.0          # 2.0R 目标
 BE_TRIGGER_RR = 1.0      # 1.0R 保本
 ATR_MULTIPLIER = 1.0     # Body > 1.0 ATR
 SL_PADDING_ATR = 0.5     # 止损缓冲
-DATA_FILE = "ETH_15m_Binance_Historical.csv"
+SMA_PERIOD = 200         # 趋势线 (SMA)
+ATR_PERIOD = 14          # ATR 周期
+DATA_FILE = "ETH_15m_Real.csv"
+BACKTEST_BACKEND = "numpy"  # "numpy" | "numba" (未安装 numba 时自动回退)
+USE_FEATURE_CACHE = True    # 特征磁盘缓存 (按文件哈希 + 指标参数失效)
+
+# Killzones (UTC小时): KZ_LONDON_START / KZ_LONDON_END / KZ_NY_START / KZ_NY_END
+# 与实盘共用 signal_pipeline 中的定义
+
+# ==========================================
+# 参数字典 (参数扫描时逐项覆盖, 默认取上方常量)
+# ==========================================
 
-# Killzones (UTC小时)
-KZ_LONDON_START = 7
-KZ_LONDON_END = 10
-KZ_NY_START = 12
-KZ_NY_END = 15
+def default_params():
+    """当前模块常量组成的策略参数"""
+    return {
+        'initial_capital': INITIAL_CAPITAL,
+        'risk_per_trade': RISK_PER_TRADE,
+        'target_rr': TARGET_RR,
+        'be_trigger_rr': BE_TRIGGER_RR,
+        'atr_multiplier': ATR_MULTIPLIER,
+        'sl_padding_atr': SL_PADDING_ATR,
+        'kz_london_start': KZ_LONDON_START,
+        'kz_london_end': KZ_LONDON_END,
+        'kz_ny_start': KZ_NY_START,
+        'kz_ny_end': KZ_NY_END,
+    }
+
+def resolve_params(params=None):
+    """合并默认参数与覆盖项, 未知参数名直接报错"""
+    merged = default_params()
+    if params:
+        unknown = set(params) - set(merged)
+        if unknown:
+            raise ValueError(f"未知策略参数: {sorted(unknown)}")
+        merged.update(params)
+    return merged
 
 # ==========================================
 # 1. 核心算法
@@ -35,79 +75,104 @@ def is_killzone_hour(timestamp):
 
 def calculate_features(df):
     """计算趋势和ATR"""
-    # EMA 200 趋势
-    df['ema200'] = df['close'].rolling(200).mean()
-
-    # ATR
-    tr = np.maximum(df['high'] - df['low'], np.abs(df['high'] - df['close'].shift(1)))
-    df['atr'] = tr.rolling(14).mean()
-
-    # Body Size
-    df['body_size'] = abs(df['close'] - df['open'])
-
+    with stage("features"):
+        return _calculate_features(df)
+
+def _calculate_features(df):
+    # 单次遍历: EMA 200 趋势 (SMA) / ATR / Body Size / Killzone / FVG 标记 (与实盘 calculate_indicators 同一内核)
+    out = compute_signals(df['open'].values, df['high'].values, df['low'].values,
+                          df['close'].values, df.index.hour, SMA_PERIOD, ATR_PERIOD, ATR_MULTIPLIER)
+    df['ema200'] = out['trend']
+    df['atr'] = out['atr']
+    df['body_size'] = out['body_size']
+    df['in_kz'] = out['in_kz']
+    df['fvg'] = out['fvg']
     return df
 
-def detect_displacement_fvgs(df):
-    """
-    V9.1: 只在 Killzone 时段检测大K线 FVG
-    """
-    fvgs = []
-
-    highs = df['high'].values
-    lows = df['low'].values
-    closes = df['close'].values
-    htf_ema = df['ema200'].values
-    body_size = df['body_size'].values
-    atr = df['atr'].values
+# calculate_features 的 FVG 标记依赖的参数 (覆盖其中任一项时须重算标记)
+SIGNAL_PARAMS = ('atr_multiplier', 'kz_london_start', 'kz_london_end', 'kz_ny_start', 'kz_ny_end')
 
-    print("[分析] 扫描 V9.1 Killzone FVG...")
+def feature_flags(df, params=None):
+    """calculate_features 已算出的 FVG 标记; 缺列或参数与特征计算时不同则返回 None (由调用方重算)"""
+    if 'fvg' not in df.columns:
+        return None
+    p, defaults = resolve_params(params), default_params()
+    if any(p[k] != defaults[k] for k in SIGNAL_PARAMS):
+        return None
+    return df['fvg'].values
 
-    for i in range(2, len(df) - 50):
-        if pd.isna(htf_ema[i]) or pd.isna(atr[i]):
-            continue
+def killzone_mask_hours(hours, params=None):
+    """向量化 Killzone 判定 (输入 UTC 小时数组)"""
+    p = resolve_params(params)
+    hours = np.asarray(hours)
+    return ((hours >= p['kz_london_start']) & (hours <= p['kz_london_end'])) | \
+           ((hours >= p['kz_ny_start']) & (hours <= p['kz_ny_end']))
 
-        # ===== 新增: 时间过滤 =====
-        # 只在 Killzone 时段内识别 FVG
-        if not is_killzone_hour(df.index[i]):
-            continue
+def killzone_mask(index, params=None):
+    """向量化 Killzone 判定: 返回与 index 等长的布尔数组"""
+    return killzone_mask_hours(index.hour, params)
 
-        # 大K线判定 (Body > 1.0 ATR)
-        is_large_candle = body_size[i] > (ATR_MULTIPLIER * atr[i])
+def detect_fvg_records(highs, lows, closes, htf_ema, atr, body_size, in_kz, atr_multiplier,
+                       flags=None):
+    """
+    数组版 FVG 检测 (in_kz 为与 highs 等长的 Killzone 掩码)
+    flags: 信号流水线已算出的逐根 FVG 标记 (calculate_features 的 fvg 列), 为 None 时重算
+    返回 records.FVG_DTYPE 结构化数组 (参数扫描缓存候选 FVG 时不再逐条构造对象)
+    """
+    n = len(highs)
+    if n - 50 <= 2:
+        return fvg_array([], [], [], [])
+
+    # 逐根 FVG 标记 (与实盘 check_structure 同一判定), 扫描区间 [2, n-50)
+    if flags is None:
+        flags = compute_fvg_flags(highs, lows, closes, htf_ema, atr, body_size, in_kz, atr_multiplier)
+    flags = np.asarray(flags)
+    fvg_idx = np.flatnonzero(flags[2:n - 50]) + 2
+    direction = flags[fvg_idx]
+    is_bull = direction == FVG_BULL
+
+    # Bullish: [high[i-2], low[i]];  Bearish: [high[i], low[i-2]]
+    top = np.where(is_bull, lows[fvg_idx], lows[fvg_idx - 2])
+    bottom = np.where(is_bull, highs[fvg_idx - 2], highs[fvg_idx])
+    return fvg_array(fvg_idx, direction, top, bottom)
+
+def detect_fvgs_arrays(highs, lows, closes, htf_ema, atr, body_size, in_kz,
+                       atr_multiplier, times=None, flags=None):
+    """
+    数组版 FVG 检测, 返回 FVGZone 列表 (按 created_at 升序)
+    times 为 None 时 time 字段记录K线序号; flags 见 detect_fvg_records
+    """
+    records = detect_fvg_records(highs, lows, closes, htf_ema, atr, body_size, in_kz, atr_multiplier,
+                                 flags)
+    return zones_from_array(records, times)
 
-        if not is_large_candle:
-            continue
+def detect_displacement_fvgs(df, params=None):
+    """
+    V9.1: 只在 Killzone 时段检测大K线 FVG
+    (向量化版本: 整列计算掩码，结果与逐根扫描完全一致)
+    """
+    p = resolve_params(params)
 
-        # Bullish FVG (顺势做多)
-        if closes[i] > htf_ema[i]:
-            if lows[i] > highs[i-2]:
-                fvgs.append({
-                    'time': df.index[i],
-                    'type': 'Bullish',
-                    'top': lows[i],
-                    'bottom': highs[i-2],
-                    'mitigated': False,
-                    'created_at': i
-                })
-
-        # Bearish FVG (顺势做空)
-        elif closes[i] < htf_ema[i]:
-            if highs[i] < lows[i-2]:
-                fvgs.append({
-                    'time': df.index[i],
-                    'type': 'Bearish',
-                    'top': lows[i-2],
-                    'bottom': highs[i],
-                    'mitigated': False,
-                    'created_at': i
-                })
-
-    return fvgs
+    # ===== 时间过滤: 只在 Killzone 时段内识别 FVG =====
+    with stage("fvg_detect"):
+        return detect_fvgs_arrays(
+            df['high'].values, df['low'].values, df['close'].values,
+            df['ema200'].values, df['atr'].values, df['body_size'].values,
+            killzone_mask(df.index, p), p['atr_multiplier'], times=df.index,
+            flags=feature_flags(df, p)
+        )
 
 # ==========================================
 # 2. 策略引擎
 # ==========================================
 
-def check_signal(i, df, fvgs):
+def check_signal(i, df, fvgs, params=None):
+    """
+    fvgs 可以是 FVGZone 列表，也可以是 ActiveFVGStore (对数时间查找)
+    返回 records.Signal, 无信号时返回 None
+    注意: 原先返回 {'type', 'entry', 'sl', 'fvg'} 字典; 现为属性访问 (signal.direction / entry / sl / fvg),
+    需要旧格式时调用 signal.to_dict()。signal.fvg 是 fvgs 中的同一对象, 调用方据此标记 mitigated
+    """
     if i < 200:
         return None
 
@@ -117,152 +182,155 @@ def check_signal(i, df, fvgs):
     if pd.isna(atr):
         return None
 
+    sl_padding_atr = resolve_params(params)['sl_padding_atr']
+
+    if isinstance(fvgs, ActiveFVGStore):
+        fvg = fvgs.first_touched(i, candle['low'], candle['high'])
+        if fvg is None:
+            return None
+        return _fvg_signal(i, fvg, atr, sl_padding_atr)
+
     for fvg in fvgs:
-        if fvg['created_at'] >= i:
+        if fvg.created_at >= i:
             continue
-        if fvg['mitigated']:
+        if fvg.mitigated:
             continue
-        if i - fvg['created_at'] > 200:
+        if i - fvg.created_at > 200:
             continue
 
         # Long
-        if fvg['type'] == 'Bullish':
-            if candle['low'] <= fvg['top']:
-                sl_price = fvg['bottom'] - (SL_PADDING_ATR * atr)
-                return {
-                    'type': 'LONG',
-                    'entry': fvg['top'],
-                    'sl': sl_price,
-                    'fvg': fvg
-                }
+        if fvg.direction == Direction.LONG:
+            if candle['low'] <= fvg.top:
+                return _fvg_signal(i, fvg, atr, sl_padding_atr)
 
         # Short
-        if fvg['type'] == 'Bearish':
-            if candle['high'] >= fvg['bottom']:
-                sl_price = fvg['top'] + (SL_PADDING_ATR * atr)
-                return {
-                    'type': 'SHORT',
-                    'entry': fvg['bottom'],
-                    'sl': sl_price,
-                    'fvg': fvg
-                }
+        else:
+            if candle['high'] >= fvg.bottom:
+                return _fvg_signal(i, fvg, atr, sl_padding_atr)
 
     return None
 
+def _fvg_signal(i, fvg, atr, sl_padding_atr):
+    """被触及的 FVG -> Signal (入场为近端, 止损为远端外 sl_padding_atr 个 ATR)"""
+    if fvg.direction == Direction.LONG:
+        return Signal(i, Direction.LONG, fvg.top, fvg.bottom - (sl_padding_atr * atr), fvg)
+    return Signal(i, Direction.SHORT, fvg.bottom, fvg.top + (sl_padding_atr * atr), fvg)
+
 # ==========================================
 # 3. 回测循环
 # ==========================================
 
-def run_backtest(df):
+def backtest_core(highs, lows, closes, htf_ema, atr, body_size, in_kz,
+                  params=None, backend=None, times=None, verbose=True, fvg_flags=None):
+    """
+    数组级回测入口 (run_backtest 与参数扫描共用)
+    fvg_flags: 信号流水线已算出的 FVG 标记 (见 feature_flags); 为 None 时按 in_kz / 参数算一次,
+    两个后端都直接使用这份标记
+    返回 (raw_trades, capital, n_fvgs), raw_trades 为 records.TradeRecord 列表
+    """
+    p = resolve_params(params)
+    if fvg_flags is None:
+        fvg_flags = compute_fvg_flags(highs, lows, closes, htf_ema, atr, body_size, in_kz,
+                                      p['atr_multiplier'])
+
+    backend = backend or BACKTEST_BACKEND
+    if backend == "numba" and not NUMBA_AVAILABLE:
+        if verbose:
+            print("[警告] 未安装 numba, 回退到 NumPy 引擎")
+        backend = "numpy"
+
+    if verbose:
+        print("[分析] 扫描 V9.1 Killzone FVG...")
+
+    if backend == "numba":
+        # 编译内核: FVG 提取 + 信号匹配 + 持仓状态机一次完成
+        with stage("backtest_numba"):
+            raw_trades, capital, n_fvgs = run_backtest_numba(
+                highs, lows, atr, fvg_flags,
+                sl_padding_atr=p['sl_padding_atr'],
+                target_rr=p['target_rr'],
+                be_trigger_rr=p['be_trigger_rr'],
+                risk_per_trade=p['risk_per_trade'],
+                initial_capital=p['initial_capital']
+            )
+    else:
+        with stage("fvg_detect"):
+            fvgs = detect_fvgs_arrays(highs, lows, closes, htf_ema, atr, body_size,
+                                      in_kz, p['atr_multiplier'], times=times, flags=fvg_flags)
+        n_fvgs = len(fvgs)
+
+        # 数组撮合引擎: 活跃 FVG 索引 + 向量化首次触及搜索 (不再逐根 df.iloc)
+        raw_trades, capital = run_backtest_arrays(
+            highs, lows, atr, fvgs,
+            initial_capital=p['initial_capital'],
+            risk_per_trade=p['risk_per_trade'],
+            target_rr=p['target_rr'],
+            be_trigger_rr=p['be_trigger_rr'],
+            sl_padding_atr=p['sl_padding_atr']
+        )
+
+    if verbose:
+        print(f"[数据] 筛选出 {n_fvgs} 个 Killzone 动能 FVG")
+
+    return raw_trades, capital, n_fvgs
+
+def run_backtest(df, backend=None, params=None):
     print("[系统] 启动 SMC V9.1 引擎 (Killzones)...")
 
-    print("[预处理] 计算特征...")
-    df = calculate_features(df)
-
-    fvgs = detect_displacement_fvgs(df)
-    print(f"[数据] 筛选出 {len(fvgs)} 个 Killzone 动能 FVG")
-
-    trades = []
-    capital = INITIAL_CAPITAL
-    i = 200
-
-    while i < len(df) - 1:
-        signal = check_signal(i, df, fvgs)
-
-        if signal:
-            entry = signal['entry']
-            sl = signal['sl']
-            direction = signal['type']
-
-            risk = abs(entry - sl)
-            if risk == 0:
-                i += 1
-                continue
-
-            risk_amt = capital * RISK_PER_TRADE
-
-            # 2.0R 目标
-            tp = entry + (risk * TARGET_RR) if direction == 'LONG' else entry - (risk * TARGET_RR)
-            be_trigger = entry + (risk * BE_TRIGGER_RR) if direction == 'LONG' else entry - (risk * BE_TRIGGER_RR)
-
-            outcome = 'Running'
-            pnl = 0
-            signal['fvg']['mitigated'] = True
-            is_be = False
-
-            # 模拟持仓 (持仓不受时间限制)
-            for j in range(i + 1, len(df)):
-                future = df.iloc[j]
-
-                if direction == 'LONG':
-                    current_sl = entry if is_be else sl
-                    if future['low'] <= current_sl:
-                        outcome = 'BE' if is_be else 'Loss'
-                        pnl = 0 if is_be else -risk_amt
-                        break
-                    if future['high'] >= tp:
-                        outcome = 'Win'
-                        pnl = risk_amt * TARGET_RR
-                        break
-                    if not is_be and future['high'] >= be_trigger:
-                        is_be = True
-
-                else:  # SHORT
-                    current_sl = entry if is_be else sl
-                    if future['high'] >= current_sl:
-                        outcome = 'BE' if is_be else 'Loss'
-                        pnl = 0 if is_be else -risk_amt
-                        break
-                    if future['low'] <= tp:
-                        outcome = 'Win'
-                        pnl = risk_amt * TARGET_RR
-                        break
-                    if not is_be and future['low'] <= be_trigger:
-                        is_be = True
-
-            if outcome != 'Running':
-                capital += pnl
-                trades.append({
-                    'Time': df.index[i],
-                    'Type': direction,
-                    'Result': outcome,
-                    'PnL': pnl,
-                    'Balance': capital
-                })
-                i = j
-
-        i += 1
-
-    return pd.DataFrame(trades), capital
+    p = resolve_params(params)
+
+    # 已由特征缓存准备好的数据不再重复计算
+    if 'ema200' not in df.columns:
+        print("[预处理] 计算特征...")
+        df = calculate_features(df)
+
+    raw_trades, capital, _ = backtest_core(
+        df['high'].values, df['low'].values, df['close'].values,
+        df['ema200'].values, df['atr'].values, df['body_size'].values,
+        killzone_mask(df.index, p), params=p, backend=backend, times=df.index,
+        fvg_flags=feature_flags(df, p)
+    )
+
+    return trades_to_frame(raw_trades, df.index), capital
 
 # ==========================================
 # 4. 主程序
 # ==========================================
 
+def load_data(path, float32=False):
+    """读取 OHLC CSV 并设置时间索引 (列式快速加载, 二进制缓存)"""
+    with stage("load"):
+        return load_ohlc(path, float32=float32)
+
+def load_features(path, use_cache=None):
+    """读取数据并计算特征 (命中磁盘缓存时直接加载)"""
+    if use_cache is None:
+        use_cache = USE_FEATURE_CACHE
+    if not use_cache:
+        return calculate_features(load_data(path))
+    with stage("load_features"):
+        return load_cached_features(
+            path, lambda p: calculate_features(load_data(p)),
+            sma_period=SMA_PERIOD, atr_period=ATR_PERIOD,
+            signal_params=(ATR_MULTIPLIER, KZ_LONDON_START, KZ_LONDON_END, KZ_NY_START, KZ_NY_END)
+        )
+
 def main():
     print("=" * 60)
     print(" SMC SYSTEM V9.1 - KILLZONES FILTERED")
     print("=" * 60)
 
     try:
-        df = pd.read_csv(DATA_FILE)
-        df.columns = [c.lower() for c in df.columns]
-
-        # 处理时间戳
-        if 'open_time' in df.columns:
-            df['timestamp'] = pd.to_datetime(df['open_time'], unit='ms')
-        elif 'timestamp' in df.columns:
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
+        with profile_run("backtest"):
+            df = load_features(DATA_FILE)
 
-        df.set_index('timestamp', inplace=True)
+            print(f"\n[数据] 加载 {DATA_FILE}")
+            print(f"[数据] K线数量: {len(df)}")
+            print(f"[数据] 时间范围: {df.index[0]} 到 {df.index[-1]}")
+            print(f"[Killzone] London: 07:00-10:00 UTC")
+            print(f"[Killzone] New York: 12:00-15:00 UTC")
 
-        print(f"\n[数据] 加载 {DATA_FILE}")
-        print(f"[数据] K线数量: {len(df)}")
-        print(f"[数据] 时间范围: {df.index[0]} 到 {df.index[-1]}")
-        print(f"[Killzone] London: 07:00-10:00 UTC")
-        print(f"[Killzone] New York: 12:00-15:00 UTC")
-
-        trades, final_cap = run_backtest(df)
+            trades, final_cap = run_backtest(df)
 
         print("\n" + "=" * 60)
         print(f"最终余额: ${final_cap:,.2f}")
@@ -281,6 +349,14 @@ def main():
         else:
             print("\n无交易记录")
 
+        # 分阶段耗时 (SMC_METRICS=1 时)
+        stages = summary()
+        if stages:
+            print("\n[耗时] 分阶段统计:")
+            for name, (count, total, _) in stages.items():
+                print(f"  {name:<18} {count:>6} 次  {total * 1000:>10.2f} ms")
+            write_prometheus()
+
     except FileNotFoundError:
         print(f"[错误] 找不到文件: {DATA_FILE}")
     except Exception as e:
@@ -0,0 +1,394 @@
+"""
+Multi-Timeframe Resampler (SMC V9.1)
+由 15m 数组合成 1h / 4h / 1d 等高周期K线并计算其 SMA / ATR, 对齐回 15m 用作趋势 (htf_ema) 过滤:
+1. 重采样: 按 UTC 对齐的周期分桶, reduceat 一次向量化聚合 (空桶不生成K线, 与交易所一致)
+2. 指标: RollingMean 在高周期K线上续算 SMA / ATR (公式与 calculate_features 相同)
+3. 无前视对齐: 第 j 根 15m K线收盘时只使用已收盘的高周期K线
+   (高周期K线收盘时间 = 起始 + 周期 <= 15m K线收盘时间)
+4. 增量缓存: 追加新的 15m K线只聚合未收盘的尾部桶与新桶, 已收盘的高周期K线与指标不再重算;
+   不同 SMA / ATR 周期的变体共用同一份高周期K线, 状态可保存到磁盘
+
+用法:
+    python mtf_resampler.py --data BTC_15m_Real.csv --tf 1h 4h --sma 50 100 200
+"""
+import argparse
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+import manual_fvg_v9_1_killzones as v91
+from incremental_indicators import RollingMean
+from param_sweep import summarize_trades
+
+BASE_TIMEFRAME = "15m"
+TIMEFRAMES = ("1h", "4h", "1d")
+CACHE_DIR = ".mtf_cache"
+STATE_VERSION = 2  # v2: 滚动均值状态改为 signal_pipeline 的数组格式
+
+BAR_COLUMNS = ('start', 'open', 'high', 'low', 'close', 'volume')
+_UNIT_MS = {'m': 60_000, 'h': 3_600_000, 'd': 86_400_000, 'w': 604_800_000}
+
+
+def timeframe_ms(tf):
+    """'15m' / '4h' / '1d' -> 毫秒"""
+    try:
+        return int(tf[:-1]) * _UNIT_MS[tf[-1]]
+    except (KeyError, ValueError):
+        raise ValueError(f"无法解析周期: {tf}")
+
+
+def index_to_ms(index):
+    """DatetimeIndex -> 毫秒时间戳数组 (与 ccxt K线时间一致)"""
+    epoch = pd.Timestamp(0, tz='UTC') if index.tz is not None else pd.Timestamp(0)
+    return np.asarray((index - epoch) // pd.Timedelta(milliseconds=1), dtype=np.int64)
+
+
+def resample_ohlcv(times, opens, highs, lows, closes, volumes, tf_ms):
+    """
+    一次向量化聚合: 按 UTC 对齐的 tf_ms 分桶 (输入按时间升序)
+    返回 (bars dict, 各桶在输入中的起始下标)
+    """
+    times = np.asarray(times, dtype=np.int64)
+    if len(times) == 0:
+        return {c: np.empty(0, dtype=np.int64 if c == 'start' else np.float64) for c in BAR_COLUMNS}, \
+            np.empty(0, dtype=np.int64)
+    bucket = times - times % tf_ms
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(bucket)) + 1))
+    last = np.concatenate((starts[1:], [len(times)])) - 1
+    bars = {
+        'start': bucket[starts],
+        'open': np.asarray(opens, dtype=np.float64)[starts],
+        'high': np.maximum.reduceat(np.asarray(highs, dtype=np.float64), starts),
+        'low': np.minimum.reduceat(np.asarray(lows, dtype=np.float64), starts),
+        'close': np.asarray(closes, dtype=np.float64)[last],
+        'volume': np.add.reduceat(np.asarray(volumes, dtype=np.float64), starts),
+    }
+    return bars, starts
+
+
+class _Column:
+    """只追加的数组 (容量倍增, 追加为摊还 O(新增))"""
+
+    def __init__(self, dtype=np.float64, values=None):
+        self.data = np.empty(0 if values is None else len(values), dtype=dtype)
+        self.size = 0
+        if values is not None:
+            self.extend(values)
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self.data.dtype)
+        need = self.size + len(values)
+        if need > len(self.data):
+            grown = np.empty(max(need, 2 * len(self.data), 64), dtype=self.data.dtype)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+        self.data[self.size:need] = values
+        self.size = need
+
+    @property
+    def values(self):
+        return self.data[:self.size]
+
+
+class TimeframeBars:
+    """单个高周期: 已收盘K线 + 未收盘尾部桶的原始 15m K线 + 15m -> 高周期对齐下标"""
+
+    def __init__(self, tf, base_ms):
+        self.tf = tf
+        self.tf_ms = timeframe_ms(tf)
+        if self.tf_ms % base_ms:
+            raise ValueError(f"{tf} 不是基础周期的整数倍")
+        self.base_ms = base_ms
+        self.bars = {c: _Column(np.int64 if c == 'start' else np.float64) for c in BAR_COLUMNS}
+        self.pending = None                 # 未收盘桶的原始K线 (t, o, h, l, c, v)
+        self.align = _Column(np.int64)      # 每根 15m K线收盘时最近一根已收盘高周期K线的下标 (-1 = 无)
+
+    def __len__(self):
+        return self.bars['start'].size
+
+    def update(self, base):
+        """追加新的 15m K线 base = (t, o, h, l, c, v)"""
+        if self.pending is not None:
+            base = tuple(np.concatenate((p, b)) for p, b in zip(self.pending, base))
+        t = base[0]
+        bars, starts = resample_ohlcv(*base, self.tf_ms)
+
+        # 只有最后一个桶可能未收盘: 收盘时间晚于最新 15m K线的收盘时间
+        closed_until = t[-1] + self.base_ms
+        n_closed = int(np.searchsorted(bars['start'] + self.tf_ms, closed_until, side='right'))
+        for c in BAR_COLUMNS:
+            self.bars[c].extend(bars[c][:n_closed])
+        if n_closed < len(starts):
+            self.pending = tuple(col[starts[n_closed]:] for col in base)
+        else:
+            self.pending = None
+
+    def align_new(self, times):
+        """新 15m K线 (收盘时刻) -> 最近一根已收盘高周期K线的下标"""
+        ends = self.bars['start'].values + self.tf_ms
+        self.align.extend(np.searchsorted(ends, times + self.base_ms, side='right') - 1)
+
+
+class MultiTimeframeCache:
+    """
+    多周期增量缓存
+    update(): 追加 15m K线;  aligned(): 取对齐到 15m 的高周期指标
+    指标变体 (tf, sma_period, atr_period) 首次使用时在已收盘的高周期K线上计算, 之后增量续算
+    """
+
+    def __init__(self, base_tf=BASE_TIMEFRAME, timeframes=TIMEFRAMES):
+        self.base_tf = base_tf
+        self.base_ms = timeframe_ms(base_tf)
+        self.frames = {tf: TimeframeBars(tf, self.base_ms) for tf in timeframes}
+        self.variants = {}       # (tf, sma_period, atr_period) -> 指标状态
+        self.n_base = 0
+        self.last_time = None    # 最新 15m K线的开盘时间 (毫秒)
+
+    # ========== 追加 ==========
+
+    def update(self, times, opens, highs, lows, closes, volumes):
+        """追加 15m K线 (按时间升序, 且晚于已缓存的最后一根)"""
+        times = np.asarray(times, dtype=np.int64)
+        if len(times) == 0:
+            return
+        if self.last_time is not None and times[0] <= self.last_time:
+            raise ValueError("追加的K线必须晚于缓存中的最后一根")
+        base = (times,) + tuple(np.asarray(c, dtype=np.float64)
+                                for c in (opens, highs, lows, closes, volumes))
+        for frame in self.frames.values():
+            frame.update(base)
+            frame.align_new(times)
+        self.n_base += len(times)
+        self.last_time = int(times[-1])
+
+    def update_frame(self, df):
+        """追加 OHLC DataFrame 中尚未缓存的K线 (按时间过滤)"""
+        times = index_to_ms(df.index)
+        start = 0 if self.last_time is None else int(np.searchsorted(times, self.last_time, side='right'))
+        if start >= len(times):
+            return
+        self.update(times[start:], df['open'].to_numpy()[start:], df['high'].to_numpy()[start:],
+                    df['low'].to_numpy()[start:], df['close'].to_numpy()[start:],
+                    df['volume'].to_numpy()[start:])
+
+    # ========== 指标 ==========
+
+    def _variant(self, tf, sma_period, atr_period):
+        key = (tf, sma_period, atr_period)
+        var = self.variants.get(key)
+        if var is None:
+            var = {
+                'sma_state': RollingMean(sma_period),
+                'atr_state': RollingMean(atr_period),
+                'prev_close': float('nan'),
+                'sma': _Column(),
+                'atr': _Column(),
+            }
+            self.variants[key] = var
+
+        # 续算新收盘的高周期K线
+        bars = self.frames[tf].bars
+        done = var['sma'].size
+        if done < bars['close'].size:
+            closes = bars['close'].values[done:]
+            highs = bars['high'].values[done:]
+            lows = bars['low'].values[done:]
+            prev = np.concatenate(([var['prev_close']], closes[:-1]))
+            tr = np.maximum(highs - lows, np.abs(highs - prev))
+            var['sma'].extend(var['sma_state'].push_many(closes.tolist()))
+            var['atr'].extend(var['atr_state'].push_many(tr.tolist()))
+            var['prev_close'] = float(closes[-1])
+        return var
+
+    def features(self, tf, sma_period=v91.SMA_PERIOD, atr_period=v91.ATR_PERIOD):
+        """已收盘高周期K线及其指标 DataFrame (索引为高周期K线开盘时间, UTC)"""
+        var = self._variant(tf, sma_period, atr_period)
+        bars = self.frames[tf].bars
+        index = pd.to_datetime(bars['start'].values, unit='ms', utc=True)
+        data = {c: bars[c].values for c in BAR_COLUMNS[1:]}
+        data.update(sma=var['sma'].values, atr=var['atr'].values)
+        return pd.DataFrame(data, index=pd.DatetimeIndex(index, name='timestamp'))
+
+    def aligned(self, tf, column='sma', sma_period=v91.SMA_PERIOD, atr_period=v91.ATR_PERIOD):
+        """
+        对齐到每根 15m K线的高周期值 (只取已收盘的高周期K线, 无前视)
+        column: 'sma' / 'atr' / 'open' / 'high' / 'low' / 'close' / 'volume'
+        """
+        frame = self.frames[tf]
+        if column in ('sma', 'atr'):
+            values = self._variant(tf, sma_period, atr_period)[column].values
+        else:
+            values = frame.bars[column].values
+        idx = frame.align.values
+        out = np.full(len(idx), np.nan)
+        ok = idx >= 0
+        out[ok] = values[idx[ok]]
+        return out
+
+    # ========== 持久化 ==========
+
+    def save(self, out_dir):
+        """整目录原子写入 (数组 .npy + 状态 state.json)"""
+        tmp_dir = out_dir + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        state = {
+            'version': STATE_VERSION,
+            'base_tf': self.base_tf,
+            'n_base': self.n_base,
+            'last_time': self.last_time,
+            'timeframes': list(self.frames),
+            'variants': [],
+        }
+        for tf, frame in self.frames.items():
+            for c in BAR_COLUMNS:
+                np.save(os.path.join(tmp_dir, f"{tf}-{c}.npy"), frame.bars[c].values)
+            np.save(os.path.join(tmp_dir, f"{tf}-align.npy"), frame.align.values)
+            if frame.pending is not None:
+                np.savez(os.path.join(tmp_dir, f"{tf}-pending.npz"), *frame.pending)
+        for k, ((tf, sma_period, atr_period), var) in enumerate(self.variants.items()):
+            np.save(os.path.join(tmp_dir, f"variant{k}-sma.npy"), var['sma'].values)
+            np.save(os.path.join(tmp_dir, f"variant{k}-atr.npy"), var['atr'].values)
+            state['variants'].append({
+                'tf': tf, 'sma_period': sma_period, 'atr_period': atr_period,
+                'sma_state': var['sma_state'].to_dict(),
+                'atr_state': var['atr_state'].to_dict(),
+                'prev_close': var['prev_close'],
+            })
+        with open(os.path.join(tmp_dir, "state.json"), 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+
+        shutil.rmtree(out_dir, ignore_errors=True)
+        os.replace(tmp_dir, out_dir)
+
+    @classmethod
+    def load(cls, out_dir):
+        """从 save() 的目录恢复, 不存在或版本不符返回 None"""
+        state_path = os.path.join(out_dir, "state.json")
+        if not os.path.exists(state_path):
+            return None
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get('version') != STATE_VERSION:
+            return None
+
+        cache = cls(state['base_tf'], state['timeframes'])
+        cache.n_base = state['n_base']
+        cache.last_time = state['last_time']
+        for tf, frame in cache.frames.items():
+            for c in BAR_COLUMNS:
+                frame.bars[c] = _Column(frame.bars[c].data.dtype,
+                                        np.load(os.path.join(out_dir, f"{tf}-{c}.npy")))
+            frame.align = _Column(np.int64, np.load(os.path.join(out_dir, f"{tf}-align.npy")))
+            pending = os.path.join(out_dir, f"{tf}-pending.npz")
+            if os.path.exists(pending):
+                with np.load(pending) as z:
+                    frame.pending = tuple(z[f"arr_{k}"] for k in range(len(z.files)))
+        for k, v in enumerate(state['variants']):
+            cache.variants[(v['tf'], v['sma_period'], v['atr_period'])] = {
+                'sma_state': RollingMean.from_dict(v['sma_state']),
+                'atr_state': RollingMean.from_dict(v['atr_state']),
+                'prev_close': float('nan') if v['prev_close'] is None else v['prev_close'],
+                'sma': _Column(values=np.load(os.path.join(out_dir, f"variant{k}-sma.npy"))),
+                'atr': _Column(values=np.load(os.path.join(out_dir, f"variant{k}-atr.npy"))),
+            }
+        return cache
+
+
+def cache_path(path, timeframes=TIMEFRAMES, cache_dir=None):
+    """数据文件对应的缓存目录 (默认放在数据文件旁边)"""
+    cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIR)
+    tag = "-".join(timeframes)
+    return os.path.join(cache_dir, f"{os.path.splitext(os.path.basename(path))[0]}-{tag}")
+
+
+def load_mtf_cache(path, df=None, timeframes=TIMEFRAMES, cache_dir=None):
+    """
+    数据文件对应的多周期缓存: 磁盘缓存与当前数据的前缀一致时只追加新K线, 否则重建
+    df: 已加载的 OHLC (缺省时 load_data(path))
+    """
+    df = v91.load_data(path) if df is None else df
+    out_dir = cache_path(path, timeframes, cache_dir)
+
+    try:
+        cache = MultiTimeframeCache.load(out_dir)
+    except Exception as e:
+        print(f"[MTF] 缓存读取失败, 重建: {e}")
+        cache = None
+
+    times = index_to_ms(df.index)
+    n = cache.n_base if cache is not None else 0
+    if cache is None or n > len(times) or (n and times[n - 1] != cache.last_time):
+        cache = MultiTimeframeCache(timeframes=timeframes)
+        n = 0
+    if n < len(times):
+        cache.update_frame(df)
+        save_mtf_cache(cache, out_dir)
+    return cache
+
+
+def save_mtf_cache(cache, out_dir):
+    try:
+        os.makedirs(os.path.dirname(out_dir), exist_ok=True)
+        cache.save(out_dir)
+    except OSError as e:
+        print(f"[MTF] 缓存写入失败 (不影响回测): {e}")
+
+# ==========================================
+# 高周期趋势过滤对比
+# ==========================================
+
+def run_bias_variants(df, cache, timeframes, sma_periods, params=None):
+    """
+    htf_ema 分别取 15m SMA200 (基准) 与各高周期 SMA, 其余特征不变
+    返回每个变体的汇总指标 DataFrame
+    """
+    p = v91.resolve_params(params)
+    if 'ema200' not in df.columns:
+        df = v91.calculate_features(df)
+    arrays = [df[c].to_numpy(dtype=np.float64) for c in ('high', 'low', 'close')]
+    atr = df['atr'].to_numpy(dtype=np.float64)
+    body = df['body_size'].to_numpy(dtype=np.float64)
+    in_kz = v91.killzone_mask(df.index, p)
+
+    variants = [(BASE_TIMEFRAME, v91.SMA_PERIOD, df['ema200'].to_numpy(dtype=np.float64))]
+    for tf in timeframes:
+        for period in sma_periods:
+            variants.append((tf, period, cache.aligned(tf, 'sma', sma_period=period)))
+
+    rows = []
+    for tf, period, trend in variants:
+        raw, capital, _ = v91.backtest_core(*arrays, trend, atr, body, in_kz, params=p, verbose=False)
+        rows.append({'trend_tf': tf, 'sma_period': period,
+                     'trend_bars': int(np.count_nonzero(~np.isnan(trend))),
+                     **summarize_trades(raw, capital, p['initial_capital'])})
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SMC V9.1 多周期趋势过滤对比")
+    parser.add_argument('--data', default=v91.DATA_FILE, help="15m OHLC CSV")
+    parser.add_argument('--tf', nargs='+', default=list(TIMEFRAMES), help="高周期")
+    parser.add_argument('--sma', nargs='+', type=int, default=[50, 200], help="高周期 SMA 周期")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(" SMC V9.1 MULTI-TIMEFRAME TREND FILTER")
+    print("=" * 60)
+
+    df = v91.load_features(args.data)
+    cache = load_mtf_cache(args.data, df, timeframes=tuple(args.tf))
+    for tf in args.tf:
+        print(f"[MTF] {tf}: {len(cache.frames[tf])} 根已收盘K线")
+
+    table = run_bias_variants(df, cache, args.tf, args.sma)
+    save_mtf_cache(cache, cache_path(args.data, tuple(args.tf)))  # 连同指标变体状态
+    print("\n" + table.to_string(index=False, float_format=lambda x: f"{x:.2f}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Numba Backtest Kernel (V9.1, 可选后端)
+把 FVG 提取、信号匹配与 LONG/SHORT 持仓状态机 (SL -> TP -> BE) 编译为一个内核,
+输入为 float64 价格数组与信号流水线的 int8 FVG 标记。未安装 numba 时 NUMBA_AVAILABLE=False,
+由 run_backtest 回退到纯 Python/NumPy 路径。
+逻辑与 check_signal + run_backtest 逐条对应, 结果完全一致。
+"""
+import numpy as np
+
+from fvg_store import FVG_MAX_AGE
+from records import Direction, Result, TradeRecord
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# 方向 / 结果编码 (与 records.Direction / records.Result 一致, 内核内按普通整数比较)
+DIR_LONG = int(Direction.LONG)
+DIR_SHORT = int(Direction.SHORT)
+RESULT_WIN = int(Result.WIN)
+RESULT_LOSS = int(Result.LOSS)
+RESULT_BE = int(Result.BE)
+
+
+def _backtest_kernel(highs, lows, atr, fvg, sl_padding_atr, target_rr, be_trigger_rr,
+                     risk_per_trade, initial_capital):
+    """
+    单次编译内核 (fvg: signal_pipeline 的逐根 FVG 标记, FVG_NONE 为 0)
+    返回 (trade_bar, trade_exit, trade_dir, trade_result, trade_entry, trade_sl, trade_tp,
+          trade_pnl, trade_balance, n_trades, capital, n_fvgs)
+    """
+    n = len(highs)
+
+    # ===== 1. FVG 提取 (标记由信号流水线给出, 扫描区间与 detect_displacement_fvgs 一致) =====
+    # 先数出候选 FVG 个数, 缓冲区按候选数分配 (不按K线数 n)
+    n_candidates = 0
+    for i in range(2, n - 50):
+        if fvg[i] == DIR_LONG or fvg[i] == DIR_SHORT:
+            n_candidates += 1
+
+    fvg_bar = np.empty(n_candidates, dtype=np.int64)
+    fvg_dir = np.empty(n_candidates, dtype=np.int64)
+    fvg_top = np.empty(n_candidates, dtype=np.float64)
+    fvg_bottom = np.empty(n_candidates, dtype=np.float64)
+    fvg_mitigated = np.zeros(n_candidates, dtype=np.bool_)
+    n_fvgs = 0
+
+    for i in range(2, n - 50):
+        if fvg[i] == DIR_LONG:
+            fvg_bar[n_fvgs] = i
+            fvg_dir[n_fvgs] = DIR_LONG
+            fvg_top[n_fvgs] = lows[i]
+            fvg_bottom[n_fvgs] = highs[i - 2]
+            n_fvgs += 1
+        elif fvg[i] == DIR_SHORT:
+            fvg_bar[n_fvgs] = i
+            fvg_dir[n_fvgs] = DIR_SHORT
+            fvg_top[n_fvgs] = lows[i - 2]
+            fvg_bottom[n_fvgs] = highs[i]
+            n_fvgs += 1
+
+    # ===== 2. 信号匹配 + 持仓状态机 =====
+    # 每笔交易吃掉一个 FVG: 交易数不超过 FVG 数
+    trade_bar = np.empty(n_fvgs, dtype=np.int64)
+    trade_exit = np.empty(n_fvgs, dtype=np.int64)
+    trade_dir = np.empty(n_fvgs, dtype=np.int64)
+    trade_result = np.empty(n_fvgs, dtype=np.int64)
+    trade_entry = np.empty(n_fvgs, dtype=np.float64)
+    trade_sl = np.empty(n_fvgs, dtype=np.float64)
+    trade_tp = np.empty(n_fvgs, dtype=np.float64)
+    trade_pnl = np.empty(n_fvgs, dtype=np.float64)
+    trade_balance = np.empty(n_fvgs, dtype=np.float64)
+    n_trades = 0
+
+    capital = initial_capital
+    first_live = 0  # 首个未过期 FVG (created_at 单调递增)
+    i = 200
+
+    while i < n - 1:
+        atr_i = atr[i]
+        if np.isnan(atr_i):
+            i += 1
+            continue
+
+        while first_live < n_fvgs and i - fvg_bar[first_live] > FVG_MAX_AGE:
+            first_live += 1
+
+        # 按创建顺序找第一个被触及的 FVG
+        match = -1
+        for f in range(first_live, n_fvgs):
+            if fvg_bar[f] >= i:
+                break
+            if fvg_mitigated[f]:
+                continue
+            if fvg_dir[f] == DIR_LONG:
+                if lows[i] <= fvg_top[f]:
+                    match = f
+                    break
+            else:
+                if highs[i] >= fvg_bottom[f]:
+                    match = f
+                    break
+
+        if match < 0:
+            i += 1
+            continue
+
+        direction = fvg_dir[match]
+        if direction == DIR_LONG:
+            entry = fvg_top[match]
+            sl = fvg_bottom[match] - (sl_padding_atr * atr_i)
+        else:
+            entry = fvg_bottom[match]
+            sl = fvg_top[match] + (sl_padding_atr * atr_i)
+
+        risk = abs(entry - sl)
+        if risk == 0:
+            i += 1
+            continue
+
+        risk_amt = capital * risk_per_trade
+
+        if direction == DIR_LONG:
+            tp = entry + (risk * target_rr)
+            be_trigger = entry + (risk * be_trigger_rr)
+        else:
+            tp = entry - (risk * target_rr)
+            be_trigger = entry - (risk * be_trigger_rr)
+
+        fvg_mitigated[match] = True
+        result = 0
+        pnl = 0.0
+        is_be = False
+
+        j = i + 1
+        while j < n:
+            if direction == DIR_LONG:
+                current_sl = entry if is_be else sl
+                if lows[j] <= current_sl:
+                    result = RESULT_BE if is_be else RESULT_LOSS
+                    pnl = 0.0 if is_be else -risk_amt
+                    break
+                if highs[j] >= tp:
+                    result = RESULT_WIN
+                    pnl = risk_amt * target_rr
+                    break
+                if not is_be and highs[j] >= be_trigger:
+                    is_be = True
+            else:
+                current_sl = entry if is_be else sl
+                if highs[j] >= current_sl:
+                    result = RESULT_BE if is_be else RESULT_LOSS
+                    pnl = 0.0 if is_be else -risk_amt
+                    break
+                if lows[j] <= tp:
+                    result = RESULT_WIN
+                    pnl = risk_amt * target_rr
+                    break
+                if not is_be and lows[j] <= be_trigger:
+                    is_be = True
+            j += 1
+
+        if result != 0:
+            capital += pnl
+            trade_bar[n_trades] = i
+            trade_exit[n_trades] = j
+            trade_dir[n_trades] = direction
+            trade_result[n_trades] = result
+            trade_entry[n_trades] = entry
+            trade_sl[n_trades] = sl
+            trade_tp[n_trades] = tp
+            trade_pnl[n_trades] = pnl
+            trade_balance[n_trades] = capital
+            n_trades += 1
+            i = j
+
+        i += 1
+
+    return (trade_bar, trade_exit, trade_dir, trade_result, trade_entry, trade_sl, trade_tp,
+            trade_pnl, trade_balance, n_trades, capital, n_fvgs)
+
+
+if NUMBA_AVAILABLE:
+    backtest_kernel = njit(cache=True)(_backtest_kernel)
+else:
+    backtest_kernel = None
+
+
+def run_backtest_numba(highs, lows, atr, fvg, sl_padding_atr, target_rr, be_trigger_rr,
+                       risk_per_trade, initial_capital):
+    """
+    调用编译内核 (fvg: signal_pipeline 的 FVG 标记), 返回 (trades, capital, n_fvgs)
+    trades 与 execution_engine.run_backtest_arrays 的格式一致
+    """
+    if not NUMBA_AVAILABLE:
+        raise RuntimeError("numba 未安装, 无法使用编译内核")
+
+    out = backtest_kernel(
+        np.ascontiguousarray(highs, dtype=np.float64),
+        np.ascontiguousarray(lows, dtype=np.float64),
+        np.ascontiguousarray(atr, dtype=np.float64),
+        np.ascontiguousarray(fvg, dtype=np.int8),
+        float(sl_padding_atr), float(target_rr),
+        float(be_trigger_rr), float(risk_per_trade), float(initial_capital)
+    )
+    bars, exits, dirs, results, entries, sls, tps, pnls, balances, n_trades, capital, n_fvgs = out
+
+    trades = [
+        TradeRecord(int(bars[k]), int(exits[k]), Direction(int(dirs[k])), Result(int(results[k])),
+                    float(entries[k]), float(sls[k]), float(tps[k]),
+                    float(pnls[k]), float(balances[k]))
+        for k in range(n_trades)
+    ]
+    return trades, float(capital), int(n_fvgs)
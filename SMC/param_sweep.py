@@ -0,0 +1,232 @@
+"""
+SMC V9.1 Parameter Sweep
+对参数网格 (ATR_MULTIPLIER / SL_PADDING_ATR / TARGET_RR / BE_TRIGGER_RR / KZ_* 等)
+批量回测, 使用 ProcessPoolExecutor 多进程执行:
+1. 特征只在主进程计算一次, OHLC/特征数组放入共享内存, 子进程零拷贝读取
+2. 每组参数完成即输出一行结果 (流式写入 CSV), 最终汇总为一张表
+
+用法:
+    python param_sweep.py --data ETH_15m_Real.csv \\
+        --grid atr_multiplier=0.5,0.75,1.0 --grid target_rr=1.5,2,3 --workers 4
+"""
+import argparse
+import csv
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+import manual_fvg_v9_1_killzones as v91
+from records import Result
+
+# 共享内存中的数组行顺序
+SHARED_COLUMNS = ['high', 'low', 'close', 'ema200', 'atr', 'body_size', 'hour']
+
+SUMMARY_COLUMNS = ['roi_pct', 'win_rate_pct', 'trades', 'wins', 'be_count',
+                   'losses', 'max_drawdown_pct', 'final_capital']
+
+# ==========================================
+# 1. 参数网格与统计
+# ==========================================
+
+def expand_grid(grid):
+    """{'target_rr': [1.5, 2.0], ...} -> 参数字典列表 (笛卡尔积)"""
+    if not grid:
+        return [{}]
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+def max_drawdown_pct(balances, initial_capital):
+    """按逐笔余额 (含初始资金) 计算最大回撤百分比"""
+    if len(balances) == 0:
+        return 0.0
+    equity = np.concatenate(([initial_capital], np.asarray(balances, dtype=np.float64)))
+    peak = np.maximum.accumulate(equity)
+    return float(((peak - equity) / peak).max() * 100)
+
+def summarize_trades(raw_trades, capital, initial_capital):
+    """把一次回测的交易列表 (TradeRecord) 压缩为汇总指标"""
+    return _summary([t.result for t in raw_trades], [t.balance for t in raw_trades],
+                    capital, initial_capital)
+
+def summarize_report(trades, capital, initial_capital):
+    """报告 DataFrame (Result 列为 Win / Loss / BE) 的汇总指标"""
+    codes = {r.label: r for r in Result}
+    return _summary([codes[x] for x in trades['Result']], trades['Balance'].tolist(),
+                    capital, initial_capital)
+
+def _summary(results, balances, capital, initial_capital):
+    wins = results.count(Result.WIN)
+    be_count = results.count(Result.BE)
+    losses = results.count(Result.LOSS)
+    n = len(results)
+    return {
+        'roi_pct': (capital - initial_capital) / initial_capital * 100,
+        'win_rate_pct': wins / n * 100 if n else 0.0,
+        'trades': n,
+        'wins': wins,
+        'be_count': be_count,
+        'losses': losses,
+        'max_drawdown_pct': max_drawdown_pct(balances, initial_capital),
+        'final_capital': capital,
+    }
+
+# ==========================================
+# 2. 共享内存与子进程
+# ==========================================
+
+_worker_shm = None
+_worker_arrays = None
+_worker_backend = None
+
+def share_features(df):
+    """把特征列写入一块共享内存, 返回 (shm, shape)"""
+    n = len(df)
+    shape = (len(SHARED_COLUMNS), n)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * 8))
+    block = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    for row, col in enumerate(SHARED_COLUMNS):
+        if col == 'hour':
+            block[row] = df.index.hour
+        else:
+            block[row] = df[col].values
+    return shm, shape
+
+def _init_worker(shm_name, shape, backend):
+    """子进程初始化: 挂载共享内存 (只读视图, 不复制数据)"""
+    global _worker_shm, _worker_arrays, _worker_backend
+    _worker_shm = shared_memory.SharedMemory(name=shm_name)
+    block = np.ndarray(shape, dtype=np.float64, buffer=_worker_shm.buf)
+    block.flags.writeable = False
+    _worker_arrays = dict(zip(SHARED_COLUMNS, block))
+    _worker_backend = backend
+
+def _run_one(params):
+    """子进程任务: 用一组参数跑完整回测并返回汇总"""
+    return params, run_on_arrays(_worker_arrays, params, _worker_backend)
+
+def run_on_arrays(arrays, params, backend=None):
+    """在特征数组上执行一次回测并返回汇总指标"""
+    p = v91.resolve_params(params)
+    in_kz = v91.killzone_mask_hours(arrays['hour'], p)
+    raw_trades, capital, _ = v91.backtest_core(
+        arrays['high'], arrays['low'], arrays['close'], arrays['ema200'],
+        arrays['atr'], arrays['body_size'], in_kz,
+        params=p, backend=backend, verbose=False
+    )
+    return summarize_trades(raw_trades, capital, p['initial_capital'])
+
+# ==========================================
+# 3. 扫描主流程
+# ==========================================
+
+def run_sweep(df, grid, workers=None, backend=None, out_file=None, on_result=None):
+    """
+    参数扫描
+    df: 原始 OHLC (未计算特征亦可)
+    grid: {参数名: 取值列表}
+    out_file: 结果逐行流式写入的 CSV 路径 (可选)
+    on_result: 每完成一组参数时的回调 (params, summary)
+    返回按 ROI 降序排列的汇总 DataFrame
+    """
+    combos = expand_grid(grid)
+    for params in combos:
+        v91.resolve_params(params)  # 提前校验参数名
+
+    if 'ema200' not in df.columns:
+        df = v91.calculate_features(df)
+
+    param_names = sorted({k for params in combos for k in params})
+    rows = []
+
+    writer = None
+    fh = None
+    if out_file:
+        fh = open(out_file, 'w', newline='', encoding='utf-8')
+        writer = csv.DictWriter(fh, fieldnames=param_names + SUMMARY_COLUMNS)
+        writer.writeheader()
+
+    shm, shape = share_features(df)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(shm.name, shape, backend)) as pool:
+            futures = [pool.submit(_run_one, params) for params in combos]
+            for future in as_completed(futures):
+                params, summary = future.result()
+                row = {**params, **summary}
+                rows.append(row)
+                if writer:
+                    writer.writerow(row)
+                    fh.flush()
+                if on_result:
+                    on_result(params, summary)
+    finally:
+        shm.close()
+        shm.unlink()
+        if fh:
+            fh.close()
+
+    table = pd.DataFrame(rows, columns=param_names + SUMMARY_COLUMNS)
+    return table.sort_values('roi_pct', ascending=False).reset_index(drop=True)
+
+# ==========================================
+# 4. 命令行
+# ==========================================
+
+def _parse_value(text):
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+def parse_grid(items):
+    """['target_rr=1.5,2', 'kz_ny_end=14,15'] -> {'target_rr': [1.5, 2], ...}"""
+    grid = {}
+    for item in items or []:
+        if '=' not in item:
+            raise ValueError(f"网格参数格式应为 name=v1,v2,...: {item}")
+        name, values = item.split('=', 1)
+        grid[name.strip().lower()] = [_parse_value(v) for v in values.split(',') if v.strip()]
+    return grid
+
+def main():
+    parser = argparse.ArgumentParser(description="SMC V9.1 参数扫描")
+    parser.add_argument('--data', default=v91.DATA_FILE, help="OHLC CSV 文件")
+    parser.add_argument('--grid', action='append', help="参数网格, 如 target_rr=1.5,2,3 (可重复)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="进程数")
+    parser.add_argument('--backend', choices=['numpy', 'numba'], default=None, help="回测后端")
+    parser.add_argument('--out', default=None, help="结果 CSV (流式写入)")
+    parser.add_argument('--top', type=int, default=20, help="打印前 N 组结果")
+    args = parser.parse_args()
+
+    grid = parse_grid(args.grid)
+    combos = expand_grid(grid)
+
+    print("=" * 60)
+    print(f" SMC V9.1 PARAMETER SWEEP - {len(combos)} 组参数 / {args.workers} 进程")
+    print("=" * 60)
+
+    df = v91.load_features(args.data)
+    print(f"[数据] 加载 {args.data} ({len(df)} 根K线)")
+
+    done = [0]
+
+    def report(params, summary):
+        done[0] += 1
+        print(f"[{done[0]}/{len(combos)}] {params} -> ROI {summary['roi_pct']:.2f}% | "
+              f"胜率 {summary['win_rate_pct']:.2f}% | 保本 {summary['be_count']} | "
+              f"回撤 {summary['max_drawdown_pct']:.2f}%")
+
+    table = run_sweep(df, grid, workers=args.workers, backend=args.backend,
+                      out_file=args.out, on_result=report)
+
+    print("\n" + "=" * 60)
+    print(table.head(args.top).to_string(index=False))
+    if args.out:
+        print(f"\n[输出] 完整结果已写入 {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+SMC V9.1 Portfolio Backtest
+多标的组合回测: 每个标的在独立子进程中运行 V9.1 引擎, 再把各自的交易流
+按时间合并为一条 "共用资金" 的权益曲线:
+1. 开仓时按当时已实现的组合资金 * RISK_PER_TRADE 计算风险金额
+2. 平仓时按 R 倍数 (Win=+TARGET_RR, Loss=-1, BE=0) 结算盈亏
+3. 同一时间戳先处理开仓再处理平仓 (开仓只使用此前已实现的资金)
+
+用法:
+    python portfolio_backtest.py                       # BTC + ETH + SOL
+    python portfolio_backtest.py --symbols BTC ETH --workers 2
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import manual_fvg_v9_1_killzones as v91
+from records import Result
+from param_sweep import summarize_report
+
+# 仓库自带的三个市场
+PORTFOLIO_FILES = {
+    'BTC': "BTC_15m_Real.csv",
+    'ETH': "ETH_15m_Real.csv",
+    'SOL': "SOL_15m_Real.csv",
+}
+
+# ==========================================
+# 1. 单标的 (子进程)
+# ==========================================
+
+def run_symbol(symbol, path, params=None, backend=None):
+    """
+    子进程任务: 单标的回测, 返回 (symbol, 交易列表)
+    交易只携带时间与 R 倍数, 资金由组合层统一结算
+    """
+    p = v91.resolve_params(params)
+    df = v91.load_features(path)
+    raw_trades, _, _ = v91.backtest_core(
+        df['high'].values, df['low'].values, df['close'].values,
+        df['ema200'].values, df['atr'].values, df['body_size'].values,
+        v91.killzone_mask(df.index, p), params=p, backend=backend, verbose=False,
+        fvg_flags=v91.feature_flags(df, p)
+    )
+
+    r_multiple = {Result.WIN: p['target_rr'], Result.LOSS: -1.0, Result.BE: 0.0}
+    trades = []
+    for t in raw_trades:
+        trades.append({
+            'Symbol': symbol,
+            'Time': df.index[t.bar],
+            'ExitTime': df.index[t.exit_bar],
+            'Type': t.direction.label,
+            'Result': t.result.label,
+            'R': r_multiple[t.result],
+        })
+    return symbol, trades
+
+# ==========================================
+# 2. 组合合并
+# ==========================================
+
+def merge_trade_streams(streams, initial_capital, risk_per_trade):
+    """
+    把多个标的的交易流合并为共用资金的权益曲线
+    streams: {symbol: [trade, ...]}
+    返回按平仓时间排序的 DataFrame (含 PnL / Balance) 与最终资金
+    """
+    events = []
+    for trades in streams.values():
+        for k, t in enumerate(trades):
+            # (时间, 0=开仓 / 1=平仓, 标的, 序号)
+            events.append((t['Time'], 0, t['Symbol'], k, t))
+            events.append((t['ExitTime'], 1, t['Symbol'], k, t))
+    events.sort(key=lambda e: e[:4])
+
+    capital = initial_capital
+    risk_amt = {}
+    rows = []
+
+    for _, kind, symbol, k, t in events:
+        key = (symbol, k)
+        if kind == 0:
+            risk_amt[key] = capital * risk_per_trade
+            continue
+
+        risk = risk_amt.pop(key)
+        pnl = risk * t['R']
+        capital += pnl
+        rows.append({**t, 'RiskAmt': risk, 'PnL': pnl, 'Balance': capital})
+
+    columns = ['Symbol', 'Time', 'ExitTime', 'Type', 'Result', 'R', 'RiskAmt', 'PnL', 'Balance']
+    return pd.DataFrame(rows, columns=columns), capital
+
+def run_portfolio(symbols=None, params=None, workers=None, backend=None, data_dir=None):
+    """
+    多标的并行回测 + 共用资金合并
+    symbols: {symbol: csv 路径} 或标的列表 (使用 PORTFOLIO_FILES)
+    返回 (组合交易 DataFrame, 最终资金, {symbol: 单标的交易列表})
+    """
+    p = v91.resolve_params(params)
+    if symbols is None:
+        symbols = dict(PORTFOLIO_FILES)
+    elif not isinstance(symbols, dict):
+        symbols = {s: PORTFOLIO_FILES[s] for s in symbols}
+
+    data_dir = data_dir or os.path.dirname(os.path.abspath(__file__))
+    paths = {s: path if os.path.isabs(path) else os.path.join(data_dir, path)
+             for s, path in symbols.items()}
+
+    streams = {}
+    with ProcessPoolExecutor(max_workers=workers or len(paths)) as pool:
+        futures = [pool.submit(run_symbol, s, path, params, backend) for s, path in paths.items()]
+        for future in futures:
+            symbol, trades = future.result()
+            streams[symbol] = trades
+
+    merged, capital = merge_trade_streams(streams, p['initial_capital'], p['risk_per_trade'])
+    return merged, capital, streams
+
+# ==========================================
+# 3. 主程序
+# ==========================================
+
+def main():
+    parser = argparse.ArgumentParser(description="SMC V9.1 多标的组合回测")
+    parser.add_argument('--symbols', nargs='+', default=list(PORTFOLIO_FILES),
+                        help=f"标的列表 (可选: {', '.join(PORTFOLIO_FILES)})")
+    parser.add_argument('--workers', type=int, default=None, help="进程数 (默认每个标的一个)")
+    parser.add_argument('--backend', choices=['numpy', 'numba'], default=None, help="回测后端")
+    parser.add_argument('--out', default=None, help="组合交易明细 CSV")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f" SMC V9.1 PORTFOLIO - {' / '.join(args.symbols)}")
+    print("=" * 60)
+
+    p = v91.resolve_params()
+    merged, capital, streams = run_portfolio(args.symbols, workers=args.workers,
+                                             backend=args.backend)
+
+    for symbol in args.symbols:
+        results = [t['Result'] for t in streams[symbol]]
+        print(f"[{symbol}] 交易 {len(results)} | 盈利 {results.count('Win')} | "
+              f"保本 {results.count('BE')} | 亏损 {results.count('Loss')}")
+
+    summary = summarize_report(merged, capital, p['initial_capital'])
+
+    print("\n" + "=" * 60)
+    print(f"组合最终余额: ${capital:,.2f}")
+    print(f"ROI: {summary['roi_pct']:.2f}%")
+    print(f"总交易: {summary['trades']} | 胜率: {summary['win_rate_pct']:.2f}%")
+    print(f"最大回撤: {summary['max_drawdown_pct']:.2f}%")
+
+    if args.out:
+        merged.to_csv(args.out, index=False)
+        print(f"\n[输出] 组合交易明细已写入 {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""
+Compact Records (SMC V9.1)
+FVG / 信号 / 交易记录的紧凑表示, 替代热循环中的 dict 与字符串比较:
+1. 方向 / 结果 / FVG 状态为整数枚举 (编码与 numba_kernel、signal_pipeline 一致)
+2. FVGZone / Signal / TradeRecord 为 __slots__ 类, 无实例 __dict__
+3. 批量 FVG / 交易可转为 NumPy 结构化数组 (FVG 每条 26 字节), 参数扫描缓存候选 FVG 用
+4. 报告与存档: 转换为 DataFrame (Time/Type/Result/PnL/Balance) 与 trade_history.json 记录格式
+"""
+import json
+from enum import IntEnum
+
+import numpy as np
+import pandas as pd
+
+
+class Direction(IntEnum):
+    """交易方向 (FVG: Bullish -> LONG, Bearish -> SHORT)"""
+    LONG = 1
+    SHORT = -1
+
+    @property
+    def label(self):
+        return 'LONG' if self is Direction.LONG else 'SHORT'
+
+    @property
+    def fvg_type(self):
+        return 'Bullish' if self is Direction.LONG else 'Bearish'
+
+    @classmethod
+    def parse(cls, text):
+        """'LONG' / 'SHORT' / 'Bullish' / 'Bearish' / 实盘信号的 HTML 方向文本 -> Direction"""
+        return cls.LONG if 'LONG' in text or text == 'Bullish' else cls.SHORT
+
+
+class Result(IntEnum):
+    """平仓结果 (RUNNING: 数据结束仍未平仓)"""
+    RUNNING = 0
+    WIN = 1
+    LOSS = 2
+    BE = 3
+
+    @property
+    def label(self):
+        """回测报告格式: Win / Loss / BE / Running"""
+        return _RESULT_LABELS[self]
+
+    @property
+    def store_label(self):
+        """实盘交易库格式: WIN / LOSS / BE / PENDING"""
+        return _STORE_LABELS[self]
+
+
+_RESULT_LABELS = {Result.RUNNING: 'Running', Result.WIN: 'Win', Result.LOSS: 'Loss', Result.BE: 'BE'}
+_STORE_LABELS = {Result.RUNNING: 'PENDING', Result.WIN: 'WIN', Result.LOSS: 'LOSS', Result.BE: 'BE'}
+
+
+class FVGStatus(IntEnum):
+    ACTIVE = 0
+    MITIGATED = 1
+
+# ==========================================
+# 1. __slots__ 记录
+# ==========================================
+
+class FVGZone:
+    """单个 FVG 区间 (created_at 为形成K线序号, time 为其时间或序号)"""
+    __slots__ = ('created_at', 'direction', 'top', 'bottom', 'status', 'time')
+
+    def __init__(self, created_at, direction, top, bottom, time=None, status=FVGStatus.ACTIVE):
+        self.created_at = created_at
+        self.direction = direction
+        self.top = top
+        self.bottom = bottom
+        self.status = status
+        self.time = created_at if time is None else time
+
+    @property
+    def mitigated(self):
+        return self.status == FVGStatus.MITIGATED
+
+    @mitigated.setter
+    def mitigated(self, value):
+        self.status = FVGStatus.MITIGATED if value else FVGStatus.ACTIVE
+
+    def copy(self):
+        return FVGZone(self.created_at, self.direction, self.top, self.bottom, self.time, self.status)
+
+    def to_dict(self):
+        """旧版 dict 格式 (time / type / top / bottom / mitigated / created_at)"""
+        return {
+            'time': self.time,
+            'type': Direction(self.direction).fvg_type,
+            'top': self.top,
+            'bottom': self.bottom,
+            'mitigated': self.mitigated,
+            'created_at': self.created_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['created_at'], Direction.parse(data['type']), data['top'], data['bottom'],
+                   data.get('time'), FVGStatus.MITIGATED if data.get('mitigated') else FVGStatus.ACTIVE)
+
+    def __repr__(self):
+        return (f"FVGZone({Direction(self.direction).fvg_type} @{self.created_at} "
+                f"[{self.bottom}, {self.top}] {FVGStatus(self.status).name})")
+
+
+class Signal:
+    """回测入场信号 (check_signal 输出)"""
+    __slots__ = ('bar', 'direction', 'entry', 'sl', 'fvg')
+
+    def __init__(self, bar, direction, entry, sl, fvg):
+        self.bar = bar
+        self.direction = direction
+        self.entry = entry
+        self.sl = sl
+        self.fvg = fvg
+
+    def to_dict(self):
+        return {
+            'type': Direction(self.direction).label,
+            'entry': self.entry,
+            'sl': self.sl,
+            'fvg': self.fvg.to_dict(),
+        }
+
+    def __repr__(self):
+        return f"Signal({Direction(self.direction).label} @{self.bar} entry={self.entry} sl={self.sl})"
+
+
+class TradeRecord:
+    """
+    已平仓交易: bar / exit_bar 为入场 / 离场K线序号
+    time 只在调用方没有完整时间索引时填写 (流式回测)
+    """
+    __slots__ = ('bar', 'exit_bar', 'direction', 'result', 'entry', 'sl', 'tp', 'pnl', 'balance',
+                 'time')
+
+    def __init__(self, bar, exit_bar, direction, result, entry, sl, tp, pnl, balance, time=None):
+        self.bar = bar
+        self.exit_bar = exit_bar
+        self.direction = direction
+        self.result = result
+        self.entry = entry
+        self.sl = sl
+        self.tp = tp
+        self.pnl = pnl
+        self.balance = balance
+        self.time = time
+
+    @property
+    def close_price(self):
+        """离场价: 止盈 / 止损 / 保本 (入场价)"""
+        if self.result == Result.WIN:
+            return self.tp
+        if self.result == Result.LOSS:
+            return self.sl
+        return self.entry
+
+    def to_row(self, index=None):
+        """回测报告行 (与 run_backtest 输出的 DataFrame 列一致)"""
+        return {
+            'Time': index[self.bar] if index is not None else self.time,
+            'Type': Direction(self.direction).label,
+            'Result': Result(self.result).label,
+            'PnL': self.pnl,
+            'Balance': self.balance,
+        }
+
+    def __repr__(self):
+        return (f"TradeRecord({Direction(self.direction).label} {self.bar}->{self.exit_bar} "
+                f"{Result(self.result).label} pnl={self.pnl})")
+
+# ==========================================
+# 2. 结构化数组
+# ==========================================
+
+FVG_DTYPE = np.dtype([
+    ('created_at', np.int64),
+    ('direction', np.int8),
+    ('top', np.float64),
+    ('bottom', np.float64),
+    ('status', np.int8),
+])
+
+TRADE_DTYPE = np.dtype([
+    ('bar', np.int64),
+    ('exit_bar', np.int64),
+    ('direction', np.int8),
+    ('result', np.int8),
+    ('entry', np.float64),
+    ('sl', np.float64),
+    ('tp', np.float64),
+    ('pnl', np.float64),
+    ('balance', np.float64),
+])
+
+
+def fvg_array(created_at, direction, top, bottom):
+    """按列构造 FVG 结构化数组 (状态全部为 ACTIVE)"""
+    arr = np.zeros(len(created_at), dtype=FVG_DTYPE)
+    arr['created_at'] = created_at
+    arr['direction'] = direction
+    arr['top'] = top
+    arr['bottom'] = bottom
+    return arr
+
+
+def fvgs_to_array(fvgs):
+    """FVGZone 列表 -> 结构化数组"""
+    arr = np.zeros(len(fvgs), dtype=FVG_DTYPE)
+    for k, f in enumerate(fvgs):
+        arr[k] = (f.created_at, f.direction, f.top, f.bottom, f.status)
+    return arr
+
+
+def zones_from_array(arr, times=None):
+    """
+    结构化数组 -> 新的 FVGZone 列表 (每次调用互不共享 mitigated 状态)
+    times: K线时间索引; 为 None 时 time 记录K线序号
+    """
+    created = arr['created_at'].tolist()
+    fvg_times = times[arr['created_at']] if times is not None else created
+    return [FVGZone(c, Direction(d), top, bottom, t, FVGStatus(s))
+            for c, d, top, bottom, s, t in zip(created, arr['direction'].tolist(), arr['top'].tolist(),
+                                               arr['bottom'].tolist(), arr['status'].tolist(), fvg_times)]
+
+
+def trades_to_array(trades):
+    """TradeRecord 列表 -> 结构化数组"""
+    arr = np.zeros(len(trades), dtype=TRADE_DTYPE)
+    for k, t in enumerate(trades):
+        arr[k] = (t.bar, t.exit_bar, t.direction, t.result, t.entry, t.sl, t.tp, t.pnl, t.balance)
+    return arr
+
+# ==========================================
+# 3. DataFrame / JSON
+# ==========================================
+
+def fvgs_to_frame(fvgs):
+    """FVG 列表 -> DataFrame (列与旧版 dict 字段一致)"""
+    return pd.DataFrame([f.to_dict() for f in fvgs],
+                        columns=['time', 'type', 'top', 'bottom', 'mitigated', 'created_at'])
+
+
+def trades_to_frame(trades, index=None):
+    """交易列表 -> 报告 DataFrame (Time / Type / Result / PnL / Balance), 与逐行 to_row 拼接结果一致"""
+    if not trades:
+        return pd.DataFrame([])
+    # 按列构造: 时间索引一次性取出, 不逐笔索引 DatetimeIndex
+    times = list(index[[t.bar for t in trades]]) if index is not None else [t.time for t in trades]
+    return pd.DataFrame({
+        'Time': times,
+        'Type': [Direction(t.direction).label for t in trades],
+        'Result': [Result(t.result).label for t in trades],
+        'PnL': [t.pnl for t in trades],
+        'Balance': [t.balance for t in trades],
+    })
+
+
+def trades_to_history(trades, index, symbol):
+    """回测交易 -> trade_history.json / TradeStore 记录格式 (trade_store.TRADE_FIELDS)"""
+    return [{
+        'symbol': symbol,
+        'time': index[t.bar].isoformat(),
+        'type': Direction(t.direction).label,
+        'entry': float(t.entry),
+        'sl': float(t.sl),
+        'tp': float(t.tp),
+        'status': 'CLOSED',
+        'result': Result(t.result).store_label,
+        'close_price': float(t.close_price),
+        'close_time': index[t.exit_bar].isoformat(),
+    } for t in trades]
+
+
+def write_trade_history(path, trades, index, symbol):
+    """写出 trade_history.json 格式文件 (可由 TradeStore.migrate_json 导入)"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(trades_to_history(trades, index, symbol), f, indent=2, ensure_ascii=False)
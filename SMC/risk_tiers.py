@@ -0,0 +1,24 @@
+"""
+Risk Tiers (SMC V9.1)
+实盘 LocalRiskManager 与离线稳健性分析 (robustness_analysis) 共用的动态风险档位:
+1. 连亏分档: 10+ 笔 1% / 5+ 笔 2% / 2+ 笔 3% / 否则 5%
+2. 单日亏损熔断: 今日亏损达到 DAILY_LOSS_LIMIT 笔时风险为 0
+纯常量与函数, 无导入副作用 (不读取 Telegram 配置, 不创建交易所客户端)
+"""
+
+# 动态风险档位: (连亏笔数下限, 风险比例), 自上而下取第一个满足的档位
+RISK_TIERS = [(10, 0.01), (5, 0.02), (2, 0.03), (0, 0.05)]
+DAILY_LOSS_LIMIT = 3     # 今日亏损笔数达到后熔断 (覆盖其他档位)
+
+
+def tier_risk_percent(consecutive_loss, daily_loss):
+    """
+    动态风险档位 (基于连续亏损): 10+ 笔 1% 严防死守 / 5+ 笔 2% 防守 / 2+ 笔 3% 谨慎 / 否则 5% 正常
+    熔断机制: 今日亏损达到 DAILY_LOSS_LIMIT 笔时返回 0 (停止交易)
+    """
+    if daily_loss >= DAILY_LOSS_LIMIT:
+        return 0
+    for min_losses, risk_percent in RISK_TIERS:
+        if consecutive_loss >= min_losses:
+            return risk_percent
+    return RISK_TIERS[-1][1]
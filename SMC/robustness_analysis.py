@@ -0,0 +1,350 @@
+"""
+SMC V9.1 Robustness Analysis
+在 run_backtest 之上的稳健性分析 (特征与 FVG 只计算一次, 所有窗口 / 参数组复用):
+1. 滚动 Walk-Forward: 训练窗口内按参数网格选优, 紧随其后的测试窗口做样本外检验
+2. Monte Carlo: 对交易序列的 R 倍数 (Win=+TARGET_RR, Loss=-1, BE=0) 重抽样,
+   成千上万条路径按批量 NumPy 运算模拟复利资金曲线, 输出最终收益 / 最大回撤分布与破产概率
+3. 仓位模型:
+   fixed  固定比例 RISK_PER_TRADE (与 run_backtest 一致, 原顺序时最终资金逐位相同)
+   tiers  实盘 LocalRiskManager 的 5%/3%/2%/1% 连亏分档 + 单日亏损熔断
+          (按原交易序列的信号日期分组计算当日亏损, 重抽样只替换每笔的结果)
+
+用法:
+    python robustness_analysis.py --data BTC_15m_Real.csv --sims 10000
+    python robustness_analysis.py --data ETH_15m_Real.csv --grid target_rr=1.5,2,3 \\
+        --train-bars 2016 --test-bars 672 --sizing fixed tiers --method shuffle
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import manual_fvg_v9_1_killzones as v91
+from execution_engine import run_backtest_arrays
+from records import Result, zones_from_array
+from param_sweep import expand_grid, parse_grid, summarize_trades
+from risk_tiers import DAILY_LOSS_LIMIT, RISK_TIERS
+
+SIMULATIONS = 10_000
+TRAIN_BARS = 2016        # 21 天 15m K线
+TEST_BARS = 672          # 7 天
+RUIN_DRAWDOWN = 0.5      # 资金较初始回撤 50% 视为破产
+DRAWDOWN_LEVELS = (0.1, 0.2, 0.3, 0.5)
+PERCENTILES = (5, 25, 50, 75, 95)
+SIZING_MODELS = ('fixed', 'tiers')
+
+# FVG 检测只依赖这些参数, 其余参数组共用同一份 FVG 列表
+DETECTION_PARAMS = ('atr_multiplier', 'kz_london_start', 'kz_london_end', 'kz_ny_start', 'kz_ny_end')
+
+# ==========================================
+# 1. 复用特征 / FVG 的回测
+# ==========================================
+
+def feature_arrays(df):
+    """特征帧 -> 回测用数组 (只取一次, 各窗口共用)"""
+    if 'ema200' not in df.columns:
+        df = v91.calculate_features(df)
+    return {
+        'high': df['high'].to_numpy(dtype=np.float64),
+        'low': df['low'].to_numpy(dtype=np.float64),
+        'close': df['close'].to_numpy(dtype=np.float64),
+        'ema200': df['ema200'].to_numpy(dtype=np.float64),
+        'atr': df['atr'].to_numpy(dtype=np.float64),
+        'body_size': df['body_size'].to_numpy(dtype=np.float64),
+        'hour': np.asarray(df.index.hour),
+        'day': utc_days(df.index),
+    }
+
+
+def utc_days(index):
+    """DatetimeIndex -> UTC 日序号 (自 1970-01-01 起的天数)"""
+    if index.tz is not None:
+        index = index.tz_convert(None)
+    return index.to_numpy().astype('datetime64[D]').astype(np.int64)
+
+
+def cached_fvgs(arrays, p, cache):
+    """按检测参数缓存 FVG 结构化数组, 每次返回新的 FVGZone 列表 (mitigated 标记互不影响)"""
+    key = tuple(p[k] for k in DETECTION_PARAMS)
+    if key not in cache:
+        cache[key] = v91.detect_fvg_records(
+            arrays['high'], arrays['low'], arrays['close'], arrays['ema200'], arrays['atr'],
+            arrays['body_size'], v91.killzone_mask_hours(arrays['hour'], p), p['atr_multiplier']
+        )
+    return zones_from_array(cache[key])
+
+
+def backtest_window(arrays, params=None, first_bar=200, last_bar=None, end_bar=None, cache=None):
+    """
+    只在 [first_bar, last_bar) 内入场的回测
+    end_bar: 可用于结算持仓的K线上限 (训练窗口设为窗口末尾, 避免用到测试期数据)
+    返回 (raw_trades, capital)
+    """
+    p = v91.resolve_params(params)
+    fvgs = cached_fvgs(arrays, p, {} if cache is None else cache)
+    end = end_bar if end_bar is not None else len(arrays['high'])
+    return run_backtest_arrays(
+        arrays['high'][:end], arrays['low'][:end], arrays['atr'][:end], fvgs,
+        initial_capital=p['initial_capital'],
+        risk_per_trade=p['risk_per_trade'],
+        target_rr=p['target_rr'],
+        be_trigger_rr=p['be_trigger_rr'],
+        sl_padding_atr=p['sl_padding_atr'],
+        first_bar=first_bar, last_bar=last_bar
+    )
+
+
+def trade_sequence(raw_trades, arrays, target_rr):
+    """交易列表 -> (R 倍数数组, 信号 UTC 日序号数组)"""
+    r_multiple = {Result.WIN: target_rr, Result.LOSS: -1.0, Result.BE: 0.0}
+    r = np.array([r_multiple[t.result] for t in raw_trades], dtype=np.float64)
+    days = np.array([arrays['day'][t.bar] for t in raw_trades], dtype=np.int64)
+    return r, days
+
+# ==========================================
+# 2. Walk-Forward
+# ==========================================
+
+def walk_forward_windows(n, train_bars, test_bars, warmup=200):
+    """滚动窗口 [(train_start, test_start, test_end), ...], 步长 = test_bars"""
+    windows = []
+    start = warmup
+    while start + train_bars + test_bars <= n:
+        windows.append((start, start + train_bars, start + train_bars + test_bars))
+        start += test_bars
+    return windows
+
+
+def walk_forward(arrays, index, train_bars=TRAIN_BARS, test_bars=TEST_BARS, grid=None,
+                 metric='roi_pct', cache=None):
+    """
+    滚动 Walk-Forward
+    训练: 每组参数在 [train_start, test_start) 入场, 持仓只用训练期K线结算, 按 metric 选优
+    测试: 选中参数在 [test_start, test_end) 入场 (样本外)
+    返回 (窗口结果 DataFrame, 样本外 R 倍数, 样本外信号日序号)
+    """
+    cache = {} if cache is None else cache
+    combos = expand_grid(grid)
+    rows = []
+    oos_r, oos_days = [], []
+
+    for train_start, test_start, test_end in walk_forward_windows(len(arrays['high']),
+                                                                   train_bars, test_bars):
+        best = None
+        for params in combos:
+            p = v91.resolve_params(params)
+            raw, capital = backtest_window(arrays, p, train_start, test_start,
+                                           end_bar=test_start, cache=cache)
+            summary = summarize_trades(raw, capital, p['initial_capital'])
+            if best is None or summary[metric] > best[1][metric]:
+                best = (params, summary)
+        params, train = best
+
+        p = v91.resolve_params(params)
+        raw, capital = backtest_window(arrays, p, test_start, test_end, cache=cache)
+        test = summarize_trades(raw, capital, p['initial_capital'])
+        r, days = trade_sequence(raw, arrays, p['target_rr'])
+        oos_r.append(r)
+        oos_days.append(days)
+
+        rows.append({
+            'train_start': index[train_start],
+            'test_start': index[test_start],
+            'test_end': index[test_end - 1],
+            'params': params,
+            'train_roi_pct': train['roi_pct'],
+            'train_trades': train['trades'],
+            'test_roi_pct': test['roi_pct'],
+            'test_trades': test['trades'],
+            'test_win_rate_pct': test['win_rate_pct'],
+            'test_max_drawdown_pct': test['max_drawdown_pct'],
+        })
+
+    table = pd.DataFrame(rows)
+    r = np.concatenate(oos_r) if oos_r else np.empty(0)
+    days = np.concatenate(oos_days) if oos_days else np.empty(0, dtype=np.int64)
+    return table, r, days
+
+# ==========================================
+# 3. Monte Carlo
+# ==========================================
+
+def resample(r, sims, method='bootstrap', seed=None):
+    """
+    R 倍数序列 -> (sims, n) 的重抽样矩阵
+    bootstrap: 有放回抽样; shuffle: 随机打乱顺序 (最终收益不变, 只改变路径)
+    """
+    rng = np.random.default_rng(seed)
+    n = len(r)
+    if method == 'bootstrap':
+        idx = rng.integers(0, n, size=(sims, n))
+    elif method == 'shuffle':
+        idx = np.argsort(rng.random((sims, n)), axis=1)
+    else:
+        raise ValueError(f"未知重抽样方式: {method}")
+    return r[idx]
+
+
+def tier_risk(consecutive_loss, daily_loss):
+    """向量化的 risk_tiers.tier_risk_percent"""
+    conditions = [consecutive_loss >= k for k, _ in RISK_TIERS]
+    risk = np.select(conditions, [pct for _, pct in RISK_TIERS], default=RISK_TIERS[-1][1])
+    return np.where(daily_loss >= DAILY_LOSS_LIMIT, 0.0, risk)
+
+
+def simulate_paths(r, days=None, sizing='fixed', initial_capital=None, risk_per_trade=None,
+                   ruin_drawdown=RUIN_DRAWDOWN):
+    """
+    批量模拟资金曲线: r 为 (sims, n) R 倍数矩阵, 每步对全部路径向量化
+    days: 与交易对应的信号日序号 (n,), tiers 模型计算当日亏损用
+    返回 {'final', 'max_drawdown', 'ruined', 'skipped'} (均为长度 sims 的数组)
+    """
+    r = np.atleast_2d(np.asarray(r, dtype=np.float64))
+    sims, n = r.shape
+    initial_capital = v91.INITIAL_CAPITAL if initial_capital is None else initial_capital
+    risk_per_trade = v91.RISK_PER_TRADE if risk_per_trade is None else risk_per_trade
+    if sizing not in SIZING_MODELS:
+        raise ValueError(f"未知仓位模型: {sizing}")
+    if sizing == 'tiers' and days is None:
+        raise ValueError("tiers 模型需要信号日期 (days)")
+
+    equity = np.full(sims, float(initial_capital))
+    peak = equity.copy()
+    max_dd = np.zeros(sims)
+    trough = equity.copy()
+    streak = np.zeros(sims, dtype=np.int64)
+    daily_loss = np.zeros(sims, dtype=np.int64)
+    skipped = np.zeros(sims, dtype=np.int64)
+
+    for k in range(n):
+        rk = r[:, k]
+        if sizing == 'fixed':
+            # 与回测相同的运算顺序: pnl = (capital * risk) * R
+            equity = equity + equity * risk_per_trade * rk
+        else:
+            if k and days[k] != days[k - 1]:
+                daily_loss[:] = 0  # UTC 换日
+            risk = tier_risk(streak, daily_loss)
+            taken = risk > 0
+            equity = equity + equity * risk * rk
+            # 熔断跳过的信号不记录, 不影响连亏 / 当日亏损 (与实盘 evaluate_symbol 一致)
+            loss = taken & (rk < 0)
+            streak = np.where(taken & (rk > 0), 0, streak + loss)
+            daily_loss += loss
+            skipped += ~taken
+
+        peak = np.maximum(peak, equity)
+        max_dd = np.maximum(max_dd, (peak - equity) / peak)
+        trough = np.minimum(trough, equity)
+
+    return {
+        'final': equity,
+        'max_drawdown': max_dd,
+        'ruined': trough <= initial_capital * (1 - ruin_drawdown),
+        'skipped': skipped,
+    }
+
+
+def monte_carlo(r, days=None, sims=SIMULATIONS, method='bootstrap', sizing='fixed', seed=None,
+                initial_capital=None, risk_per_trade=None, ruin_drawdown=RUIN_DRAWDOWN):
+    """重抽样 + 批量模拟, 返回分布汇总 dict"""
+    initial_capital = v91.INITIAL_CAPITAL if initial_capital is None else initial_capital
+    if len(r) == 0:
+        raise ValueError("交易序列为空, 无法模拟")
+    paths = simulate_paths(resample(np.asarray(r, dtype=np.float64), sims, method, seed), days,
+                           sizing, initial_capital, risk_per_trade, ruin_drawdown)
+    roi = (paths['final'] - initial_capital) / initial_capital * 100
+    dd = paths['max_drawdown'] * 100
+    return {
+        'sizing': sizing,
+        'method': method,
+        'sims': sims,
+        'trades': len(r),
+        'roi_pct': {q: float(np.percentile(roi, q)) for q in PERCENTILES},
+        'max_drawdown_pct': {q: float(np.percentile(dd, q)) for q in PERCENTILES},
+        'mean_roi_pct': float(roi.mean()),
+        'p_loss': float((roi < 0).mean()),
+        'p_drawdown': {level: float((paths['max_drawdown'] >= level).mean())
+                       for level in DRAWDOWN_LEVELS},
+        'p_ruin': float(paths['ruined'].mean()),
+        'mean_skipped': float(paths['skipped'].mean()),
+    }
+
+# ==========================================
+# 4. 报告 / 命令行
+# ==========================================
+
+def print_monte_carlo(result, ruin_drawdown=RUIN_DRAWDOWN):
+    print(f"\n[Monte Carlo] 仓位模型 {result['sizing']} | {result['method']} "
+          f"{result['sims']:,} 条路径 x {result['trades']} 笔")
+    header = ''.join(f"{f'P{q}':>10}" for q in PERCENTILES)
+    print(f"  {'':<14}{header}")
+    for name, key in (('收益 %', 'roi_pct'), ('最大回撤 %', 'max_drawdown_pct')):
+        row = ''.join(f"{result[key][q]:>10.2f}" for q in PERCENTILES)
+        print(f"  {name:<14}{row}")
+    dd = ' | '.join(f"≥{level * 100:.0f}%: {p * 100:.2f}%" for level, p in result['p_drawdown'].items())
+    print(f"  平均收益 {result['mean_roi_pct']:.2f}% | 亏损概率 {result['p_loss'] * 100:.2f}% | "
+          f"破产概率 (回撤 {ruin_drawdown * 100:.0f}%) {result['p_ruin'] * 100:.2f}%")
+    print(f"  回撤概率 {dd}")
+    if result['sizing'] == 'tiers':
+        print(f"  平均熔断跳过 {result['mean_skipped']:.2f} 笔")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SMC V9.1 Walk-Forward / Monte Carlo 稳健性分析")
+    parser.add_argument('--data', default=v91.DATA_FILE, help="OHLC CSV 文件")
+    parser.add_argument('--grid', action='append', help="Walk-Forward 选优网格, 如 target_rr=1.5,2,3")
+    parser.add_argument('--train-bars', type=int, default=TRAIN_BARS, help="训练窗口K线数")
+    parser.add_argument('--test-bars', type=int, default=TEST_BARS, help="测试窗口K线数 (滚动步长)")
+    parser.add_argument('--metric', default='roi_pct', help="训练期选优指标 (summarize_trades 字段)")
+    parser.add_argument('--sims', type=int, default=SIMULATIONS, help="Monte Carlo 路径数")
+    parser.add_argument('--method', choices=['bootstrap', 'shuffle'], default='bootstrap')
+    parser.add_argument('--sizing', nargs='+', choices=SIZING_MODELS, default=list(SIZING_MODELS))
+    parser.add_argument('--source', choices=['full', 'oos'], default='full',
+                        help="Monte Carlo 交易序列: 全样本回测 / Walk-Forward 样本外")
+    parser.add_argument('--ruin', type=float, default=RUIN_DRAWDOWN, help="破产回撤阈值 (0.5 = 50%%)")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(" SMC V9.1 ROBUSTNESS ANALYSIS")
+    print("=" * 60)
+
+    df = v91.load_features(args.data)
+    arrays = feature_arrays(df)
+    cache = {}
+    print(f"[数据] 加载 {args.data} ({len(df)} 根K线)")
+
+    p = v91.resolve_params()
+    raw, capital = backtest_window(arrays, p, cache=cache)
+    full = summarize_trades(raw, capital, p['initial_capital'])
+    print(f"[全样本] {full['trades']} 笔 | ROI {full['roi_pct']:.2f}% | "
+          f"胜率 {full['win_rate_pct']:.2f}% | 最大回撤 {full['max_drawdown_pct']:.2f}%")
+
+    grid = parse_grid(args.grid)
+    table, oos_r, oos_days = walk_forward(arrays, df.index, args.train_bars, args.test_bars,
+                                          grid, args.metric, cache)
+    if table.empty:
+        print(f"\n[Walk-Forward] 数据不足一个窗口 (需要 {200 + args.train_bars + args.test_bars} 根K线)")
+    else:
+        print(f"\n[Walk-Forward] {len(table)} 个窗口 (训练 {args.train_bars} / 测试 {args.test_bars} 根)")
+        print(table.to_string(index=False, float_format=lambda x: f"{x:.2f}"))
+        compounded = np.prod(1 + table['test_roi_pct'].to_numpy() / 100) - 1
+        print(f"  样本外: {int(table['test_trades'].sum())} 笔 | 窗口复利收益 {compounded * 100:.2f}% | "
+              f"盈利窗口 {int((table['test_roi_pct'] > 0).sum())}/{len(table)}")
+
+    if args.source == 'oos':
+        r, days = oos_r, oos_days
+    else:
+        r, days = trade_sequence(raw, arrays, p['target_rr'])
+    if len(r) == 0:
+        print("\n[Monte Carlo] 没有交易, 跳过")
+        return
+
+    for sizing in args.sizing:
+        result = monte_carlo(r, days, args.sims, args.method, sizing, args.seed, ruin_drawdown=args.ruin)
+        print_monte_carlo(result, args.ruin)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Signal Pipeline (SMC V9.1)
+回测 (calculate_features + detect_displacement_fvgs) 与实盘 (calculate_indicators + check_structure)
+共用的单次遍历信号流水线:
+1. 逐根K线一次算出 TR / ATR / SMA / 实体大小 / Killzone 掩码 / FVG 标记, 写入预分配的输出缓冲区,
+   不产生中间 DataFrame 列
+2. SMA / ATR 逐条复刻 pandas rolling.mean (rolling_mean_push, 实盘 RollingMean 也调用它), 结果逐位一致
+3. Killzone 只在这里定义一次 (UTC 小时闭区间), 回测的区间参数与实盘的小时列表都由此派生
+4. 单根K线的 FVG 判定 bar_flag 同时供编译内核与实盘增量指标 (IncrementalIndicators) 调用
+5. 输出的 in_kz / fvg 即最终信号标记: 回测 FVG 检测与实盘 check_structure 直接读取, 不再重算
+已安装 numba 时编译为单个内核; 未安装时回退到 pandas rolling + NumPy 向量化 (结果相同)
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+from numba_kernel import NUMBA_AVAILABLE
+from records import Direction
+
+if NUMBA_AVAILABLE:
+    from numba import njit
+
+# Killzones (UTC 小时, 闭区间)
+KZ_LONDON_START = 7
+KZ_LONDON_END = 10
+KZ_NY_START = 12
+KZ_NY_END = 15
+
+# FVG 标记编码 (与 records.Direction 一致)
+FVG_NONE = 0
+FVG_BULL = int(Direction.LONG)
+FVG_BEAR = int(Direction.SHORT)
+
+SIGNAL_COLUMNS = ('tr', 'atr', 'trend', 'body_size', 'in_kz', 'fvg')
+
+# 滚动均值状态在 float64 数组中的下标
+_NOBS, _SUM, _NEG, _COMP_ADD, _COMP_REMOVE, _SAME, _PREV = range(7)
+MEAN_STATE_SIZE = 7
+
+
+def killzone_hours(start, end):
+    """闭区间 [start, end] -> 小时列表 (实盘 KZ_LONDON / KZ_NY 格式)"""
+    return list(range(start, end + 1))
+
+
+def allocate_buffers(n):
+    """预分配 n 根K线的输出缓冲区 (可在多次扫描之间复用)"""
+    buffers = {c: np.empty(n, dtype=np.float64) for c in ('tr', 'atr', 'trend', 'body_size')}
+    buffers['in_kz'] = np.empty(n, dtype=np.bool_)
+    buffers['fvg'] = np.empty(n, dtype=np.int8)
+    return buffers
+
+# ==========================================
+# 1. 单根K线判定 / 滚动均值 (内核与实盘共用)
+# ==========================================
+
+def bar_flag(close, low, high, low2, high2, trend, atr, body_size, in_kz, atr_multiplier):
+    """
+    第 i 根K线的 FVG 标记 (low2 / high2 为第 i-2 根): FVG_BULL / FVG_BEAR / FVG_NONE
+    条件: 指标有效 + Killzone + 实体 > atr_multiplier * ATR + 顺势缺口
+    """
+    if trend != trend or atr != atr or not in_kz:
+        return FVG_NONE
+    if not body_size > atr_multiplier * atr:
+        return FVG_NONE
+    if close > trend and low > high2:
+        return FVG_BULL
+    if close < trend and high < low2:
+        return FVG_BEAR
+    return FVG_NONE
+
+
+def rolling_mean_push(state, ring, count, value):
+    """
+    固定窗口滚动均值推入一个值 (信号内核与 incremental_indicators.RollingMean 共用的唯一实现)
+    逐条复刻 pandas roll_mean: 先移除旧值再加入新值, 加/减各自独立的 Kahan 补偿,
+    窗口内全部相同值时直接返回该值
+    state: MEAN_STATE_SIZE 个状态量 (初始全 0), ring: 窗口环形缓冲 (长度即窗口), count: 已推入个数
+    返回当前均值 (有效样本不足窗口长度时为 NaN)
+    """
+    period = len(ring)
+    slot = count % period
+    if count == 0:
+        state[_PREV] = value  # pandas: 首个窗口以首值初始化
+
+    # 先移除旧值 (独立的 Kahan 补偿)
+    if count >= period:
+        old = ring[slot]
+        if old == old:
+            state[_NOBS] -= 1
+            y = -old - state[_COMP_REMOVE]
+            t = state[_SUM] + y
+            state[_COMP_REMOVE] = t - state[_SUM] - y
+            state[_SUM] = t
+            if math.copysign(1.0, old) < 0:
+                state[_NEG] -= 1
+    ring[slot] = value
+
+    # 再加入新值
+    if value == value:
+        state[_NOBS] += 1
+        y = value - state[_COMP_ADD]
+        t = state[_SUM] + y
+        state[_COMP_ADD] = t - state[_SUM] - y
+        state[_SUM] = t
+        if math.copysign(1.0, value) < 0:
+            state[_NEG] += 1
+        if value == state[_PREV]:
+            state[_SAME] += 1
+        else:
+            state[_SAME] = 1
+        state[_PREV] = value
+
+    nobs = state[_NOBS]
+    if nobs < period or nobs == 0:
+        return np.nan
+    result = state[_SUM] / nobs
+    if state[_SAME] >= nobs:
+        return state[_PREV]
+    if state[_NEG] == 0 and result < 0:
+        return 0.0
+    if state[_NEG] == nobs and result > 0:
+        return 0.0
+    return result
+
+
+def _rolling_mean_fill(state, ring, count, values, out):
+    """从第 count 个起依次推入 values, 均值写入 out (分块续算)"""
+    for k in range(len(values)):
+        out[k] = rolling_mean_push(state, ring, count + k, values[k])
+
+# ==========================================
+# 2. 单次遍历内核
+# ==========================================
+
+def _signal_kernel(opens, highs, lows, closes, hours, sma_period, atr_period, atr_multiplier,
+                   kz_london_start, kz_london_end, kz_ny_start, kz_ny_end,
+                   tr, atr, trend, body_size, in_kz, fvg):
+    """逐根K线填充 tr / atr / trend / body_size / in_kz / fvg 六个输出缓冲区"""
+    n = len(highs)
+    sma_state = np.zeros(MEAN_STATE_SIZE)
+    atr_state = np.zeros(MEAN_STATE_SIZE)
+    sma_ring = np.empty(sma_period)
+    atr_ring = np.empty(atr_period)
+
+    prev_close = np.nan
+    for i in range(n):
+        h = highs[i]
+        tr_i = max(h - lows[i], abs(h - prev_close)) if prev_close == prev_close else np.nan
+        prev_close = closes[i]
+
+        tr[i] = tr_i
+        trend[i] = rolling_mean_push(sma_state, sma_ring, i, closes[i])
+        atr[i] = rolling_mean_push(atr_state, atr_ring, i, tr_i)
+        body_size[i] = abs(closes[i] - opens[i])
+        hour = hours[i]
+        in_kz[i] = (kz_london_start <= hour <= kz_london_end) or (kz_ny_start <= hour <= kz_ny_end)
+
+        if i < 2:
+            fvg[i] = FVG_NONE
+        else:
+            fvg[i] = bar_flag(closes[i], lows[i], h, lows[i - 2], highs[i - 2], trend[i], atr[i],
+                              body_size[i], in_kz[i], atr_multiplier)
+
+
+def _flag_kernel(highs, lows, closes, trend, atr, body_size, in_kz, atr_multiplier, fvg):
+    """已有指标数组 (如参数扫描替换了 Killzone 掩码) 时只重算 FVG 标记"""
+    n = len(highs)
+    for i in range(n):
+        if i < 2:
+            fvg[i] = FVG_NONE
+        else:
+            fvg[i] = bar_flag(closes[i], lows[i], highs[i], lows[i - 2], highs[i - 2], trend[i],
+                              atr[i], body_size[i], in_kz[i], atr_multiplier)
+
+
+if NUMBA_AVAILABLE:
+    bar_flag = njit(cache=True)(bar_flag)
+    rolling_mean_push = njit(cache=True)(rolling_mean_push)
+    rolling_mean_fill = njit(cache=True)(_rolling_mean_fill)
+    signal_kernel = njit(cache=True)(_signal_kernel)
+    flag_kernel = njit(cache=True)(_flag_kernel)
+else:
+    rolling_mean_fill = _rolling_mean_fill
+    signal_kernel = None
+    flag_kernel = None
+
+# ==========================================
+# 3. NumPy 回退 (未安装 numba)
+# ==========================================
+
+def _flags_numpy(highs, lows, closes, trend, atr, body_size, in_kz, atr_multiplier, fvg):
+    """bar_flag 的整列向量化版本"""
+    fvg[:] = FVG_NONE
+    if len(highs) <= 2:
+        return
+    c, t, a = closes[2:], trend[2:], atr[2:]
+    candidate = ~np.isnan(t) & ~np.isnan(a) & in_kz[2:] & (body_size[2:] > atr_multiplier * a)
+    fvg[2:][candidate & (c > t) & (lows[2:] > highs[:-2])] = FVG_BULL
+    fvg[2:][candidate & (c < t) & (highs[2:] < lows[:-2])] = FVG_BEAR
+
+
+def _signal_numpy(opens, highs, lows, closes, hours, sma_period, atr_period, atr_multiplier,
+                  kz_london_start, kz_london_end, kz_ny_start, kz_ny_end,
+                  tr, atr, trend, body_size, in_kz, fvg):
+    np.subtract(highs, lows, out=tr)
+    if len(tr):
+        gap = np.abs(highs[1:] - closes[:-1])
+        np.maximum(tr[1:], gap, out=tr[1:])
+        tr[0] = np.nan
+    trend[:] = pd.Series(closes).rolling(sma_period).mean().to_numpy()
+    atr[:] = pd.Series(tr).rolling(atr_period).mean().to_numpy()
+    np.abs(closes - opens, out=body_size)
+    in_kz[:] = ((hours >= kz_london_start) & (hours <= kz_london_end)) | \
+               ((hours >= kz_ny_start) & (hours <= kz_ny_end))
+    _flags_numpy(highs, lows, closes, trend, atr, body_size, in_kz, atr_multiplier, fvg)
+
+# ==========================================
+# 4. 调用入口
+# ==========================================
+
+def _as_float(values):
+    return np.ascontiguousarray(values, dtype=np.float64)
+
+
+def compute_signals(opens, highs, lows, closes, hours, sma_period, atr_period, atr_multiplier,
+                    killzones=(KZ_LONDON_START, KZ_LONDON_END, KZ_NY_START, KZ_NY_END), out=None):
+    """
+    单次遍历计算全部信号列
+    hours: UTC 小时数组; killzones: (伦敦起, 伦敦止, 纽约起, 纽约止)
+    out: allocate_buffers 预分配的缓冲区 (长度须一致), 为 None 时新分配
+    返回 {'tr', 'atr', 'trend', 'body_size', 'in_kz', 'fvg'} 数组字典
+    """
+    highs = _as_float(highs)
+    n = len(highs)
+    if out is None:
+        out = allocate_buffers(n)
+    elif len(out['tr']) != n:
+        raise ValueError(f"输出缓冲区长度 {len(out['tr'])} 与K线数 {n} 不一致")
+
+    kernel = signal_kernel if NUMBA_AVAILABLE else _signal_numpy
+    kernel(_as_float(opens), highs, _as_float(lows), _as_float(closes),
+           np.ascontiguousarray(hours, dtype=np.int64), int(sma_period), int(atr_period),
+           float(atr_multiplier), *(int(h) for h in killzones),
+           out['tr'], out['atr'], out['trend'], out['body_size'], out['in_kz'], out['fvg'])
+    return out
+
+
+def compute_fvg_flags(highs, lows, closes, trend, atr, body_size, in_kz, atr_multiplier, out=None):
+    """只重算 FVG 标记 (指标与 Killzone 掩码由调用方给出), 返回 int8 数组"""
+    highs = _as_float(highs)
+    if out is None:
+        out = np.empty(len(highs), dtype=np.int8)
+    kernel = flag_kernel if NUMBA_AVAILABLE else _flags_numpy
+    kernel(highs, _as_float(lows), _as_float(closes), _as_float(trend), _as_float(atr),
+           _as_float(body_size), np.ascontiguousarray(in_kz, dtype=np.bool_),
+           float(atr_multiplier), out)
+    return out
@@ -0,0 +1,314 @@
+"""
+Streaming Backtest (SMC V9.1)
+分块流式回测: 历史K线按固定块数读取, 峰值内存只与块大小有关, 与历史长度无关
+(1m 级别 / 多年数据不再需要整表读入):
+1. SMA200 / ATR14: RollingMean 跨块续算 (逐位复刻 pandas rolling, 与 calculate_features 一致)
+2. FVG: 检测滞后 50 根K线 (整表只扫描 [2, n-50)), 活跃 FVG (200 根寿命内) 跨块保留
+3. 持仓: 块末未平仓的持仓在下一块用 resume_trade 续算 (含保本状态)
+4. 数据结束仍未平仓: 整表回测中该笔不计入并从入场下一根继续扫描,
+   流式模式回到持仓跨块时保存的检查点, 重新读取其后的数据续扫
+结果与 run_backtest (numpy 引擎) 完全一致
+
+用法:
+    python streaming_backtest.py --file BTC_15m_Real.csv --chunk-bars 50000
+    python streaming_backtest.py --file BTC_15m_Real.csv --chunk-bars 1000 --verify
+"""
+import argparse
+import copy
+import time
+import tracemalloc
+
+import numpy as np
+
+import manual_fvg_v9_1_killzones as v91
+from data_loader import iter_ohlc_chunks
+from execution_engine import _first_true, resume_trade, trade_levels, trade_pnl
+from fvg_store import ActiveFVGStore
+from incremental_indicators import RollingMean
+from instrumentation import stage
+from records import Result, TradeRecord, trades_to_frame
+
+CHUNK_BARS = 100_000     # 每块K线数
+FVG_TAIL_BARS = 50       # 整表检测不扫描的最后 50 根K线
+FIRST_SIGNAL_BAR = 200   # 与 check_signal 的 i < 200 一致
+
+BUFFER_COLUMNS = ('high', 'low', 'close', 'ema200', 'atr', 'body_size', 'in_kz')
+
+
+class StreamingBacktest:
+    """
+    分块回测状态机: feed(块) 逐块推进, finish(reread) 在数据结束时收尾
+    全部K线序号为全局序号; 缓冲区只保留 FVG 检测 / 信号扫描 / 持仓续算仍需要的K线
+    """
+
+    def __init__(self, params=None):
+        self.p = v91.resolve_params(params)
+
+        # 指标状态
+        self.sma = RollingMean(v91.SMA_PERIOD)
+        self.atr = RollingMean(v91.ATR_PERIOD)
+        self.prev_close = float('nan')
+
+        # 回测状态
+        self.store = ActiveFVGStore([])
+        self.capital = float(self.p['initial_capital'])
+        self.trades = []
+        self.n_fvgs = 0
+        self.position = None     # 未平仓持仓 dict
+        self.checkpoint = None   # 持仓跨块时保存的 "放弃该持仓" 状态
+
+        # 缓冲区
+        self.base = 0            # 缓冲区首根K线的全局序号
+        self.total = 0           # 已读入K线数
+        self.detected = 2        # 下一根待检测 FVG 的K线
+        self.i = FIRST_SIGNAL_BAR  # 下一根待扫描信号的K线
+        self.buf = {c: np.empty(0, dtype=bool if c == 'in_kz' else np.float64)
+                    for c in BUFFER_COLUMNS}
+        self.times = None        # 缓冲区K线的时间索引
+
+    # ========== 逐块推进 ==========
+
+    def feed(self, chunk):
+        """读入一块 OHLC (DataFrame, 与 load_data 格式一致)"""
+        if chunk.empty:
+            return
+        cols = self._features(chunk)
+        self._append(cols, chunk.index)
+        self._detect()
+        # 信号只扫描到已完成 FVG 检测的位置, 持仓用已读入的全部K线续算
+        self._run(self.detected)
+
+    def _features(self, chunk):
+        """与 calculate_features 相同的公式, 滚动窗口状态跨块延续"""
+        with stage("features"):
+            opens = chunk['open'].to_numpy(dtype=np.float64)
+            highs = chunk['high'].to_numpy(dtype=np.float64)
+            lows = chunk['low'].to_numpy(dtype=np.float64)
+            closes = chunk['close'].to_numpy(dtype=np.float64)
+
+            prev = np.empty(len(closes))
+            prev[0] = self.prev_close
+            prev[1:] = closes[:-1]
+            self.prev_close = closes[-1]
+
+            tr = np.maximum(highs - lows, np.abs(highs - prev))
+            return {
+                'high': highs,
+                'low': lows,
+                'close': closes,
+                'ema200': np.array(self.sma.push_many(closes.tolist())),
+                'atr': np.array(self.atr.push_many(tr.tolist())),
+                'body_size': np.abs(closes - opens),
+                'in_kz': v91.killzone_mask(chunk.index, self.p),
+            }
+
+    def _append(self, cols, index):
+        """丢弃不再需要的旧K线, 追加新块"""
+        scan_from = self.position['next'] if self.position is not None else self.i
+        keep = max(self.base, min(self.detected - 2, scan_from, self.total))
+        cut = keep - self.base
+        self.buf = {c: np.concatenate([self.buf[c][cut:], cols[c]]) for c in BUFFER_COLUMNS}
+        self.times = index if self.times is None else self.times[cut:].append(index)
+        self.base = keep
+        self.total += len(index)
+
+    def _detect(self):
+        """检测 [detected, total-50) 区间的 FVG (检测窗口需要前两根K线)"""
+        end = self.total - FVG_TAIL_BARS
+        if end <= self.detected:
+            return
+        offset = self.detected - 2
+        lo = offset - self.base
+        b = self.buf
+        with stage("fvg_detect"):
+            fvgs = v91.detect_fvgs_arrays(
+                b['high'][lo:], b['low'][lo:], b['close'][lo:], b['ema200'][lo:],
+                b['atr'][lo:], b['body_size'][lo:], b['in_kz'][lo:],
+                self.p['atr_multiplier'], times=self.times[lo:]
+            )
+        for fvg in fvgs:
+            fvg.created_at += offset
+        self.store.extend(fvgs)
+        self.n_fvgs += len(fvgs)
+        self.detected = end
+
+    # ========== 信号扫描 / 持仓 ==========
+
+    def _run(self, limit):
+        """
+        与 run_backtest_arrays 主循环逐步对应: 信号只扫描 i < limit,
+        持仓跨到缓冲区末尾仍未平仓时保存检查点并等待下一块
+        """
+        p = self.p
+        b = self.buf
+        base = self.base
+        highs, lows, atr = b['high'], b['low'], b['atr']
+        high_list, low_list, atr_list = highs.tolist(), lows.tolist(), atr.tolist()
+        valid_atr = ~np.isnan(atr)
+        store = self.store
+
+        while True:
+            pos = self.position
+            if pos is not None:
+                with stage("trade_simulation"):
+                    outcome, j, be_active = resume_trade(
+                        highs, lows, pos['next'] - base, pos['type'], pos['entry'],
+                        pos['sl'], pos['tp'], pos['be_trigger'], pos['be_active']
+                    )
+                if outcome == Result.RUNNING:
+                    pos['next'] = self.total
+                    pos['be_active'] = be_active
+                    if self.checkpoint is None:
+                        self.checkpoint = self._snapshot()
+                    return
+                self._close(outcome, j + base)
+
+            if self.i >= limit:
+                return
+
+            # 活跃集合不变的区间内, 向量化跳过不可能触及任何 FVG 的K线
+            i = self.i
+            store.advance(i)
+            stop = min(limit, store.next_change())
+            max_top, min_bottom = store.bounds()
+            lo, hi = i - base, stop - base
+            touch = valid_atr[lo:hi] & ((lows[lo:hi] <= max_top) | (highs[lo:hi] >= min_bottom))
+            k = _first_true(touch)
+            if k == len(touch):
+                self.i = stop
+                continue
+            i += k
+            self.i = i + 1
+
+            with stage("signal_scan"):
+                fvg = store.first_touched(i, low_list[i - base], high_list[i - base])
+            if fvg is None:
+                continue
+            levels = trade_levels(fvg, atr_list[i - base], p['sl_padding_atr'],
+                                  p['target_rr'], p['be_trigger_rr'])
+            if levels is None:
+                continue
+
+            store.mitigate(fvg)
+            direction, entry, sl, tp, be_trigger = levels
+            self.position = {
+                'bar': i,
+                'time': self.times[i - base],
+                'type': direction,
+                'entry': entry,
+                'sl': sl,
+                'tp': tp,
+                'be_trigger': be_trigger,
+                'risk_amt': self.capital * p['risk_per_trade'],
+                'next': i + 1,        # 下一根待续算的K线
+                'be_active': False,
+            }
+
+    def _close(self, outcome, exit_bar):
+        pos = self.position
+        pnl = trade_pnl(outcome, pos['risk_amt'], self.p['target_rr'])
+        self.capital += pnl
+        self.trades.append(TradeRecord(pos['bar'], exit_bar, pos['type'], outcome, pos['entry'],
+                                       pos['sl'], pos['tp'], pnl, self.capital, time=pos['time']))
+        self.position = None
+        self.checkpoint = None
+        self.i = exit_bar + 1
+
+    # ========== 检查点 ==========
+
+    def _snapshot(self):
+        """
+        当前持仓 "直到数据结束都未平仓" 时应处的状态: 持仓作废, 从入场下一根继续扫描
+        (FVG 保持已吃掉, 资金不变); 缓冲区数组只读, 保存引用即可
+        """
+        return {
+            'sma': copy.deepcopy(self.sma),
+            'atr': copy.deepcopy(self.atr),
+            'prev_close': self.prev_close,
+            'store': copy.deepcopy(self.store),
+            'capital': self.capital,
+            'n_trades': len(self.trades),
+            'n_fvgs': self.n_fvgs,
+            'base': self.base,
+            'total': self.total,
+            'detected': self.detected,
+            'i': self.position['bar'] + 1,
+            'buf': self.buf,
+            'times': self.times,
+        }
+
+    def _restore(self, state):
+        for key in ('sma', 'atr', 'prev_close', 'store', 'capital', 'n_fvgs', 'base',
+                    'total', 'detected', 'i', 'buf', 'times'):
+            setattr(self, key, state[key])
+        del self.trades[state['n_trades']:]
+        self.position = None
+        self.checkpoint = None
+
+    # ========== 收尾 ==========
+
+    def finish(self, reread):
+        """
+        数据结束: 信号扫描到倒数第二根 (与整表 i < n-1 一致)
+        仍有未平仓持仓时回到检查点, reread(start) 重新读取第 start 根之后的数据续扫
+        返回 (trades DataFrame, capital), 格式与 run_backtest 一致
+        """
+        while True:
+            self._run(self.total - 1)
+            if self.position is None:
+                break
+            self._restore(self.checkpoint)
+            for chunk in reread(self.total):
+                self.feed(chunk)
+
+        return trades_to_frame(self.trades), self.capital
+
+
+def run_backtest_streaming(path, chunk_bars=CHUNK_BARS, params=None):
+    """分块流式回测 path, 返回 (trades DataFrame, capital)"""
+    print(f"[系统] 启动 SMC V9.1 流式回测 (每块 {chunk_bars} 根K线)...")
+    engine = StreamingBacktest(params)
+    for chunk in iter_ohlc_chunks(path, chunk_bars):
+        engine.feed(chunk)
+    trades, capital = engine.finish(lambda start: iter_ohlc_chunks(path, chunk_bars, start=start))
+    print(f"[数据] 筛选出 {engine.n_fvgs} 个 Killzone 动能 FVG")
+    return trades, capital
+
+# ==========================================
+# 主程序
+# ==========================================
+
+def main():
+    parser = argparse.ArgumentParser(description="SMC V9.1 分块流式回测")
+    parser.add_argument('--file', default=v91.DATA_FILE, help="OHLC CSV")
+    parser.add_argument('--chunk-bars', type=int, default=CHUNK_BARS, help="每块K线数")
+    parser.add_argument('--memory', action='store_true', help="统计峰值内存 (tracemalloc, 较慢)")
+    parser.add_argument('--verify', action='store_true', help="与整表 run_backtest 逐笔对比")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(" SMC SYSTEM V9.1 - STREAMING BACKTEST")
+    print("=" * 60)
+
+    if args.memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    trades, final_cap = run_backtest_streaming(args.file, args.chunk_bars)
+    elapsed = time.perf_counter() - started
+
+    print(f"\n最终余额: ${final_cap:,.2f}")
+    print(f"ROI: {(final_cap - v91.INITIAL_CAPITAL) / v91.INITIAL_CAPITAL * 100:.2f}%")
+    print(f"总交易: {len(trades)} | 耗时 {elapsed:.2f}s")
+    if args.memory:
+        print(f"峰值内存: {tracemalloc.get_traced_memory()[1] / 2**20:.1f} MB")
+        tracemalloc.stop()
+
+    if args.verify:
+        ref_trades, ref_cap = v91.run_backtest(v91.load_features(args.file, use_cache=False))
+        ok = ref_cap == final_cap and ref_trades.equals(trades)
+        print(f"\n[对比] 整表回测: {len(ref_trades)} 笔, 余额 ${ref_cap:,.2f} -> "
+              f"{'完全一致 ✅' if ok else '存在差异 ❌'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+"""
+Telegram Notifier (SMC V9.1 Live)
+后台推送线程, 扫描线程只负责入队, 推送慢不影响下一个标的的信号判定:
+1. 有界队列 + 单个后台线程发送
+2. 合并突发消息: 同一根K线收盘时多个标的的信号在 COALESCE_WINDOW 秒内合并为一条
+   (超过 Telegram 4096 字符上限时按消息 / 行边界拆分, 不在 HTML 标签中间截断)
+3. 429 按返回的 retry_after 等待; 5xx / 网络错误指数退避重试
+   4xx 时合并消息逐条重发, 仍被拒绝的单条去掉 parse_mode 以纯文本重发, 只丢弃最终失败的那条
+4. 未送达消息记入 outbox 日志 (JSON Lines, 只追加: 入队写一行 add, 送达写一行 done),
+   扫描线程不重写整个文件; 后台线程在全部送达 / 日志过长时压缩, 重启后自动补发
+5. 队列已满时消息暂存内存积压区 (已记入 outbox), 队列腾出空间后由后台线程按顺序补入
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+
+import requests
+
+from instrumentation import stage, observe
+
+API_URL = "https://api.telegram.org/bot{token}/sendMessage"
+MAX_MESSAGE_LENGTH = 4096
+MESSAGE_SEPARATOR = "\n\n"
+COALESCE_WINDOW = 1.0      # 秒
+MAX_BACKOFF = 60           # 秒
+COMPACT_LINES = 1000       # outbox 日志超过该行数且仍有未送达消息时压缩
+
+# _deliver 结果
+SENT = 'sent'
+REJECTED = 'rejected'  # 4xx: 原样重试无意义
+STOPPED = 'stopped'
+
+
+def split_message(text, limit=MAX_MESSAGE_LENGTH):
+    """单条超长消息按行拆分为不超过 limit 的若干段 (只有单行超长时才按字符截断)"""
+    if len(text) <= limit:
+        return [text]
+    parts = []
+    current = None
+    for line in text.split("\n"):
+        while len(line) > limit:
+            if current is not None:
+                parts.append(current)
+                current = None
+            parts.append(line[:limit])
+            line = line[limit:]
+        if current is not None and len(current) + 1 + len(line) > limit:
+            parts.append(current)
+            current = None
+        current = line if current is None else current + "\n" + line
+    if current:
+        parts.append(current)
+    return parts
+
+
+def group_batches(texts, limit=MAX_MESSAGE_LENGTH, sep=MESSAGE_SEPARATOR):
+    """把多条消息按顺序分组, 每组用 sep 拼接后不超过 limit; 返回 [[text, ...], ...]"""
+    batches = []
+    current = []
+    size = 0
+    for text in texts:
+        for part in split_message(text, limit):
+            if current and size + len(sep) + len(part) > limit:
+                batches.append(current)
+                current = []
+            size = len(part) if not current else size + len(sep) + len(part)
+            current.append(part)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def split_batches(texts, limit=MAX_MESSAGE_LENGTH, sep=MESSAGE_SEPARATOR):
+    """把多条消息按顺序拼接为若干条不超过 limit 的消息"""
+    return [sep.join(batch) for batch in group_batches(texts, limit, sep)]
+
+
+class TelegramNotifier:
+    """非阻塞 Telegram 推送器 (send 只入队, 后台线程发送)"""
+
+    def __init__(self, token, chat_id, outbox_file="telegram_outbox.jsonl", max_queue=1000,
+                 coalesce_window=COALESCE_WINDOW, timeout=10):
+        self.url = API_URL.format(token=token)
+        self.chat_id = chat_id
+        self.outbox_file = outbox_file
+        self.coalesce_window = coalesce_window
+        self.timeout = timeout
+        self.session = requests.Session()
+
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.backlog = deque()  # 队列已满时暂存的 (id, text, 入队时刻), 按顺序补入队列
+        self.pending = {}       # 未送达消息 {id: text} (按入队顺序)
+        self.journal = None     # outbox 日志的追加句柄
+        self.journal_lines = 0
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    # ========== 生命周期 ==========
+
+    def start(self):
+        """启动后台线程, 并补发上次未送达的消息"""
+        if self.thread is not None:
+            return
+        with self.lock:
+            self.pending.update(self._load_outbox())
+            self._compact_outbox()
+            for msg_id, text in self.pending.items():
+                self._enqueue(msg_id, text)
+        if self.pending:
+            logging.info(f"📮 补发 {len(self.pending)} 条未送达消息")
+        self.thread = threading.Thread(target=self._run, name="telegram-notifier", daemon=True)
+        self.thread.start()
+
+    def flush(self, timeout=10):
+        """等待队列发送完毕 (退出前调用), 超时未送达的消息留在 outbox"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self.lock:
+                if not self.pending:
+                    return True
+            time.sleep(0.05)
+        return False
+
+    def stop(self, timeout=10):
+        self.flush(timeout)
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=1)
+        with self.lock:
+            self._close_journal()
+
+    # ========== 入队 ==========
+
+    def send(self, text):
+        """非阻塞入队 (outbox 只追加一行); 队列已满时暂存积压区, 腾出空间后补入"""
+        if self.thread is None:
+            self.start()
+        msg_id = uuid.uuid4().hex
+        with self.lock:
+            self.pending[msg_id] = text
+            self._append_outbox({'op': 'add', 'id': msg_id, 'text': text})
+            self._enqueue(msg_id, text)
+
+    def _enqueue(self, msg_id, text):
+        """入队 (调用方持有 lock); 已有积压时排在积压之后, 保持发送顺序"""
+        item = (msg_id, text, time.monotonic())
+        if not self.backlog:
+            try:
+                self.queue.put_nowait(item)
+                return
+            except queue.Full:
+                logging.warning("⚠️ 推送队列已满, 消息暂存积压区 (已记入 outbox)")
+        self.backlog.append(item)
+
+    def _refill(self):
+        """把积压区的消息按顺序补入队列 (后台线程取走消息后调用)"""
+        with self.lock:
+            while self.backlog:
+                try:
+                    self.queue.put_nowait(self.backlog[0])
+                except queue.Full:
+                    return
+                self.backlog.popleft()
+
+    # ========== 后台线程 ==========
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            self._refill()
+            try:
+                batch = [self.queue.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+
+            # 合并窗口内到达的消息
+            deadline = time.monotonic() + self.coalesce_window
+            while True:
+                self._refill()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            ids = [item[0] for item in batch]
+            for parts in group_batches([item[1] for item in batch]):
+                if not self._deliver_batch(parts):
+                    return  # 停止时未送达的消息留在 outbox
+
+            # 入队 -> 送达 的延迟 (含合并窗口与重试等待)
+            delivered = time.monotonic()
+            for item in batch:
+                observe("notify_delivery", delivered - item[2])
+
+            with self.lock:
+                for msg_id in ids:
+                    self.pending.pop(msg_id, None)
+                    self._append_outbox({'op': 'done', 'id': msg_id})
+                if not self.pending or self.journal_lines > COMPACT_LINES:
+                    self._compact_outbox()
+
+    def _deliver_batch(self, parts):
+        """
+        合并发送一组消息; 被拒绝 (4xx) 时逐条重发, 单条仍被拒绝时以纯文本重发,
+        只丢弃最终失败的那条。收到停止信号时返回 False
+        """
+        status = self._deliver(MESSAGE_SEPARATOR.join(parts))
+        if status != REJECTED:
+            return status == SENT
+
+        if len(parts) > 1:
+            logging.warning(f"⚠️ 合并消息被拒绝, 逐条重发 {len(parts)} 条")
+            for text in parts:
+                status = self._deliver(text)
+                if status == REJECTED:
+                    status = self._deliver_plain(text)
+                if status == STOPPED:
+                    return False
+            return True
+
+        return self._deliver_plain(parts[0]) != STOPPED
+
+    def _deliver_plain(self, text):
+        """去掉 parse_mode 重发 (HTML 实体无法解析时); 仍被拒绝则丢弃"""
+        logging.warning("⚠️ 消息被拒绝, 去掉 HTML 格式重发")
+        status = self._deliver(text, parse_mode=None)
+        if status == REJECTED:
+            logging.error(f"❌ 消息被丢弃: {text[:200]!r}")
+        return status
+
+    def _deliver(self, text, parse_mode="HTML"):
+        """发送一条消息直到成功或被拒绝, 返回 SENT / REJECTED / STOPPED"""
+        payload = {
+            "chat_id": self.chat_id,
+            "text": text,
+            "disable_web_page_preview": True
+        }
+        if parse_mode:
+            payload["parse_mode"] = parse_mode
+        backoff = 1
+        while not self.stop_event.is_set():
+            try:
+                with stage("notify_send"):
+                    response = self.session.post(self.url, json=payload, timeout=self.timeout)
+            except requests.RequestException as e:
+                logging.error(f"推送出错: {e}, {backoff}s 后重试")
+                self.stop_event.wait(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF)
+                continue
+
+            if response.status_code == 200:
+                return SENT
+            if response.status_code == 429:
+                try:
+                    wait = response.json().get('parameters', {}).get('retry_after', backoff)
+                except ValueError:
+                    wait = backoff
+                logging.warning(f"⏳ Telegram 限流, {wait}s 后重试")
+                self.stop_event.wait(wait)
+                continue
+            if response.status_code >= 500:
+                logging.error(f"推送失败 ({response.status_code}), {backoff}s 后重试")
+                self.stop_event.wait(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF)
+                continue
+
+            # 4xx (消息格式错误等): 原样重试无意义, 由调用方拆分 / 降级重发
+            logging.error(f"推送失败: {response.text}")
+            return REJECTED
+        return STOPPED
+
+    # ========== outbox ==========
+
+    def _load_outbox(self):
+        """重放 outbox 日志, 返回未送达消息 {id: text} (崩溃留下的半行 / 损坏的行跳过)"""
+        pending = {}
+        try:
+            with open(self.outbox_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        if record['op'] == 'add':
+                            pending[record['id']] = record['text']
+                        else:
+                            pending.pop(record['id'], None)
+                    except (ValueError, KeyError, TypeError):
+                        logging.warning(f"⚠️ 跳过损坏的 outbox 记录: {line[:200]!r}")
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logging.error(f"❌ 读取 outbox 失败: {e}")
+        return pending
+
+    def _append_outbox(self, record):
+        """向 outbox 日志追加一行 (调用方持有 lock)"""
+        try:
+            if self.journal is None:
+                self.journal = open(self.outbox_file, 'a', encoding='utf-8')
+            self.journal.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self.journal.flush()
+            self.journal_lines += 1
+        except OSError as e:
+            logging.error(f"❌ 写入 outbox 失败: {e}")
+
+    def _compact_outbox(self):
+        """按当前未送达消息重写 outbox (原子替换; 全部送达时删除文件), 调用方持有 lock"""
+        self._close_journal()
+        try:
+            if not self.pending:
+                if os.path.exists(self.outbox_file):
+                    os.remove(self.outbox_file)
+                return
+            tmp = self.outbox_file + ".tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                for msg_id, text in self.pending.items():
+                    f.write(json.dumps({'op': 'add', 'id': msg_id, 'text': text}, ensure_ascii=False) + "\n")
+            os.replace(tmp, self.outbox_file)
+            self.journal_lines = len(self.pending)
+        except OSError as e:
+            logging.error(f"❌ 压缩 outbox 失败: {e}")
+
+    def _close_journal(self):
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+        self.journal_lines = 0
@@ -0,0 +1,76 @@
+"""
+SMC V9.1 测试公共设施
+- 把 SMC 目录加入 sys.path (各模块以顶层模块方式互相导入)
+- 合成K线 / 滚动均值输入序列 / 仓库自带 CSV 数据集
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+SMC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SMC_DIR)
+
+from portfolio_backtest import PORTFOLIO_FILES  # noqa: E402
+
+BUNDLED = {symbol: os.path.join(SMC_DIR, name) for symbol, name in PORTFOLIO_FILES.items()}
+
+
+def synthetic_ohlc(n, seed, nan_frac=0.0, start="2024-01-01"):
+    """合成 15m 随机游走K线 (可选随机 NaN 行, 覆盖指标缺失路径)"""
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1, n))
+    open_ = close + rng.normal(0, 0.8, n)
+    high = np.maximum(open_, close) + np.abs(rng.normal(0, 0.5, n))
+    low = np.minimum(open_, close) - np.abs(rng.normal(0, 0.5, n))
+    if nan_frac:
+        idx = rng.choice(n, int(n * nan_frac), replace=False)
+        for a in (open_, high, low, close):
+            a[idx] = np.nan
+    index = pd.date_range(start, periods=n, freq="15min", tz="UTC", name="timestamp")
+    return pd.DataFrame({'open': open_, 'high': high, 'low': low, 'close': close,
+                         'volume': rng.uniform(1, 100, n)}, index=index)
+
+
+def rolling_inputs(seed):
+    """含 NaN / 窗口内全部相同 / 全负 / 大偏移 (Kahan 补偿生效) 的序列"""
+    rng = np.random.default_rng(seed)
+    values = rng.normal(0, 1, 3000) * 1e4
+    values[rng.choice(len(values), 30, replace=False)] = np.nan
+    values[500:800] = 7.25
+    values[1000:1300] = -np.abs(values[1000:1300])
+    values[1500:2000] += 1e12
+    values[2100:2140] = np.nan
+    return values
+
+
+def to_ohlcv_rows(df):
+    """DataFrame -> [[ts_ms, o, h, l, c, v], ...] (实盘K线格式)"""
+    ts = np.asarray((df.index - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(milliseconds=1))
+    cols = [df[c].to_numpy(dtype=float).tolist() for c in ('open', 'high', 'low', 'close', 'volume')]
+    return [[int(t), o, h, l, c, v] for t, o, h, l, c, v in zip(ts.tolist(), *cols)]
+
+
+@pytest.fixture(params=sorted(BUNDLED))
+def bundled_path(request):
+    """仓库自带的每个标的 CSV"""
+    return BUNDLED[request.param]
+
+
+@pytest.fixture
+def live_sandbox(tmp_path, monkeypatch):
+    """
+    实盘模块隔离: 状态文件 (K线库 / 指标 checkpoint / 交易库) 写入 tmp_path,
+    测试结束后恢复数据源 / 通知器 / 时钟与全局状态
+    """
+    import live_fvg_monitor as live
+
+    monkeypatch.chdir(tmp_path)
+    for name, value in (('exchange', None), ('NOTIFIER', None), ('CLOCK', None),
+                        ('RISK_MANAGER', None), ('MONITORS', {}), ('SIGNAL_LISTENERS', [])):
+        monkeypatch.setattr(live, name, value)
+    yield live
+    if live.RISK_MANAGER is not None:
+        live.RISK_MANAGER.store.close()
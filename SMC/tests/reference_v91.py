@@ -0,0 +1,186 @@
+"""
+V9.1 原始算法 (优化前的逐行实现), 只作为测试的对照基准
+- 回测: calculate_features / detect_displacement_fvgs / check_signal / run_backtest
+  (pandas rolling + 逐根 df.iloc 循环, 输出列 Time / Type / Result / PnL / Balance)
+- 风控: 每次从完整交易历史重新统计 今日亏损 / 连亏
+不要在这里做任何优化: 这些函数的意义就是保持原样
+"""
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+INITIAL_CAPITAL = 10000
+RISK_PER_TRADE = 0.01
+TARGET_RR = 2.0
+BE_TRIGGER_RR = 1.0
+ATR_MULTIPLIER = 1.0
+SL_PADDING_ATR = 0.5
+
+KZ_LONDON_START = 7
+KZ_LONDON_END = 10
+KZ_NY_START = 12
+KZ_NY_END = 15
+
+
+def is_killzone_hour(timestamp):
+    hour = timestamp.hour
+    return (KZ_LONDON_START <= hour <= KZ_LONDON_END) or \
+           (KZ_NY_START <= hour <= KZ_NY_END)
+
+
+def calculate_features(df):
+    df['ema200'] = df['close'].rolling(200).mean()
+    tr = np.maximum(df['high'] - df['low'], np.abs(df['high'] - df['close'].shift(1)))
+    df['atr'] = tr.rolling(14).mean()
+    df['body_size'] = abs(df['close'] - df['open'])
+    return df
+
+
+def detect_displacement_fvgs(df, atr_multiplier=ATR_MULTIPLIER):
+    fvgs = []
+    highs = df['high'].values
+    lows = df['low'].values
+    closes = df['close'].values
+    htf_ema = df['ema200'].values
+    body_size = df['body_size'].values
+    atr = df['atr'].values
+
+    for i in range(2, len(df) - 50):
+        if pd.isna(htf_ema[i]) or pd.isna(atr[i]):
+            continue
+        if not is_killzone_hour(df.index[i]):
+            continue
+        if not body_size[i] > (atr_multiplier * atr[i]):
+            continue
+
+        if closes[i] > htf_ema[i]:
+            if lows[i] > highs[i - 2]:
+                fvgs.append({'time': df.index[i], 'type': 'Bullish', 'top': lows[i],
+                             'bottom': highs[i - 2], 'mitigated': False, 'created_at': i})
+        elif closes[i] < htf_ema[i]:
+            if highs[i] < lows[i - 2]:
+                fvgs.append({'time': df.index[i], 'type': 'Bearish', 'top': lows[i - 2],
+                             'bottom': highs[i], 'mitigated': False, 'created_at': i})
+    return fvgs
+
+
+def check_signal(i, df, fvgs):
+    if i < 200:
+        return None
+
+    candle = df.iloc[i]
+    atr = candle['atr']
+    if pd.isna(atr):
+        return None
+
+    for fvg in fvgs:
+        if fvg['created_at'] >= i:
+            continue
+        if fvg['mitigated']:
+            continue
+        if i - fvg['created_at'] > 200:
+            continue
+
+        if fvg['type'] == 'Bullish':
+            if candle['low'] <= fvg['top']:
+                return {'type': 'LONG', 'entry': fvg['top'],
+                        'sl': fvg['bottom'] - (SL_PADDING_ATR * atr), 'fvg': fvg}
+        if fvg['type'] == 'Bearish':
+            if candle['high'] >= fvg['bottom']:
+                return {'type': 'SHORT', 'entry': fvg['bottom'],
+                        'sl': fvg['top'] + (SL_PADDING_ATR * atr), 'fvg': fvg}
+    return None
+
+
+def run_backtest(df, atr_multiplier=ATR_MULTIPLIER):
+    df = calculate_features(df)
+    fvgs = detect_displacement_fvgs(df, atr_multiplier)
+
+    trades = []
+    capital = INITIAL_CAPITAL
+    i = 200
+
+    while i < len(df) - 1:
+        signal = check_signal(i, df, fvgs)
+
+        if signal:
+            entry = signal['entry']
+            sl = signal['sl']
+            direction = signal['type']
+
+            risk = abs(entry - sl)
+            if risk == 0:
+                i += 1
+                continue
+
+            risk_amt = capital * RISK_PER_TRADE
+            tp = entry + (risk * TARGET_RR) if direction == 'LONG' else entry - (risk * TARGET_RR)
+            be_trigger = entry + (risk * BE_TRIGGER_RR) if direction == 'LONG' else entry - (risk * BE_TRIGGER_RR)
+
+            outcome = 'Running'
+            pnl = 0
+            signal['fvg']['mitigated'] = True
+            is_be = False
+
+            for j in range(i + 1, len(df)):
+                future = df.iloc[j]
+                if direction == 'LONG':
+                    current_sl = entry if is_be else sl
+                    if future['low'] <= current_sl:
+                        outcome = 'BE' if is_be else 'Loss'
+                        pnl = 0 if is_be else -risk_amt
+                        break
+                    if future['high'] >= tp:
+                        outcome = 'Win'
+                        pnl = risk_amt * TARGET_RR
+                        break
+                    if not is_be and future['high'] >= be_trigger:
+                        is_be = True
+                else:
+                    current_sl = entry if is_be else sl
+                    if future['high'] >= current_sl:
+                        outcome = 'BE' if is_be else 'Loss'
+                        pnl = 0 if is_be else -risk_amt
+                        break
+                    if future['low'] <= tp:
+                        outcome = 'Win'
+                        pnl = risk_amt * TARGET_RR
+                        break
+                    if not is_be and future['low'] <= be_trigger:
+                        is_be = True
+
+            if outcome != 'Running':
+                capital += pnl
+                trades.append({'Time': df.index[i], 'Type': direction, 'Result': outcome,
+                               'PnL': pnl, 'Balance': capital})
+                i = j
+
+        i += 1
+
+    return pd.DataFrame(trades), capital
+
+
+def calculate_stats(history, now):
+    """原 LocalRiskManager.calculate_stats: 全量遍历交易历史"""
+    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    daily_loss_count = 0
+    consecutive_loss_count = 0
+
+    for trade in history:
+        if trade['result'] == 'LOSS':
+            try:
+                trade_time = datetime.fromisoformat(trade['time'].replace('Z', '+00:00'))
+                if trade_time >= today_start:
+                    daily_loss_count += 1
+            except ValueError:
+                pass
+
+    for trade in reversed(history):
+        if trade['result'] == 'LOSS':
+            consecutive_loss_count += 1
+        elif trade['result'] in ['WIN', 'PENDING']:
+            break
+
+    return {'daily_loss': daily_loss_count, 'consecutive_loss': consecutive_loss_count}
@@ -0,0 +1,129 @@
+"""
+多标的异步扫描: run_async_scanner 每根K线收盘并发扫描全部标的, 判定出的信号与推送消息
+和逐标的 REST 轮询 (live_replay 驱动的 job) 一致; 在途请求数受信号量限制, 单个标的出错不影响其他标的
+"""
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+import live_replay
+from conftest import BUNDLED
+
+BARS = 700
+PATHS = {f"{s}/USDT": path for s, path in BUNDLED.items()}
+
+
+class StopReplay(Exception):
+    """回放结束: 从主循环的等待处抛出"""
+
+
+class ConcurrencyProbe:
+    """回放交易所的异步外壳, 记录同时在途的请求数"""
+
+    def __init__(self, replay_ex):
+        self.replay_ex = replay_ex
+        self.in_flight = 0
+        self.peak = 0
+        self.closed = False
+
+    async def fetch_ohlcv(self, symbol, timeframe, since=None, limit=None):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(0)  # 让出事件循环: 其他标的的请求得以并发
+            return self.replay_ex.fetch_ohlcv(symbol, timeframe, since=since, limit=limit)
+        finally:
+            self.in_flight -= 1
+
+    async def close(self):
+        self.closed = True
+
+
+def record_signals(live):
+    signals = {s: {} for s in PATHS}
+
+    def on_signal(symbol, signal):
+        ts = int(signal['time_utc'].timestamp() * 1000)
+        signals[symbol][(ts, 'LONG' if 'LONG' in signal['type'] else 'SHORT')] = signal['entry']
+
+    live.SIGNAL_LISTENERS.append(on_signal)
+    return signals
+
+
+def run_scanner(live, monkeypatch, concurrency):
+    """用回放交易所与回放时钟驱动 run_async_scanner, 每次等待收盘时推进一根K线"""
+    candles = {s: live_replay.load_candles(path, BARS) for s, path in PATHS.items()}
+    replay_ex = live_replay.ReplayExchange(candles)
+    aexchange = ConcurrencyProbe(replay_ex)
+    tf_ms = replay_ex.parse_timeframe(live.TIMEFRAME) * 1000
+    messages = []
+    step = {'k': 0}
+
+    def move_to(k):
+        step['k'] = k
+        for symbol in candles:
+            replay_ex.cursor[symbol] = k
+
+    def next_close(tf, delay=0):
+        if step['k'] + 1 >= BARS:
+            raise StopReplay()
+        move_to(step['k'] + 1)
+        return 0
+
+    live.set_notifier(messages.append)
+    live.set_clock(lambda: datetime.fromtimestamp(
+        (candles['ETH/USDT'][step['k']][0] + tf_ms // 2) / 1000, tz=timezone.utc))
+    monkeypatch.setattr(live, 'create_async_exchange', lambda: aexchange)
+    monkeypatch.setattr(live, 'seconds_until_next_close', next_close)
+    monkeypatch.setattr(live, 'ASYNC_MAX_CONCURRENCY', concurrency)
+    signals = record_signals(live)
+
+    move_to(0)
+    with pytest.raises(StopReplay):
+        asyncio.run(live.run_async_scanner(list(PATHS)))
+    assert aexchange.closed
+    return signals, messages, aexchange
+
+
+@pytest.fixture
+def polled(live_sandbox, tmp_path):
+    """逐标的 REST 轮询 (schedule 模式 job) 的信号与推送消息数"""
+    workdir = tmp_path / "polled"
+    workdir.mkdir()
+    report = live_replay.replay(PATHS, bars=BARS, workdir=str(workdir))
+    live_sandbox.MONITORS.clear()
+    signals = {s: {k: v[0] for k, v in sig.items()} for s, sig in report['signals'].items()}
+    return signals, report['messages']
+
+
+def test_async_scanner_matches_polling(live_sandbox, polled, monkeypatch):
+    expected_signals, expected_messages = polled
+    signals, messages, aexchange = run_scanner(live_sandbox, monkeypatch, concurrency=10)
+    assert all(len(s) > 3 for s in expected_signals.values())
+    assert signals == expected_signals
+    assert len(messages) == expected_messages
+    assert aexchange.peak == len(PATHS)  # 三个标的的请求同时在途
+
+
+def test_semaphore_bounds_in_flight_requests(live_sandbox, polled, monkeypatch):
+    expected_signals, _ = polled
+    signals, _, aexchange = run_scanner(live_sandbox, monkeypatch, concurrency=1)
+    assert aexchange.peak == 1
+    assert signals == expected_signals
+
+
+def test_failing_symbol_does_not_block_the_others(live_sandbox, polled, monkeypatch):
+    expected_signals, _ = polled
+    build = live_sandbox.build_indicator_frame
+
+    def broken_for_btc(monitor):
+        if monitor.symbol == 'BTC/USDT':
+            raise RuntimeError("模拟判定错误")
+        return build(monitor)
+
+    monkeypatch.setattr(live_sandbox, 'build_indicator_frame', broken_for_btc)
+    signals, _, _ = run_scanner(live_sandbox, monkeypatch, concurrency=10)
+    assert signals['BTC/USDT'] == {}
+    assert signals['ETH/USDT'] == expected_signals['ETH/USDT']
+    assert signals['SOL/USDT'] == expected_signals['SOL/USDT']
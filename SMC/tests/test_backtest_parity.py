@@ -0,0 +1,116 @@
+"""
+回测对照测试: 优化后的特征 / FVG 检测 / 回测 (numpy 与 numba 两个后端) 与原始逐行实现逐位一致
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import manual_fvg_v9_1_killzones as v91
+import reference_v91 as ref
+from conftest import BUNDLED, synthetic_ohlc
+from fvg_store import ActiveFVGStore
+from numba_kernel import NUMBA_AVAILABLE
+
+BACKENDS = ['numpy', pytest.param('numba', marks=pytest.mark.skipif(
+    not NUMBA_AVAILABLE, reason="numba 未安装"))]
+
+
+def assert_same_run(expected, actual):
+    (ref_trades, ref_capital), (trades, capital) = expected, actual
+    assert capital == ref_capital
+    assert isinstance(capital, float)
+    if ref_trades.empty:
+        assert trades.empty
+    else:
+        # 原实现在只有 BE 交易时 PnL / Balance 为整数列, 现两个后端统一为 float: 只比较数值
+        pd.testing.assert_frame_equal(trades.reset_index(drop=True), ref_trades.reset_index(drop=True),
+                                      check_dtype=False, check_exact=True)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_bundled_backtest_matches_reference(bundled_path, backend, capsys):
+    raw = v91.load_data(bundled_path)
+    expected = ref.run_backtest(raw.copy())
+    actual = v91.run_backtest(v91.calculate_features(raw.copy()), backend=backend)
+    assert_same_run(expected, actual)
+
+
+def test_bundled_features_and_fvgs_match_reference(bundled_path, capsys):
+    raw = v91.load_data(bundled_path)
+    expected = ref.calculate_features(raw.copy())
+    actual = v91.calculate_features(raw.copy())
+    for column in ('ema200', 'atr', 'body_size'):
+        assert np.array_equal(actual[column].values, expected[column].values, equal_nan=True)
+
+    fvgs = [f.to_dict() for f in v91.detect_displacement_fvgs(actual)]
+    assert fvgs == ref.detect_displacement_fvgs(expected)
+
+
+@pytest.mark.parametrize('use_store', [False, True])
+def test_check_signal_matches_reference(use_store, capsys):
+    """check_signal 返回 records.Signal, to_dict() 与原字典逐项一致; signal.fvg 就是传入的 FVG 对象"""
+    df = v91.calculate_features(v91.load_data(BUNDLED['ETH']))
+    fvgs = v91.detect_displacement_fvgs(df)
+    ref_fvgs = ref.detect_displacement_fvgs(df)
+    lookup = ActiveFVGStore(fvgs) if use_store else fvgs
+
+    matched = 0
+    for i in range(len(df)):
+        signal = v91.check_signal(i, df, lookup)
+        expected = ref.check_signal(i, df, ref_fvgs)
+        assert (signal is None) == (expected is None)
+        if signal is None:
+            continue
+        assert signal.fvg in fvgs
+        assert signal.to_dict() == expected
+        if use_store:
+            lookup.mitigate(signal.fvg)
+        else:
+            signal.fvg.mitigated = True
+        expected['fvg']['mitigated'] = True
+        matched += 1
+    assert matched > 0
+
+
+@pytest.mark.parametrize('atr_multiplier', [1.0, 0.2])
+@pytest.mark.parametrize('nan_frac', [0.0, 0.01])
+@pytest.mark.parametrize('seed', range(4))
+def test_synthetic_fvgs_match_reference(seed, nan_frac, atr_multiplier, capsys):
+    raw = synthetic_ohlc(2000, seed, nan_frac)
+    actual = v91.calculate_features(raw.copy())
+    fvgs = v91.detect_displacement_fvgs(actual, params={'atr_multiplier': atr_multiplier})
+    expected = ref.detect_displacement_fvgs(ref.calculate_features(raw.copy()), atr_multiplier)
+    assert [f.to_dict() for f in fvgs] == expected
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('atr_multiplier', [1.0, 0.2])
+@pytest.mark.parametrize('nan_frac', [0.0, 0.01])
+@pytest.mark.parametrize('seed', range(4))
+def test_synthetic_backtest_matches_reference(seed, nan_frac, atr_multiplier, backend, capsys):
+    raw = synthetic_ohlc(2000, seed, nan_frac)
+    params = {'atr_multiplier': atr_multiplier}
+    expected = ref.run_backtest(raw.copy(), atr_multiplier)
+    actual = v91.run_backtest(v91.calculate_features(raw.copy()), backend=backend, params=params)
+    assert_same_run(expected, actual)
+
+
+@pytest.mark.skipif(not NUMBA_AVAILABLE, reason="numba 未安装")
+def test_backends_agree_on_be_only_run(capsys):
+    """只有 BE 交易时两个后端的余额与 PnL 都是 float"""
+    df = v91.calculate_features(v91.load_data(BUNDLED['ETH']).iloc[:550].copy())
+    params = {'sl_padding_atr': 50, 'target_rr': 100, 'be_trigger_rr': 0.01}
+    numpy_run = v91.run_backtest(df, backend='numpy', params=params)
+    numba_run = v91.run_backtest(df, backend='numba', params=params)
+    assert set(numpy_run[0]['Result']) == {'BE'}
+    assert_same_run(numpy_run, numba_run)
+    for trades, _ in (numpy_run, numba_run):
+        assert trades['Balance'].dtype == trades['PnL'].dtype == np.float64
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_no_trade_run_keeps_initial_capital(backend, capsys):
+    df = v91.calculate_features(synthetic_ohlc(150, 0))
+    trades, capital = v91.run_backtest(df, backend=backend)
+    assert trades.empty
+    assert capital == v91.INITIAL_CAPITAL and isinstance(capital, float)
@@ -0,0 +1,148 @@
+"""
+本地K线库: 首次拉取 / 增量 since / 停机缺口分页回补 (有持仓时全部回补) 的请求与结果,
+重启后从文件尾部恢复 (截掉半行), 流式推送的去重与断档检测, 同步与异步版本一致
+"""
+import asyncio
+
+import pytest
+
+from candle_store import FETCH_PAGE_LIMIT, CandleStore
+from conftest import synthetic_ohlc, to_ohlcv_rows
+
+TF_MS = 15 * 60 * 1000
+KEEP = 50
+ROWS = to_ohlcv_rows(synthetic_ohlc(4000, 2))
+
+
+class FakeExchange:
+    """按 since / limit 返回 now 之前开盘的K线 (最后一根为跳动中的K线), 记录每次请求"""
+
+    def __init__(self, rows, now):
+        self.rows = rows
+        self.now = now
+        self.requests = []
+        self.fail = False
+
+    def visible(self):
+        return [r for r in self.rows if r[0] <= self.now]
+
+    def fetch(self, since, limit):
+        self.requests.append((since, limit))
+        if self.fail:
+            return None
+        rows = self.visible()
+        if since is None:
+            return [list(r) for r in rows[-limit:]]
+        return [list(r) for r in rows if r[0] >= since][:limit]
+
+    async def afetch(self, since, limit):
+        await asyncio.sleep(0)
+        return self.fetch(since, limit)
+
+    def now_ms(self):
+        return self.now + TF_MS // 3  # 跳动中K线的开盘时间之后
+
+
+def open_store(root):
+    return CandleStore('ETH/USDT:USDT', '15m', TF_MS, root=str(root), keep=KEEP)
+
+
+def test_first_sync_fetches_keep_candles_then_only_new_ones(tmp_path):
+    exchange = FakeExchange(ROWS, ROWS[300][0])
+    store = open_store(tmp_path)
+    new = store.sync(exchange.fetch)
+    assert exchange.requests == [(None, KEEP + 1)]
+    assert new == ROWS[250:300] and store.tail() == ROWS[250:300]
+    assert store.forming == ROWS[300]
+    assert store.window(10) == ROWS[291:301]
+
+    exchange.now = ROWS[305][0]
+    assert store.sync(exchange.fetch) == ROWS[300:305]
+    assert exchange.requests[-1] == (ROWS[300][0], FETCH_PAGE_LIMIT)
+    assert store.forming == ROWS[305]
+
+    # 没有新K线: 不追加, 跳动中K线沿用
+    exchange.rows = ROWS[:305]
+    assert store.sync(exchange.fetch) == []
+    assert store.forming == ROWS[305]
+
+
+def test_restart_resumes_from_file_tail(tmp_path):
+    exchange = FakeExchange(ROWS, ROWS[300][0])
+    store = open_store(tmp_path)
+    store.sync(exchange.fetch)
+    exchange.now = ROWS[320][0]
+    store.sync(exchange.fetch)
+
+    # 崩溃留下半行: 重启时截掉
+    with open(store.path, 'a', encoding='utf-8') as f:
+        f.write("%d,1.0,2.0" % ROWS[320][0])
+    restarted = open_store(tmp_path)
+    assert restarted.tail() == ROWS[270:320]
+    assert restarted.forming is None and restarted.window(5) is None
+
+    exchange.now = ROWS[325][0]
+    assert restarted.sync(exchange.fetch, now_ms=exchange.now_ms()) == ROWS[320:325]
+    assert exchange.requests[-1] == (ROWS[320][0], FETCH_PAGE_LIMIT)
+    with open(store.path, 'r', encoding='utf-8') as f:
+        assert len(f.read().splitlines()) == 75
+
+
+def test_long_downtime_backfills_only_keep_candles(tmp_path):
+    exchange = FakeExchange(ROWS, ROWS[300][0])
+    store = open_store(tmp_path)
+    store.sync(exchange.fetch)
+
+    exchange.now = ROWS[1000][0]
+    new = store.sync(exchange.fetch, now_ms=exchange.now_ms())
+    assert exchange.requests[-1] == (exchange.now_ms() - (KEEP + 1) * TF_MS, FETCH_PAGE_LIMIT)
+    assert new == ROWS[1000 - KEEP:1000]
+    # 不连续的旧K线被丢弃: 内存窗口只含缺口之后的连续K线
+    assert store.tail() == ROWS[1000 - KEEP:1000]
+
+
+@pytest.mark.parametrize('use_async', [False, True])
+def test_open_position_backfills_whole_gap_in_pages(tmp_path, use_async):
+    exchange = FakeExchange(ROWS, ROWS[300][0])
+    store = open_store(tmp_path)
+    store.sync(exchange.fetch)
+    resume_ms = ROWS[299][0]  # 持仓最后评估到第 299 根
+
+    exchange.now = ROWS[3500][0]
+    exchange.requests.clear()
+    if use_async:
+        new = asyncio.run(store.sync_async(exchange.afetch, now_ms=exchange.now_ms(), resume_ms=resume_ms))
+    else:
+        new = store.sync(exchange.fetch, now_ms=exchange.now_ms(), resume_ms=resume_ms)
+
+    assert new == ROWS[300:3500]
+    assert [since for since, _ in exchange.requests] == [
+        resume_ms + 1, ROWS[1299][0] + 1, ROWS[2299][0] + 1, ROWS[3299][0] + 1]
+    assert store.tail() == ROWS[3500 - KEEP:3500] and store.forming == ROWS[3500]
+
+
+def test_failed_fetch_leaves_store_untouched(tmp_path):
+    exchange = FakeExchange(ROWS, ROWS[300][0])
+    store = open_store(tmp_path)
+    store.sync(exchange.fetch)
+    exchange.now = ROWS[3500][0]
+    exchange.fail = True
+    assert store.sync(exchange.fetch, now_ms=exchange.now_ms()) is None
+    assert store.tail() == ROWS[250:300] and store.forming == ROWS[300]
+
+
+def test_push_rejects_duplicates_and_gaps(tmp_path):
+    exchange = FakeExchange(ROWS, ROWS[300][0])
+    store = open_store(tmp_path)
+    store.sync(exchange.fetch)
+
+    assert store.push(ROWS[299]) == []
+    assert store.push(ROWS[301]) is None  # 跳过了第 300 根: 需要 REST 回补
+    assert store.push(ROWS[300], ROWS[301]) == [ROWS[300]]
+    assert store.forming == ROWS[301]
+
+    new = store.push(ROWS[302], allow_gap=True)
+    assert new == [ROWS[302]] and store.last_time == ROWS[302][0]
+    close = ROWS[302][4]
+    assert store.forming == [ROWS[302][0] + TF_MS, close, close, close, close, 0.0]
+    assert open_store(tmp_path).tail()[-2:] == [ROWS[300], ROWS[302]]
@@ -0,0 +1,129 @@
+"""
+数据加载: 二进制列目录 (.npycols) 与 CSV 解析结果一致, 源 CSV 大小/修改时间变化时重新转换,
+分块读取 (mmap 切片与 CSV 分块两条路径) 拼接后与整体加载一致
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_loader
+from conftest import synthetic_ohlc
+from data_loader import binary_path, iter_ohlc_chunks, load_ohlc, open_ohlc_columns, read_ohlc_csv
+
+
+@pytest.fixture
+def csv(tmp_path):
+    path = str(tmp_path / "X_15m.csv")
+    synthetic_ohlc(500, 0, nan_frac=0.01).to_csv(path)
+    return path
+
+
+@pytest.fixture
+def conversions(monkeypatch):
+    """记录 CSV -> 二进制转换次数"""
+    calls = []
+    convert = data_loader.convert_to_binary
+
+    def counting_convert(path, float32=False, out_dir=None):
+        calls.append(path)
+        return convert(path, float32=float32, out_dir=out_dir)
+
+    monkeypatch.setattr(data_loader, 'convert_to_binary', counting_convert)
+    return calls
+
+
+def assert_same_frame(actual, expected):
+    assert actual.index.equals(expected.index) and str(actual.index.tz) == str(expected.index.tz)
+    assert list(actual.columns) == list(expected.columns)
+    for column in expected.columns:
+        assert np.array_equal(np.asarray(actual[column]), expected[column].to_numpy(), equal_nan=True), column
+
+
+def test_binary_matches_csv_and_is_reused(csv, conversions):
+    expected = read_ohlc_csv(csv)
+    assert_same_frame(load_ohlc(csv), expected)
+    assert_same_frame(load_ohlc(csv), expected)
+    assert len(conversions) == 1
+    assert os.path.exists(os.path.join(binary_path(csv), "source.json"))
+
+
+def test_open_time_export_is_parsed_from_milliseconds(tmp_path):
+    path = str(tmp_path / "B_15m.csv")
+    raw = synthetic_ohlc(50, 3)
+    ms = (raw.index - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(milliseconds=1)
+    raw.reset_index(drop=True).assign(open_time=ms).to_csv(path, index=False)
+    df = load_ohlc(path)
+    assert list(df.index) == list(raw.index.tz_localize(None))
+    assert np.allclose(df['close'].to_numpy(), raw['close'].to_numpy(), rtol=1e-12, atol=0)
+
+
+def test_binary_is_reconverted_when_source_changes(csv, conversions):
+    load_ohlc(csv)
+
+    # 内容改变、大小不变: 靠修改时间识别
+    st = os.stat(csv)
+    with open(csv, 'r', encoding='utf-8') as f:
+        text = f.read()
+    cut = text.index('\n', text.index('\n') + 1) - 1  # 第一行数据 volume 的最后一位
+    digit = '1' if text[cut] != '1' else '2'
+    with open(csv, 'w', encoding='utf-8') as f:
+        f.write(text[:cut] + digit + text[cut + 1:])
+    os.utime(csv, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert os.stat(csv).st_size == st.st_size
+    assert_same_frame(load_ohlc(csv), read_ohlc_csv(csv))
+    assert len(conversions) == 2
+
+    # 追加K线: 大小改变
+    synthetic_ohlc(520, 0).to_csv(csv)
+    reloaded = load_ohlc(csv)
+    assert len(reloaded) == 520
+    assert len(conversions) == 3
+
+    meta, index, data = open_ohlc_columns(csv)
+    assert len(index) == 520 and len(conversions) == 3
+
+
+def test_corrupt_binary_falls_back_to_reconversion(csv, conversions, capsys):
+    load_ohlc(csv)
+    os.remove(os.path.join(binary_path(csv), "close.npy"))
+    assert_same_frame(load_ohlc(csv), read_ohlc_csv(csv))
+    assert len(conversions) == 2
+    assert "二进制缓存损坏" in capsys.readouterr().out
+
+
+def test_float32_uses_its_own_directory(csv):
+    df = load_ohlc(csv, float32=True)
+    assert df['close'].dtype == np.float32
+    assert binary_path(csv, float32=True) != binary_path(csv)
+    assert load_ohlc(csv)['close'].dtype == np.float64
+
+
+@pytest.mark.parametrize('start', [0, 37, 128, 499, 600])
+@pytest.mark.parametrize('binary', [False, True])
+def test_chunks_concatenate_to_full_frame(csv, binary, start):
+    expected = read_ohlc_csv(csv).iloc[start:]
+    if binary:
+        load_ohlc(csv)  # 先生成二进制目录: 分块走 mmap 切片
+    else:
+        assert not os.path.exists(binary_path(csv))
+
+    chunks = list(iter_ohlc_chunks(csv, 64, start=start))
+    assert all(len(c) <= 64 for c in chunks)
+    if expected.empty:
+        assert not chunks
+    else:
+        assert_same_frame(pd.concat(chunks), expected)
+    assert os.path.exists(binary_path(csv)) == binary  # CSV 分块不做整文件转换
+
+
+def test_stale_binary_is_not_used_for_chunks(csv):
+    load_ohlc(csv)
+    synthetic_ohlc(520, 0).to_csv(csv)
+    assert sum(len(c) for c in iter_ohlc_chunks(csv, 100)) == 520
+
+
+def test_chunk_size_must_be_positive(csv):
+    with pytest.raises(ValueError):
+        next(iter_ohlc_chunks(csv, 0))
@@ -0,0 +1,78 @@
+"""
+特征缓存: 缓存键随文件内容 / 指标参数 / FVG 标记参数变化, 命中时不重算,
+读回的特征帧与重算结果一致, 只清理同一源文件的旧缓存
+"""
+import os
+
+import numpy as np
+import pytest
+
+import manual_fvg_v9_1_killzones as v91
+from conftest import synthetic_ohlc
+from feature_cache import cache_key, load_cached_features
+
+
+@pytest.fixture
+def csv(tmp_path):
+    path = str(tmp_path / "X_15m.csv")
+    synthetic_ohlc(600, 0).to_csv(path)
+    return path
+
+
+class CountingBuild:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, path):
+        self.calls += 1
+        return v91.calculate_features(v91.load_data(path))
+
+
+def entries(cache_dir):
+    return sorted(os.listdir(cache_dir))
+
+
+def test_cache_key_changes_with_content_and_parameters(csv):
+    key = cache_key(csv, 200, 14, (1.0, 7, 10, 12, 15))
+    assert cache_key(csv, 200, 14, (1.0, 7, 10, 12, 15)) == key
+    assert cache_key(csv, 50, 14, (1.0, 7, 10, 12, 15)) != key
+    assert cache_key(csv, 200, 21, (1.0, 7, 10, 12, 15)) != key
+    assert cache_key(csv, 200, 14, (0.5, 7, 10, 12, 15)) != key
+    assert cache_key(csv, 200, 14, (1.0, 8, 10, 12, 15)) != key
+
+    with open(csv, 'a', encoding='utf-8') as f:
+        f.write("\n")
+    assert cache_key(csv, 200, 14, (1.0, 7, 10, 12, 15)) != key
+
+
+def test_hit_returns_same_frame_without_rebuilding(csv, tmp_path, capsys):
+    cache_dir = str(tmp_path / "cache")
+    build = CountingBuild()
+    first = load_cached_features(csv, build, 200, 14, cache_dir=cache_dir)
+    second = load_cached_features(csv, build, 200, 14, cache_dir=cache_dir)
+    assert build.calls == 1
+    assert second.index.equals(first.index) and second.index.tz is not None
+    assert list(second.columns) == list(first.columns)
+    for column in first.columns:
+        assert np.array_equal(np.asarray(second[column]), first[column].to_numpy(), equal_nan=True), column
+
+
+def test_stale_entries_are_pruned_per_source_file(csv, tmp_path, capsys):
+    cache_dir = str(tmp_path / "cache")
+    other = str(tmp_path / "X_15m-v2.csv")  # 前缀 "X_15m-" 相同的另一个数据文件
+    synthetic_ohlc(600, 1).to_csv(other)
+    build = CountingBuild()
+
+    load_cached_features(other, build, 200, 14, cache_dir=cache_dir)
+    load_cached_features(csv, build, 200, 14, cache_dir=cache_dir)
+    os.makedirs(os.path.join(cache_dir, "X_15m-notakey"))
+    load_cached_features(csv, build, 200, 14, cache_dir=cache_dir, signal_params=(0.5,))
+    assert build.calls == 3
+
+    key = cache_key(csv, 200, 14, (0.5,))
+    other_key = cache_key(other, 200, 14)
+    assert entries(cache_dir) == sorted(["X_15m-" + key, "X_15m-notakey", "X_15m-v2-" + other_key])
+
+    # 参数改回去: 旧条目已被清理, 需要重算
+    load_cached_features(csv, build, 200, 14, cache_dir=cache_dir)
+    assert build.calls == 4
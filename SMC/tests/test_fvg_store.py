@@ -0,0 +1,56 @@
+"""
+ActiveFVGStore: 随机 FVG 序列上 first_touched 与原 check_signal 的线性扫描一致
+(含过期、吃掉、分批追加、外部改写 mitigated、NaN 价格)
+"""
+import random
+
+import pytest
+
+from fvg_store import ActiveFVGStore
+from records import Direction, FVGZone
+
+
+def linear_scan(fvgs, i, low, high, max_age):
+    for fvg in fvgs:
+        if fvg.created_at >= i or fvg.mitigated or i - fvg.created_at > max_age:
+            continue
+        if fvg.direction == Direction.LONG:
+            if low <= fvg.top:
+                return fvg
+        elif high >= fvg.bottom:
+            return fvg
+    return None
+
+
+@pytest.mark.parametrize('seed', range(60))
+def test_first_touched_matches_linear_scan(seed):
+    rnd = random.Random(seed)
+    n = rnd.randint(5, 400)
+    max_age = rnd.randint(3, 60)
+    bars = sorted(rnd.sample(range(n), rnd.randint(0, n // 2)))
+    fvgs = [FVGZone(b, rnd.choice([Direction.LONG, Direction.SHORT]), rnd.randint(50, 100), rnd.randint(0, 50))
+            for b in bars]
+    reference = [f.copy() for f in fvgs]
+
+    cut = rnd.randint(0, len(fvgs))
+    store = ActiveFVGStore(fvgs[:cut], max_age=max_age)
+    extended = False
+    for i in range(n):
+        if not extended and (cut == len(fvgs) or fvgs[cut].created_at >= i):
+            store.extend(fvgs[cut:])
+            extended = True
+
+        low = rnd.choice([float('nan')] + [rnd.randint(0, 110)] * 5)
+        high = rnd.choice([float('nan')] + [rnd.randint(0, 110)] * 5)
+        found = store.first_touched(i, low, high)
+        expected = linear_scan(reference, i, low, high, max_age)
+        assert (found is None) == (expected is None)
+        if found is not None:
+            assert found.created_at == expected.created_at
+            if rnd.random() < 0.6:
+                store.mitigate(found)
+                expected.mitigated = True
+        if fvgs and rnd.random() < 0.05:
+            k = rnd.randrange(len(fvgs))
+            fvgs[k].mitigated = True
+            reference[k].mitigated = True
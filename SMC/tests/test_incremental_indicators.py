@@ -0,0 +1,93 @@
+"""
+增量指标: RollingMean / IncrementalIndicators 与批量 pandas rolling / calculate_indicators 逐位一致,
+checkpoint 中断续算不改变结果
+"""
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import live_fvg_monitor as live
+import manual_fvg_v9_1_killzones as v91
+from conftest import rolling_inputs, synthetic_ohlc, to_ohlcv_rows
+from incremental_indicators import IncrementalIndicators, RollingMean
+from signal_pipeline import compute_signals
+
+COLUMNS = ('trend', 'tr', 'atr', 'body_size', 'in_kz', 'fvg')
+
+
+def replay(state, rows):
+    return [state.update(*row) for row in rows]
+
+
+def batch_indicators(raw):
+    return live.calculate_indicators(raw[['open', 'high', 'low', 'close', 'volume']].copy())
+
+
+def assert_matches_batch(candles, batch):
+    for column in COLUMNS:
+        values = np.array([c[column] for c in candles])
+        assert np.array_equal(values, batch[column].to_numpy(), equal_nan=True), column
+
+
+@pytest.mark.parametrize('period', [1, 14, 200])
+@pytest.mark.parametrize('seed', range(3))
+def test_rolling_mean_matches_pandas(seed, period):
+    """RollingMean 调用信号流水线的 rolling_mean_push: 单条推入 / 分块续算 / checkpoint 续算都与 pandas 一致"""
+    values = rolling_inputs(seed)
+    expected = pd.Series(values).rolling(period).mean().to_numpy()
+
+    mean = RollingMean(period)
+    assert np.array_equal([mean.push(v) for v in values.tolist()], expected, equal_nan=True)
+
+    chunked = RollingMean(period)
+    parts = []
+    for part in np.array_split(values, [1, 7, 251, 1999]):
+        parts.extend(chunked.push_many(part))
+        chunked = RollingMean.from_dict(json.loads(json.dumps(chunked.to_dict())))
+    assert np.array_equal(parts, expected, equal_nan=True)
+
+
+def test_bundled_incremental_matches_batch(bundled_path):
+    raw = v91.load_data(bundled_path)
+    state = IncrementalIndicators(live.SMA_PERIOD, live.ATR_PERIOD, atr_multiplier=live.ATR_MULTIPLIER)
+    assert_matches_batch(replay(state, to_ohlcv_rows(raw)), batch_indicators(raw))
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_synthetic_incremental_matches_batch(seed):
+    raw = synthetic_ohlc(3000, seed, nan_frac=0.005)
+    state = IncrementalIndicators(live.SMA_PERIOD, live.ATR_PERIOD, atr_multiplier=0.2)
+    expected = compute_signals(raw['open'].values, raw['high'].values, raw['low'].values,
+                               raw['close'].values, raw.index.hour, live.SMA_PERIOD, live.ATR_PERIOD, 0.2)
+    assert_matches_batch(replay(state, to_ohlcv_rows(raw)), pd.DataFrame(expected))
+
+
+@pytest.mark.parametrize('split', [1, 150, 1999])
+def test_checkpoint_resume_matches_uninterrupted(tmp_path, split):
+    rows = to_ohlcv_rows(synthetic_ohlc(2500, 5))
+    path = str(tmp_path / "state.json")
+
+    first = IncrementalIndicators(live.SMA_PERIOD, live.ATR_PERIOD)
+    candles = replay(first, rows[:split])
+    first.save(path)
+    assert not first.checkpoint_due()
+
+    resumed = IncrementalIndicators.load(path, live.SMA_PERIOD, live.ATR_PERIOD)
+    assert resumed.count == split
+    candles += replay(resumed, rows[split:])
+
+    uninterrupted = replay(IncrementalIndicators(live.SMA_PERIOD, live.ATR_PERIOD), rows)
+    assert_matches_batch(candles, pd.DataFrame(uninterrupted))
+
+
+def test_load_rejects_mismatched_parameters(tmp_path):
+    path = str(tmp_path / "state.json")
+    state = IncrementalIndicators(live.SMA_PERIOD, live.ATR_PERIOD)
+    replay(state, to_ohlcv_rows(synthetic_ohlc(300, 1)))
+    state.save(path)
+
+    assert IncrementalIndicators.load(path, live.SMA_PERIOD, live.ATR_PERIOD).count == 300
+    assert IncrementalIndicators.load(path, live.SMA_PERIOD, live.ATR_PERIOD, atr_multiplier=0.5).count == 0
+    assert IncrementalIndicators.load(path, 50, live.ATR_PERIOD).count == 0
@@ -0,0 +1,158 @@
+"""
+子K线成交模型: 歧义K线按子K线顺序判定, 与逐根子K线暴力模拟一致; 子K线与父K线同周期或缺数据时
+与现行整根K线模型逐笔一致; 子K线只按需读取
+"""
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import manual_fvg_v9_1_killzones as v91
+from conftest import BUNDLED
+from execution_engine import simulate_trade
+from intrabar_fill import IntrabarModel, SubBarSource, _Position, compare_trades, run_fill_comparison
+from records import Direction, Result
+
+PER = 15  # 每根父K线的子K线数
+
+
+def test_step_is_stop_first_and_flags_ambiguity():
+    # 同根触及止损与止盈: 止损优先, 歧义 (回测传入的是 NumPy 标量)
+    assert _Position(True, 100, 90, 120, 110).step(125, 85) == (Result.LOSS, True)
+    assert _Position(False, 100, 110, 80, 90).step(np.float64(115), np.float64(75)) == (Result.LOSS, True)
+    assert _Position(True, 100, 90, 120, 110, be_active=True).step(np.float64(121), np.float64(99)) == \
+        (Result.BE, True)
+    # 只触及止盈 (越过保本触发价不影响结果) / 只触及止损: 无歧义
+    assert _Position(True, 100, 90, 120, 110).step(np.float64(121), np.float64(101)) == (Result.WIN, False)
+    assert _Position(True, 100, 90, 120, 110).step(105, 89) == (Result.LOSS, False)
+
+    # 保本触发后又回到入场价: 本根不平仓 (下一根生效), 歧义
+    pos = _Position(True, 100, 90, 120, 110)
+    assert pos.step(111, 99) == (None, True) and pos.be_active
+    assert pos.step(105, 100) == (Result.BE, False)
+
+    # 保本只触发不回头: 无歧义
+    pos = _Position(False, 100, 110, 80, 90)
+    assert pos.step(99, 89) == (None, False) and pos.be_active
+
+
+def test_walk_uses_sub_bar_order():
+    # 整根K线同时触及止损与止盈, 子K线先到止盈
+    highs, lows = np.array([105.0, 121.0, 104.0]), np.array([99.0, 101.0, 85.0])
+    assert _Position(True, 100, 90, 120, 110).step(highs.max(), lows.min())[0] == Result.LOSS
+    assert _Position(True, 100, 90, 120, 110).walk(highs, lows) == (Result.WIN, 0)
+
+
+def sub_bars(n_parents, seed):
+    """1m 随机游走K线 (UTC), 及由其聚合的 15m 父K线"""
+    rng = np.random.default_rng(seed)
+    n = n_parents * PER
+    close = 100 + np.cumsum(rng.normal(0, 0.3, n))
+    open_ = np.concatenate(([100.0], close[:-1]))
+    high = np.maximum(open_, close) + np.abs(rng.normal(0, 0.15, n))
+    low = np.minimum(open_, close) - np.abs(rng.normal(0, 0.15, n))
+    index = pd.date_range("2024-01-01", periods=n, freq="1min", tz="UTC", name="timestamp")
+    sub = pd.DataFrame({'open': open_, 'high': high, 'low': low, 'close': close, 'volume': 1.0}, index=index)
+    parent = sub.resample('15min').agg({'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last',
+                                        'volume': 'sum'})
+    return sub, parent
+
+
+def brute_force(sub, i, is_long, entry, sl, tp, be_trigger):
+    """逐根子K线: 第 i 根父K线内首根触及入场价的子K线成交, 之后每根子K线按 止损 > 止盈 > 保本 判定"""
+    highs, lows = sub['high'].to_numpy(), sub['low'].to_numpy()
+    fills = [k for k in range(i * PER, (i + 1) * PER) if (lows[k] <= entry if is_long else highs[k] >= entry)]
+    if not fills:
+        return None, None
+    pos = _Position(is_long, entry, sl, tp, be_trigger)
+    for k in range(fills[0] + 1, len(highs)):
+        outcome, _ = pos.step(highs[k], lows[k])
+        if outcome is not None:
+            return outcome, k // PER
+    return Result.RUNNING, len(highs) // PER - 1
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_model_matches_sub_bar_brute_force(tmp_path, seed):
+    sub, parent = sub_bars(300, seed)
+    path = str(tmp_path / "X_1m.csv")
+    sub.to_csv(path)
+    source = SubBarSource(path)
+    model = IntrabarModel(source, parent.index)
+    highs, lows = parent['high'].to_numpy(), parent['low'].to_numpy()
+    rng = np.random.default_rng(100 + seed)
+
+    resolved = 0
+    for _ in range(150):
+        i = int(rng.integers(1, 280))
+        is_long = bool(rng.integers(2))
+        d = rng.uniform(0.2, 1.5)
+        entry = lows[i] + rng.uniform(-0.1, 0.8) * (highs[i] - lows[i])
+        sign = 1 if is_long else -1
+        sl, be, tp = entry - sign * d, entry + sign * d, entry + sign * 2 * d
+        direction = Direction.LONG if is_long else Direction.SHORT
+
+        expected = brute_force(sub, i, is_long, entry, sl, tp, be)
+        assert model.simulate(highs, lows, i, direction, entry, sl, tp, be, 1.0) == expected
+        resolved += expected[0] is not None
+    assert resolved > 50
+    assert model.stats['entry_bars'] and model.stats['exit_bars'] and not model.stats['missing']
+    assert source.loaded < len(source)  # 只读取需要解析的父K线对应的子K线
+
+
+def test_sub_bar_changes_stop_first_outcome(tmp_path):
+    """整根K线规则判为亏损的歧义K线, 子K线先到止盈时判为盈利"""
+    sub, _ = sub_bars(40, 7)
+    i, j = 10, 12
+    entry, sl, be, tp = 100.0, 98.0, 101.0, 102.0
+    high, low = sub.columns.get_loc('high'), sub.columns.get_loc('low')
+    sub.iloc[i * PER:, high] = 100.5   # 成交后不触及任何价位的横盘
+    sub.iloc[i * PER:, low] = 100.1
+    sub.iloc[i * PER + 3, low] = 99.95  # 第 i 根第 4 分钟成交
+    sub.iloc[j * PER + 2, high] = 102.1  # 第 j 根先到止盈
+    sub.iloc[j * PER + 9, low] = 97.9    # 再到止损
+    parent = sub.resample('15min').agg({'high': 'max', 'low': 'min'})
+    highs, lows = parent['high'].to_numpy(), parent['low'].to_numpy()
+
+    assert simulate_trade(highs, lows, i, Direction.LONG, entry, sl, tp, be) == (Result.LOSS, j)
+    path = str(tmp_path / "X_1m.csv")
+    sub.to_csv(path)
+    model = IntrabarModel(SubBarSource(path), parent.index)
+    assert model.simulate(highs, lows, i, Direction.LONG, entry, sl, tp, be, 1.0) == (Result.WIN, j)
+    assert model.stats['exit_bars'] == 1 and model.stats['entry_bars'] == 0
+
+    # 要求穿越 0.1 ATR 才成交: 第 i 根只穿越 0.05, 不成交
+    strict = IntrabarModel(SubBarSource(path), parent.index, fill_buffer_atr=0.1)
+    assert strict.simulate(highs, lows, i, Direction.LONG, entry, sl, tp, be, 1.0) == (None, None)
+    assert strict.stats['no_fill'] == 1
+
+
+@pytest.fixture
+def eth(tmp_path):
+    """ETH 15m 复制到临时目录 (二进制列目录写在数据文件旁边)"""
+    path = str(tmp_path / "ETH_15m_Real.csv")
+    shutil.copy(BUNDLED['ETH'], path)
+    return path
+
+
+def assert_same_as_base(base, base_capital, trades, capital, index):
+    assert capital == base_capital
+    diff = compare_trades(base, trades, index)
+    assert len(diff) == len(base) and set(diff['Status']) == {'same'}
+
+
+def test_same_timeframe_sub_bars_reproduce_base_model(eth, capsys):
+    df = v91.load_features(eth, use_cache=False)
+    base, base_capital, trades, capital, model = run_fill_comparison(df, eth)
+    assert_same_as_base(base, base_capital, trades, capital, df.index)
+    assert model.stats['exit_bars'] and not model.stats['missing']
+
+
+def test_missing_sub_bars_fall_back_to_base_model(eth, tmp_path, capsys):
+    df = v91.load_features(eth, use_cache=False)
+    path = str(tmp_path / "ETH_1m_Real.csv")
+    v91.load_data(eth).iloc[:5].to_csv(path)  # 子K线只覆盖最开头 (无持仓的区间)
+    base, base_capital, trades, capital, model = run_fill_comparison(df, path)
+    assert_same_as_base(base, base_capital, trades, capital, df.index)
+    assert model.stats['missing'] == model.stats['entry_bars'] + model.stats['exit_bars'] > 0
@@ -0,0 +1,84 @@
+"""
+离线回放: 回放交易所不泄露未来K线, 逐根驱动实盘路径判定出的信号与回测 FVG 逐条对账一致,
+对账只排除实盘预热区间 (开头与超过本地库窗口的缺口之后), 回放结束后恢复工作目录与监听器
+"""
+import os
+
+import pytest
+
+import live_replay
+import manual_fvg_v9_1_killzones as v91
+from conftest import BUNDLED
+
+TF_MS = 15 * 60 * 1000
+
+
+@pytest.fixture(autouse=True)
+def no_feature_cache(monkeypatch):
+    monkeypatch.setattr(v91, 'USE_FEATURE_CACHE', False)
+
+
+def rows(times):
+    return [[t, 1.0, 2.0, 0.5, 1.5, 10.0] for t in times]
+
+
+def test_replay_exchange_never_returns_future_candles():
+    times = [k * TF_MS for k in range(20)]
+    ex = live_replay.ReplayExchange({'X': rows(times)})
+    ex.cursor['X'] = 9
+
+    assert [c[0] for c in ex.fetch_ohlcv('X', '15m', limit=4)] == times[6:10]
+    assert [c[0] for c in ex.fetch_ohlcv('X', '15m', limit=100)] == times[:10]
+    assert [c[0] for c in ex.fetch_ohlcv('X', '15m', since=times[3] + 1, limit=3)] == times[4:7]
+    assert [c[0] for c in ex.fetch_ohlcv('X', '15m', since=times[8])] == times[8:10]
+    assert ex.fetch_ohlcv('X', '15m', since=times[15]) == []
+    assert ex.fetch_ticker('X') == {'last': 1.5}
+    assert ex.calls == 5
+
+
+def test_warmup_restarts_after_gaps_longer_than_the_store():
+    warm = live_replay.live.SMA_PERIOD + 10
+    times = [k * TF_MS for k in range(400)]
+    short_gap = [t + (5 * TF_MS if k >= 300 else 0) for k, t in enumerate(times)]
+    long_gap = [t + ((live_replay.live.LIMIT + 1) * TF_MS if k >= 300 else 0) for k, t in enumerate(times)]
+
+    assert live_replay.warmup_times(rows(times), TF_MS) == set(times[:warm])
+    assert live_replay.warmup_times(rows(short_gap), TF_MS) == set(short_gap[:warm])
+    assert live_replay.warmup_times(rows(long_gap), TF_MS) == set(long_gap[:warm]) | set(long_gap[300:300 + warm])
+
+
+def test_compare_signals_classifies_differences():
+    times = [k * TF_MS for k in range(400)]
+    warm = live_replay.live.SMA_PERIOD + 10
+    a, b, c, d, e = (times[k] for k in (warm, warm + 1, warm + 2, warm + 3, 360))
+    live_signals = {(a, 'LONG'): (1.0, 0.5), (b, 'SHORT'): (2.0, 3.0), (c, 'LONG'): (1.0, 0.5),
+                    (e, 'LONG'): (9.0, 8.0)}
+    bt_signals = {(a, 'LONG'): (1.0, 0.5), (b, 'SHORT'): (2.0, 3.5), (d, 'SHORT'): (1.0, 2.0),
+                  (times[5], 'LONG'): (1.0, 0.5)}
+
+    cmp = live_replay.compare_signals(live_signals, bt_signals, rows(times), len(times), TF_MS)
+    assert cmp['matched'] == 1
+    assert cmp['compared'] == 4            # 最后 50 根 (e) 与预热区间不参与对账
+    assert cmp['live_only'] == [(c, 'LONG')]
+    assert cmp['backtest_only'] == [(d, 'SHORT')]
+    assert cmp['mismatched'] == [(b, 'SHORT')]
+    assert cmp['skipped'] == 1
+
+
+def test_replay_matches_backtest_signals(live_sandbox, tmp_path, capsys):
+    live = live_sandbox
+    listeners = list(live.SIGNAL_LISTENERS)
+    bars = 1500
+
+    report = live_replay.replay({'ETH/USDT': BUNDLED['ETH']}, bars=bars)
+    assert os.getcwd() == str(tmp_path)
+    assert live.SIGNAL_LISTENERS == listeners
+    assert live.RISK_MANAGER is None
+    assert not os.listdir(tmp_path)  # 回放状态写在临时目录, 结束后删除
+
+    bt, n_bars = live_replay.backtest_signals(BUNDLED['ETH'], bars)
+    cmp = live_replay.compare_signals(report['signals']['ETH/USDT'], bt, report['candles']['ETH/USDT'],
+                                      n_bars, report['tf_ms'])
+    assert cmp['compared'] > 10
+    assert cmp['matched'] == cmp['compared']
+    assert report['bars'] == bars and report['bars_per_sec'] > 0
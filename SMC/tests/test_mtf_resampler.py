@@ -0,0 +1,130 @@
+"""
+多周期重采样: 高周期K线与 pandas resample 一致 (含缺失K线), SMA / ATR 与高周期K线上的 rolling 一致,
+对齐无前视, 分块追加 / 磁盘续存与一次性构建逐位一致
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import manual_fvg_v9_1_killzones as v91
+import mtf_resampler as mtf
+from conftest import BUNDLED
+
+RULES = {'1h': '1h', '4h': '4h', '1d': '1D'}
+
+
+@pytest.fixture(scope='module')
+def ohlc():
+    """BTC 15m 随机去掉 300 根 (交易所缺K线)"""
+    df = v91.load_data(BUNDLED['BTC'])
+    keep = np.ones(len(df), dtype=bool)
+    keep[np.random.default_rng(0).choice(len(df), 300, replace=False)] = False
+    return df[keep]
+
+
+@pytest.fixture(scope='module')
+def full(ohlc):
+    cache = mtf.MultiTimeframeCache()
+    cache.update_frame(ohlc)
+    return cache
+
+
+def pandas_bars(df, tf):
+    bars = df.resample(RULES[tf], label='left', closed='left').agg(
+        {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'})
+    bars = bars.dropna(subset=['close'])
+    # 最后一个桶未收盘 (收盘时间晚于最后一根 15m K线收盘) 时不计入
+    last_close = df.index[-1] + pd.Timedelta('15min')
+    return bars[bars.index + pd.Timedelta(RULES[tf]) <= last_close]
+
+
+def assert_same_cache(actual, expected, variants):
+    assert actual.n_base == expected.n_base and actual.last_time == expected.last_time
+    for tf in expected.frames:
+        for column in mtf.BAR_COLUMNS[1:]:
+            assert np.array_equal(actual.aligned(tf, column), expected.aligned(tf, column), equal_nan=True)
+        for sma_period, atr_period in variants:
+            for column in ('sma', 'atr'):
+                a = actual.aligned(tf, column, sma_period=sma_period, atr_period=atr_period)
+                b = expected.aligned(tf, column, sma_period=sma_period, atr_period=atr_period)
+                assert np.array_equal(a, b, equal_nan=True), (tf, column, sma_period)
+
+
+@pytest.mark.parametrize('tf', list(RULES))
+def test_bars_and_indicators_match_pandas(ohlc, full, tf):
+    expected = pandas_bars(ohlc, tf)
+    features = full.features(tf, sma_period=20, atr_period=14)
+    assert features.index.equals(expected.index)
+    for column in ('open', 'high', 'low', 'close', 'volume'):
+        assert np.allclose(features[column].to_numpy(), expected[column].to_numpy(), rtol=1e-12, atol=0), column
+
+    close, high, low = features['close'], features['high'], features['low']
+    tr = np.maximum(high - low, (high - close.shift(1)).abs())
+    assert np.array_equal(features['sma'].to_numpy(), close.rolling(20).mean().to_numpy(), equal_nan=True)
+    assert np.array_equal(features['atr'].to_numpy(), tr.rolling(14).mean().to_numpy(), equal_nan=True)
+
+
+@pytest.mark.parametrize('tf', list(RULES))
+def test_alignment_uses_only_closed_bars(ohlc, full, tf):
+    bars = pandas_bars(ohlc, tf)
+    ends = (bars.index + pd.Timedelta(RULES[tf])).values
+    closes_at = (ohlc.index + pd.Timedelta('15min')).values
+    pos = np.searchsorted(ends, closes_at, side='right') - 1
+    expected = np.where(pos >= 0, bars['close'].to_numpy()[np.maximum(pos, 0)], np.nan)
+    assert np.array_equal(full.aligned(tf, 'close'), expected, equal_nan=True)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_incremental_updates_match_full_build(ohlc, full, seed):
+    rng = np.random.default_rng(seed)
+    cuts = sorted(rng.choice(len(ohlc), 40, replace=False)) + [len(ohlc)]
+    cache = mtf.MultiTimeframeCache()
+    for k, cut in enumerate(cuts):
+        cache.update_frame(ohlc.iloc[:cut])
+        if k % 3 == 0:
+            cache.aligned('4h', 'sma', sma_period=20)  # 变体中途创建, 之后增量续算
+    assert_same_cache(cache, full, [(20, 14), (200, 14)])
+
+    with pytest.raises(ValueError):
+        cache.update(mtf.index_to_ms(ohlc.index[:1]), [1.0], [1.0], [1.0], [1.0], [1.0])
+
+
+def test_save_and_load_resume(ohlc, full, tmp_path):
+    out_dir = str(tmp_path / "mtf")
+    cache = mtf.MultiTimeframeCache()
+    cache.update_frame(ohlc.iloc[:3001])  # 停在未收盘的 1h / 4h / 1d 桶中间
+    cache.aligned('1d', 'atr', sma_period=5, atr_period=3)
+    cache.save(out_dir)
+
+    resumed = mtf.MultiTimeframeCache.load(out_dir)
+    resumed.update_frame(ohlc)
+    assert_same_cache(resumed, full, [(5, 3), (200, 14)])
+    assert mtf.MultiTimeframeCache.load(str(tmp_path / "missing")) is None
+
+
+def test_load_mtf_cache_appends_or_rebuilds(ohlc, full, tmp_path, monkeypatch, capsys):
+    path = str(tmp_path / "BTC_15m.csv")
+    cache_dir = str(tmp_path / "cache")
+    first = mtf.load_mtf_cache(path, ohlc.iloc[:2000], cache_dir=cache_dir)
+    assert first.n_base == 2000
+
+    appended = []
+    update = mtf.MultiTimeframeCache.update
+    monkeypatch.setattr(mtf.MultiTimeframeCache, 'update',
+                        lambda self, times, *cols: appended.append(len(times)) or update(self, times, *cols))
+    grown = mtf.load_mtf_cache(path, ohlc, cache_dir=cache_dir)
+    assert appended == [len(ohlc) - 2000]  # 前缀一致: 只追加新K线
+    assert_same_cache(grown, full, [(200, 14)])
+
+    # 数据被替换 (前缀不一致): 重建
+    shifted = ohlc.iloc[1:1500]
+    rebuilt = mtf.load_mtf_cache(path, shifted, cache_dir=cache_dir)
+    assert appended[-1] == len(shifted) and rebuilt.n_base == len(shifted)
+
+
+def test_timeframe_must_be_a_multiple_of_the_base():
+    assert mtf.timeframe_ms('4h') == 4 * 3600 * 1000
+    with pytest.raises(ValueError):
+        mtf.timeframe_ms('4x')
+    with pytest.raises(ValueError):
+        mtf.MultiTimeframeCache(timeframes=('20m',))
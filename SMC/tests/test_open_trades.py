@@ -0,0 +1,166 @@
+"""
+持仓按K线路径结算 (LocalRiskManager.resolve_open_trades): 只评估 last_bar_ms 之后的K线,
+保本状态跨重启保留, 同一根K线先判止损, 停机缺口由本地K线库回补后结算,
+分段 / 重启结算的结果与 execution_engine.resume_trade 整段模拟一致
+"""
+import random
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import live_fvg_monitor as live
+import live_replay
+from execution_engine import resume_trade
+from records import Direction, Result
+
+T0 = datetime(2025, 1, 6, tzinfo=timezone.utc)
+TF_MS = 15 * 60 * 1000
+SIGNAL_MS = int(T0.timestamp() * 1000)
+
+
+@pytest.fixture
+def clock():
+    now = {'t': T0 + timedelta(days=3)}
+    live.set_clock(lambda: now['t'])
+    yield now
+    live.set_clock(None)
+
+
+@pytest.fixture
+def manager_factory(tmp_path, clock):
+    """同一交易库上的 LocalRiskManager (再次调用即模拟重启)"""
+    managers = []
+
+    def make():
+        manager = live.LocalRiskManager(str(tmp_path / "trades.db"), str(tmp_path / "none.json"))
+        managers.append(manager)
+        return manager
+
+    yield make
+    for manager in managers:
+        manager.store.close()
+
+
+def open_long(manager, entry=100.0, sl=90.0, tp=120.0):
+    """LONG 持仓 (保本触发价 = entry + 1R = 110)"""
+    manager.add_signal({'type': 'LONG', 'time_utc': pd.Timestamp(T0), 'entry': entry, 'sl': sl, 'tp': tp},
+                       symbol='X')
+
+
+def bar(k, high, low):
+    """信号K线之后的第 k 根K线"""
+    return [SIGNAL_MS + k * TF_MS, 100.0, high, low, 100.0, 0.0]
+
+
+def only_trade(manager):
+    (trade,) = manager.load_history()
+    return trade
+
+
+def test_evaluated_candles_are_not_rescanned(manager_factory):
+    manager = manager_factory()
+    open_long(manager)
+    manager.resolve_open_trades('X', [bar(1, 105, 95), bar(2, 105, 95)])
+    (trade,) = manager.store.open_trades()
+    assert trade['last_bar_ms'] == bar(2, 0, 0)[0]
+
+    # 已评估过的K线即使再次传入 (且会触及止损) 也不再评估
+    assert manager.resolve_open_trades('X', [bar(1, 105, 80), bar(2, 105, 80), bar(3, 105, 95)]) == 0
+    assert manager.store.open_trades()[0]['last_bar_ms'] == bar(3, 0, 0)[0]
+    assert manager.resume_point('X') == bar(3, 0, 0)[0]
+
+    manager.resolve_open_trades('X', [bar(3, 105, 80), bar(4, 105, 80)])
+    assert only_trade(manager)['result'] == 'LOSS'
+    assert only_trade(manager)['close_time'] == datetime.fromtimestamp(bar(4, 0, 0)[0] / 1000, tz=timezone.utc).isoformat()
+    assert manager.resume_point('X') is None
+
+
+def test_break_even_state_survives_restart(manager_factory):
+    manager = manager_factory()
+    open_long(manager)
+    manager.resolve_open_trades('X', [bar(1, 111, 101)])  # 浮盈 1R: 保本激活
+    assert manager.store.open_trades()[0]['be_active'] == 1
+
+    restarted = manager_factory()
+    restarted.resolve_open_trades('X', [bar(1, 111, 101), bar(2, 105, 99)])  # 回到入场价下方, 未到原止损
+    trade = only_trade(restarted)
+    assert (trade['result'], trade['close_price']) == ('BE', 100.0)
+
+
+def test_break_even_applies_from_the_next_candle(manager_factory):
+    manager = manager_factory()
+    open_long(manager)
+    manager.resolve_open_trades('X', [bar(1, 111, 99)])  # 同一根K线触发保本又跌破入场价: 不算保本
+    assert manager.store.open_trades()[0]['be_active'] == 1
+    assert only_trade(manager)['status'] == 'OPEN'
+
+
+def test_stop_loss_is_checked_before_take_profit_on_the_same_candle(manager_factory):
+    manager = manager_factory()
+    open_long(manager)
+    assert manager.resolve_open_trades('X', [bar(1, 125, 85)]) == 1
+    trade = only_trade(manager)
+    assert (trade['result'], trade['close_price']) == ('LOSS', 90.0)
+    assert manager.calculate_stats()['consecutive_loss'] == 1
+
+
+@pytest.mark.parametrize('seed', range(40))
+def test_chunked_resolution_matches_resume_trade(manager_factory, seed):
+    rnd = random.Random(seed)
+    n = rnd.randint(1, 120)
+    mid = 100 + np.cumsum([rnd.gauss(0, 2) for _ in range(n)])
+    candles = [bar(k + 1, m + abs(rnd.gauss(0, 2)), m - abs(rnd.gauss(0, 2))) for k, m in enumerate(mid)]
+    direction = rnd.choice([Direction.LONG, Direction.SHORT])
+    entry, sl, tp = (100.0, 92.0, 116.0) if direction == Direction.LONG else (100.0, 108.0, 84.0)
+
+    highs = np.array([c[2] for c in candles])
+    lows = np.array([c[3] for c in candles])
+    be_trigger = entry + (entry - sl) * live.BE_TRIGGER_RR
+    expected, j, _ = resume_trade(highs, lows, 0, direction, entry, sl, tp, be_trigger)
+
+    manager = manager_factory()
+    manager.add_signal({'type': direction.label, 'time_utc': pd.Timestamp(T0), 'entry': entry, 'sl': sl,
+                        'tp': tp}, symbol='X')
+    end = 0
+    while end < n:
+        start = max(0, end - rnd.randint(0, 3))  # 与上次有重叠
+        end = min(n, end + rnd.randint(1, 15))
+        manager.resolve_open_trades('X', candles[start:end])
+        if rnd.random() < 0.3:
+            manager = manager_factory()  # 重启: 从交易库恢复 last_bar_ms / be_active
+
+    trade = only_trade(manager)
+    if expected == Result.RUNNING:
+        assert trade['status'] == 'OPEN'
+    else:
+        assert trade['result'] == expected.store_label
+        assert trade['close_time'] == datetime.fromtimestamp(candles[j][0] / 1000, tz=timezone.utc).isoformat()
+
+
+def test_downtime_gap_is_backfilled_and_resolved(live_sandbox):
+    n, hit = 900, 500
+    rows = [[SIGNAL_MS + (k - 299) * TF_MS, 100.0, 100.3, 99.7, 100.0, 1.0] for k in range(n)]
+    rows[hit][3] = 80.0  # 停机期间触及止损
+    exchange = live_replay.ReplayExchange({'X': rows})
+    live.set_exchange(exchange)
+    now = {'k': 300}
+    live.set_clock(lambda: datetime.fromtimestamp((rows[now['k']][0] + TF_MS // 2) / 1000, tz=timezone.utc))
+
+    monitor = live.get_monitor('X')
+    manager = live.get_risk_manager()
+    exchange.cursor['X'] = 300
+    assert live.sync_candle_store(monitor, manager)
+    manager.add_signal({'type': 'LONG', 'time_utc': pd.Timestamp(rows[299][0], unit='ms', tz='UTC'),
+                        'entry': 100.0, 'sl': 90.0, 'tp': 120.0}, symbol='X')
+    assert manager.resume_point('X') == rows[299][0]
+
+    # 停机超过K线窗口 (LIMIT 根): 回补须从持仓的信号K线之后开始, 否则止损K线已不在窗口内
+    now['k'] = exchange.cursor['X'] = 880
+    assert 880 - hit > live.LIMIT
+    assert live.sync_candle_store(monitor, manager)
+    trade = only_trade(manager)
+    assert trade['result'] == 'LOSS'
+    assert trade['close_time'] == datetime.fromtimestamp(rows[hit][0] / 1000, tz=timezone.utc).isoformat()
+    assert monitor.store.candles[0][0] > rows[hit][0]
@@ -0,0 +1,97 @@
+"""
+参数扫描: 子进程通过共享内存零拷贝读取特征数组, 每组参数的汇总与单独 run_backtest 一致,
+结束 (含出错) 后共享内存被释放
+"""
+import csv
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+import manual_fvg_v9_1_killzones as v91
+import param_sweep
+from conftest import BUNDLED
+
+GRID = {'atr_multiplier': [0.5, 1.0], 'target_rr': [1.5, 2.0], 'kz_ny_end': [14, 15]}
+
+
+@pytest.fixture(scope='module')
+def features():
+    return v91.load_features(BUNDLED['ETH'], use_cache=False)
+
+
+def test_worker_view_shares_the_parent_block(features):
+    shm, shape = param_sweep.share_features(features)
+    try:
+        param_sweep._init_worker(shm.name, shape, None)
+        arrays = param_sweep._worker_arrays
+        for column in param_sweep.SHARED_COLUMNS:
+            expected = features.index.hour if column == 'hour' else features[column].values
+            assert np.array_equal(arrays[column], expected, equal_nan=True), column
+            assert not arrays[column].flags.writeable
+
+        # 同一块内存: 主进程写入对子进程视图立即可见 (没有复制)
+        parent = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        parent[0, 0] = -1.0
+        assert arrays['high'][0] == -1.0
+    finally:
+        param_sweep._worker_shm.close()
+        param_sweep._worker_arrays = None
+        shm.close()
+        shm.unlink()
+
+
+@pytest.fixture
+def shared_names(monkeypatch):
+    """记录 run_sweep 创建的共享内存块名, 用于检查结束后已释放"""
+    names = []
+    share = param_sweep.share_features
+
+    def tracking_share(df):
+        shm, shape = share(df)
+        names.append(shm.name)
+        return shm, shape
+
+    monkeypatch.setattr(param_sweep, 'share_features', tracking_share)
+    return names
+
+
+def assert_released(names):
+    assert names
+    for name in names:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
+
+
+def test_sweep_matches_individual_backtests(features, shared_names, tmp_path, capsys):
+    out_file = str(tmp_path / "sweep.csv")
+    table = param_sweep.run_sweep(features, GRID, workers=2, out_file=out_file)
+
+    assert len(table) == len(param_sweep.expand_grid(GRID))
+    assert table['roi_pct'].is_monotonic_decreasing
+    for row in table.to_dict('records'):
+        params = {k: row[k] for k in GRID}
+        trades, capital = v91.run_backtest(features, params=params)
+        expected = param_sweep.summarize_report(trades, capital, v91.INITIAL_CAPITAL)
+        assert {k: row[k] for k in param_sweep.SUMMARY_COLUMNS} == expected
+
+    with open(out_file, newline='', encoding='utf-8') as f:
+        assert len(list(csv.DictReader(f))) == len(table)
+    assert_released(shared_names)
+
+
+def failing_run(arrays, params, backend=None):
+    raise RuntimeError("子进程回测失败")
+
+
+def test_shared_memory_is_released_when_a_worker_fails(features, shared_names, monkeypatch):
+    monkeypatch.setattr(param_sweep, 'run_on_arrays', failing_run)  # fork 出的子进程继承
+    with pytest.raises(RuntimeError):
+        param_sweep.run_sweep(features, {'target_rr': [1.5, 2.0]}, workers=1)
+    assert_released(shared_names)
+
+
+def test_invalid_parameter_is_rejected_before_sharing(features, monkeypatch):
+    monkeypatch.setattr(param_sweep, 'share_features', None)
+    with pytest.raises(ValueError):
+        param_sweep.run_sweep(features, {'no_such_param': [1]})
@@ -0,0 +1,77 @@
+"""
+组合回测: 交易流按时间合并 (同一时间戳先开仓后平仓), 单标的合并结果与 run_backtest 的资金曲线逐位一致,
+多进程 run_portfolio 与逐个 run_symbol 一致
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import manual_fvg_v9_1_killzones as v91
+import portfolio_backtest as pb
+from conftest import BUNDLED
+
+
+@pytest.fixture(autouse=True)
+def no_feature_cache(monkeypatch):
+    monkeypatch.setattr(v91, 'USE_FEATURE_CACHE', False)  # 不在仓库目录写特征缓存 (子进程 fork 继承)
+
+
+def trade(symbol, opened, closed, r):
+    return {'Symbol': symbol, 'Time': pd.Timestamp(opened, tz='UTC'), 'ExitTime': pd.Timestamp(closed, tz='UTC'),
+            'Type': 'LONG', 'Result': 'Win' if r > 0 else 'Loss' if r < 0 else 'BE', 'R': r}
+
+
+def test_open_at_same_timestamp_uses_capital_before_the_close():
+    streams = {
+        'AAA': [trade('AAA', '2024-01-01 00:00', '2024-01-01 01:00', 2.0)],
+        'BBB': [trade('BBB', '2024-01-01 01:00', '2024-01-01 02:00', -1.0)],
+    }
+    merged, capital = pb.merge_trade_streams(streams, 1000.0, 0.1)
+    assert list(merged['Symbol']) == ['AAA', 'BBB']
+    assert list(merged['RiskAmt']) == [100.0, 100.0]  # BBB 开仓时 AAA 的盈利尚未实现
+    assert list(merged['Balance']) == [1200.0, 1100.0]
+    assert capital == 1100.0
+
+
+def test_overlapping_trades_risk_only_realized_capital():
+    streams = {
+        'AAA': [trade('AAA', '2024-01-01 00:00', '2024-01-01 03:00', -1.0),
+                trade('AAA', '2024-01-01 03:00', '2024-01-01 04:00', 0.0)],
+        'BBB': [trade('BBB', '2024-01-01 01:00', '2024-01-01 02:00', 2.0),
+                trade('BBB', '2024-01-01 02:00', '2024-01-01 05:00', 1.0)],
+    }
+    merged, capital = pb.merge_trade_streams(streams, 1000.0, 0.1)
+    assert list(merged['Symbol']) == ['BBB', 'AAA', 'AAA', 'BBB']
+    assert list(merged['RiskAmt']) == [100.0, 100.0, 120.0, 100.0]
+    assert list(merged['PnL']) == [200.0, -100.0, 0.0, 100.0]
+    assert capital == merged['Balance'].iloc[-1] == 1200.0
+
+
+def test_simultaneous_closes_are_ordered_by_symbol():
+    streams = {symbol: [trade(symbol, '2024-01-01 00:00', '2024-01-01 01:00', 1.0)]
+               for symbol in ('SOL', 'BTC', 'ETH')}
+    merged, _ = pb.merge_trade_streams(streams, 1000.0, 0.01)
+    assert list(merged['Symbol']) == ['BTC', 'ETH', 'SOL']
+    assert pb.merge_trade_streams({}, 1000.0, 0.01)[1] == 1000.0
+
+
+def test_single_symbol_merge_matches_backtest(capsys):
+    symbol, trades = pb.run_symbol('ETH', BUNDLED['ETH'])
+    merged, capital = pb.merge_trade_streams({symbol: trades}, v91.INITIAL_CAPITAL, v91.RISK_PER_TRADE)
+    expected, expected_capital = v91.run_backtest(v91.load_features(BUNDLED['ETH']))
+    assert capital == expected_capital
+    assert list(merged['Time']) == list(expected['Time'])
+    assert list(merged['Result']) == list(expected['Result'])
+    assert np.array_equal(merged['Balance'].to_numpy(), expected['Balance'].to_numpy())
+
+
+def test_run_portfolio_matches_sequential_streams(capsys):
+    symbols = {s: BUNDLED[s] for s in ('BTC', 'SOL')}
+    merged, capital, streams = pb.run_portfolio(symbols, workers=2)
+    expected_streams = dict(pb.run_symbol(s, path) for s, path in symbols.items())
+    assert streams == expected_streams
+    expected, expected_capital = pb.merge_trade_streams(expected_streams, v91.INITIAL_CAPITAL,
+                                                        v91.RISK_PER_TRADE)
+    assert capital == expected_capital
+    pd.testing.assert_frame_equal(merged, expected)
+    assert merged['ExitTime'].is_monotonic_increasing
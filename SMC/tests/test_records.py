@@ -0,0 +1,119 @@
+"""
+紧凑记录: 枚举编码与内核常量一致, FVG / 交易在 dict / 结构化数组 / DataFrame / trade_history.json
+之间往返不丢信息, 回测交易写出的 JSON 可由 TradeStore 导入
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import manual_fvg_v9_1_killzones as v91
+import numba_kernel
+import signal_pipeline
+from conftest import BUNDLED
+from records import (FVG_DTYPE, Direction, FVGStatus, FVGZone, Result, TradeRecord, fvg_array,
+                     fvgs_to_array, fvgs_to_frame, trades_to_array, trades_to_frame, trades_to_history,
+                     write_trade_history, zones_from_array)
+from trade_store import TradeStore
+
+
+@pytest.fixture(scope='module')
+def run():
+    """ETH 回测的 (特征帧, FVG 列表, TradeRecord 列表)"""
+    df = v91.load_features(BUNDLED['ETH'], use_cache=False)
+    p = v91.resolve_params()
+    fvgs = v91.detect_displacement_fvgs(df)
+    trades, _, _ = v91.backtest_core(
+        df['high'].values, df['low'].values, df['close'].values, df['ema200'].values, df['atr'].values,
+        df['body_size'].values, v91.killzone_mask(df.index, p), params=p, verbose=False,
+        fvg_flags=v91.feature_flags(df, p))
+    assert {t.result for t in trades} == {Result.WIN, Result.LOSS, Result.BE}
+    return df, fvgs, trades
+
+
+def test_codes_match_kernel_constants():
+    assert (numba_kernel.DIR_LONG, numba_kernel.DIR_SHORT) == (Direction.LONG, Direction.SHORT)
+    assert (numba_kernel.RESULT_WIN, numba_kernel.RESULT_LOSS, numba_kernel.RESULT_BE) == \
+        (Result.WIN, Result.LOSS, Result.BE)
+    assert (signal_pipeline.FVG_BULL, signal_pipeline.FVG_BEAR) == (Direction.LONG, Direction.SHORT)
+    assert signal_pipeline.FVG_NONE not in set(Direction)
+    assert FVG_DTYPE.itemsize == 26
+
+
+@pytest.mark.parametrize('text, direction', [
+    ('LONG', Direction.LONG), ('SHORT', Direction.SHORT), ('Bullish', Direction.LONG),
+    ('Bearish', Direction.SHORT), ('🟢 <b>做多 (LONG)</b>', Direction.LONG),
+    ('🔴 <b>做空 (SHORT)</b>', Direction.SHORT),
+])
+def test_direction_parse(text, direction):
+    assert Direction.parse(text) is direction
+
+
+def test_records_have_no_instance_dict():
+    zone = FVGZone(3, Direction.LONG, 2.0, 1.0)
+    with pytest.raises(AttributeError):
+        zone.extra = 1
+    assert not hasattr(TradeRecord(0, 1, Direction.LONG, Result.WIN, 1.0, 0.5, 2.0, 1.0, 1.0), '__dict__')
+
+
+def test_fvg_dict_and_array_round_trip(run):
+    df, fvgs, _ = run
+    fvgs[0].mitigated = True
+    try:
+        assert [FVGZone.from_dict(f.to_dict()).to_dict() for f in fvgs] == [f.to_dict() for f in fvgs]
+
+        arr = fvgs_to_array(fvgs)
+        zones = zones_from_array(arr, df.index)
+        assert [z.to_dict() for z in zones] == [f.to_dict() for f in fvgs]
+        assert [z.time for z in zones_from_array(arr)] == [f.created_at for f in fvgs]
+
+        # 每次调用得到独立的 FVGZone: 修改 mitigated 不影响数组与其他调用
+        zones[1].mitigated = True
+        assert arr['status'][1] == FVGStatus.ACTIVE
+        assert not zones_from_array(arr, df.index)[1].mitigated
+
+        built = fvg_array(arr['created_at'], arr['direction'], arr['top'], arr['bottom'])
+        assert np.array_equal(built[['created_at', 'direction', 'top', 'bottom']],
+                              arr[['created_at', 'direction', 'top', 'bottom']])
+        assert not built['status'].any()
+    finally:
+        fvgs[0].mitigated = False
+
+    frame = fvgs_to_frame(fvgs)
+    assert frame.to_dict('records') == [f.to_dict() for f in fvgs]
+    assert list(fvgs_to_frame([]).columns) == ['time', 'type', 'top', 'bottom', 'mitigated', 'created_at']
+
+
+def test_trade_frame_matches_rows(run):
+    df, _, trades = run
+    frame = trades_to_frame(trades, df.index)
+    pd.testing.assert_frame_equal(frame, pd.DataFrame([t.to_row(df.index) for t in trades]))
+    assert trades_to_frame([]).empty
+
+    # 流式回测: 没有完整时间索引时使用 TradeRecord.time
+    timed = [TradeRecord(t.bar, t.exit_bar, t.direction, t.result, t.entry, t.sl, t.tp, t.pnl, t.balance,
+                         time=df.index[t.bar]) for t in trades]
+    pd.testing.assert_frame_equal(trades_to_frame(timed), frame)
+
+    arr = trades_to_array(trades)
+    assert arr['bar'].tolist() == [t.bar for t in trades]
+    assert arr['result'].tolist() == [int(t.result) for t in trades]
+    assert arr['balance'].tolist() == [t.balance for t in trades]
+
+
+def test_history_is_importable_by_trade_store(run, tmp_path):
+    df, _, trades = run
+    history = trades_to_history(trades, df.index, 'ETH/USDT')
+    for trade, row in zip(trades, history):
+        expected = {Result.WIN: trade.tp, Result.LOSS: trade.sl, Result.BE: trade.entry}[trade.result]
+        assert row['close_price'] == expected
+        assert row['result'] == trade.result.store_label
+        assert pd.Timestamp(row['close_time']) == df.index[trade.exit_bar]
+
+    path = str(tmp_path / "trade_history.json")
+    write_trade_history(path, trades, df.index, 'ETH/USDT')
+    store = TradeStore(str(tmp_path / "trades.db"))
+    try:
+        assert store.migrate_json(path) == len(trades)
+        assert store.all_trades() == history
+    finally:
+        store.close()
@@ -0,0 +1,57 @@
+"""
+风控常驻计数器: 随机开仓 / 平仓 / 跨日序列下, LocalRiskManager 的增量统计与
+原始全量遍历统计一致, 重启后从交易库重建的计数器也一致
+"""
+import random
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+import pytest
+
+import live_fvg_monitor as live
+import reference_v91 as ref
+
+
+@pytest.fixture
+def clock():
+    now = {'t': datetime(2025, 1, 1, tzinfo=timezone.utc)}
+    live.set_clock(lambda: now['t'])
+    yield now
+    live.set_clock(None)
+
+
+def candle(ms, kind):
+    """LONG entry=100 / sl=90 / tp=120 的持仓在这根K线上: 止损 / 止盈 / 触发保本 / 不触及"""
+    return {
+        'loss': [ms, 100, 101, 80, 95, 0],
+        'win': [ms, 100, 130, 99.5, 125, 0],
+        'be': [ms, 100, 111, 100.5, 105, 0],
+        'none': [ms, 100, 105, 95, 100, 0],
+    }[kind]
+
+
+@pytest.mark.parametrize('seed', range(12))
+def test_counters_match_full_recount(tmp_path, clock, seed):
+    rnd = random.Random(seed)
+    db, legacy = str(tmp_path / "trades.db"), str(tmp_path / "none.json")
+    manager = live.LocalRiskManager(db, legacy)
+    try:
+        for _ in range(100):
+            clock['t'] += timedelta(minutes=15 * rnd.choice([1, 1, 1, 4, 40]))
+            if rnd.random() < 0.5:
+                manager.add_signal({'type': 'LONG', 'time_utc': pd.Timestamp(clock['t']),
+                                    'entry': 100.0, 'sl': 90.0, 'tp': 120.0}, symbol='X')
+            clock['t'] += timedelta(minutes=15)
+            ms = int(clock['t'].timestamp() * 1000)
+            manager.resolve_open_trades('X', [candle(ms, rnd.choice(['loss', 'win', 'be', 'none', 'none']))])
+
+            expected = ref.calculate_stats(manager.load_history(), clock['t'])
+            assert manager.calculate_stats() == expected
+
+            rebuilt = live.LocalRiskManager(db, legacy)
+            try:
+                assert rebuilt.calculate_stats() == expected
+            finally:
+                rebuilt.store.close()
+    finally:
+        manager.store.close()
@@ -0,0 +1,43 @@
+"""
+信号流水线: 唯一的滚动均值实现 (rolling_mean_push) 与已安装 pandas 的 Series.rolling(...).mean()
+逐位一致 (批量内核 / 分块续算), 编译内核与 NumPy 回退一致
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import rolling_inputs, synthetic_ohlc
+from signal_pipeline import (MEAN_STATE_SIZE, SIGNAL_COLUMNS, _signal_numpy, allocate_buffers,
+                             compute_signals, rolling_mean_fill)
+
+
+@pytest.mark.parametrize('period', [1, 2, 14, 200])
+@pytest.mark.parametrize('seed', range(3))
+def test_rolling_mean_matches_installed_pandas(seed, period):
+    values = rolling_inputs(seed)
+    expected = pd.Series(values).rolling(period).mean().to_numpy()
+
+    state, ring, count = np.zeros(MEAN_STATE_SIZE), np.empty(period), 0
+    parts = []
+    for part in np.array_split(values, [1, 7, 251, 1999]):
+        parts.append(np.empty(len(part)))
+        rolling_mean_fill(state, ring, count, part, parts[-1])
+        count += len(part)
+    assert np.array_equal(np.concatenate(parts), expected, equal_nan=True), pd.__version__
+
+    ones = np.ones(len(values))
+    out = compute_signals(values, ones, ones, values, np.zeros(len(values)), period, period, 1.0)
+    assert np.array_equal(out['trend'], expected, equal_nan=True), pd.__version__
+
+
+@pytest.mark.parametrize('atr_multiplier', [1.0, 0.2])
+@pytest.mark.parametrize('seed', range(3))
+def test_kernel_matches_numpy_fallback(seed, atr_multiplier):
+    raw = synthetic_ohlc(3000, seed, nan_frac=0.01)
+    args = (raw['open'].values, raw['high'].values, raw['low'].values, raw['close'].values,
+            np.asarray(raw.index.hour, dtype=np.int64), 200, 14, atr_multiplier, 7, 10, 12, 15)
+    kernel = compute_signals(*args[:8])
+    fallback = allocate_buffers(len(raw))
+    _signal_numpy(*args, *(fallback[c] for c in ('tr', 'atr', 'trend', 'body_size', 'in_kz', 'fvg')))
+    for column in SIGNAL_COLUMNS:
+        assert np.array_equal(kernel[column], fallback[column], equal_nan=True), column
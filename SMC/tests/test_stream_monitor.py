@@ -0,0 +1,158 @@
+"""
+WebSocket 流式模式: 用按下标推进的回放 K线流驱动 run_stream_monitor,
+判定出的信号与逐根 REST 轮询 (live_replay) 一致; 断线回退 REST 后重连、漏推缺口回补后继续判定
+"""
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+import live_replay
+from conftest import BUNDLED
+from kline_feed import KlineFeed, ReplayFeed
+
+SYMBOL = "ETH/USDT"
+BARS = 1000
+START = 400  # 订阅前 REST 预热到的K线下标
+
+
+class AsyncReplayExchange:
+    """ReplayExchange 的异步外壳 (run_stream_monitor 的 REST 回补 / 回退使用)"""
+
+    def __init__(self, replay_ex):
+        self.replay_ex = replay_ex
+
+    async def fetch_ohlcv(self, symbol, timeframe, since=None, limit=None):
+        return self.replay_ex.fetch_ohlcv(symbol, timeframe, since=since, limit=limit)
+
+    async def close(self):
+        pass
+
+
+class SteppedFeed(KlineFeed):
+    """推送 rows[k] 收盘 / rows[k+1] 跳动; 推送前把回放交易所与时钟推进到该时刻, 结束后可模拟断线"""
+
+    def __init__(self, clock, indices, fail=False):
+        self.clock = clock
+        self.indices = indices
+        self.fail = fail
+
+    async def closed_klines(self, symbols, timeframe):
+        rows = self.clock.rows
+        for k in self.indices:
+            self.clock.move_to(k + 1)
+            yield SYMBOL, list(rows[k]), list(rows[k + 1])
+        if self.fail:
+            raise ConnectionError("模拟断线")
+
+
+class ReplayClock:
+    """回放时刻: 当前跳动中K线的下标 (交易所只返回不晚于它的K线, 时钟位于该K线中段)"""
+
+    def __init__(self, live, rows):
+        self.rows = rows
+        self.replay_ex = live_replay.ReplayExchange({SYMBOL: rows})
+        self.tf_ms = self.replay_ex.parse_timeframe(live.TIMEFRAME) * 1000
+        self.k = 0
+        live.set_exchange(self.replay_ex)
+        live.set_notifier(lambda message: None)
+        live.set_clock(lambda: datetime.fromtimestamp(
+            (self.rows[self.k][0] + self.tf_ms // 2) / 1000, tz=timezone.utc))
+
+    def move_to(self, k):
+        self.k = k
+        self.replay_ex.cursor[SYMBOL] = k
+
+
+@pytest.fixture
+def rows():
+    return live_replay.load_candles(BUNDLED['ETH'], BARS)
+
+
+@pytest.fixture
+def polled_signals(live_sandbox, tmp_path):
+    """逐根 REST 轮询 (schedule 模式 job) 判定出的信号 {(ts, 方向): entry}"""
+    workdir = tmp_path / "polled"
+    workdir.mkdir()
+    report = live_replay.replay({SYMBOL: BUNDLED['ETH']}, bars=BARS, workdir=str(workdir))
+    live_sandbox.MONITORS.clear()
+    return {k: v[0] for k, v in report['signals'][SYMBOL].items()}
+
+
+def run_stream(live, monkeypatch, rows, feeds):
+    """依次使用 feeds 中的K线流运行流式主循环, 返回 {(ts, 方向): entry}"""
+    clock = ReplayClock(live, rows)
+    clock.move_to(START)
+    signals = {}
+
+    def on_signal(symbol, signal):
+        ts = int(signal['time_utc'].timestamp() * 1000)
+        signals[(ts, 'LONG' if 'LONG' in signal['type'] else 'SHORT')] = signal['entry']
+
+    def next_close(tf_ms, delay=0):
+        clock.move_to(clock.k + 1)  # 回退 REST 轮询: 等到下一根K线收盘
+        return 0
+
+    live.SIGNAL_LISTENERS.append(on_signal)
+    pending = [feed(clock) for feed in feeds]
+    monkeypatch.setattr(live, 'seconds_until_next_close', next_close)
+    asyncio.run(live.run_stream_monitor([SYMBOL], feed_factory=lambda: pending.pop(0),
+                                        aexchange=AsyncReplayExchange(clock.replay_ex)))
+    return signals
+
+
+def since(signals, ts):
+    return {k: v for k, v in signals.items() if k[0] >= ts}
+
+
+def test_kline_feed_is_abstract():
+    with pytest.raises(TypeError):
+        KlineFeed()
+
+    class Incomplete(KlineFeed):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_replay_feed_interleaves_symbols_by_time():
+    candles = {'A': [[0, 1, 1, 1, 1, 0], [2, 1, 1, 1, 1, 0], [4, 1, 1, 1, 1, 0]],
+               'B': [[1, 2, 2, 2, 2, 0], [3, 2, 2, 2, 2, 0]]}
+
+    async def collect():
+        return [(s, closed[0], forming[0])
+                async for s, closed, forming in ReplayFeed(candles).closed_klines(['A', 'B'], '15m')]
+
+    assert asyncio.run(collect()) == [('A', 0, 2), ('B', 1, 3), ('A', 2, 4)]
+
+
+def test_stream_matches_polling(live_sandbox, rows, polled_signals, monkeypatch):
+    signals = run_stream(live_sandbox, monkeypatch, rows, [lambda clock: SteppedFeed(clock, range(START, BARS - 1))])
+    expected = since(polled_signals, rows[START - 1][0])
+    assert len(expected) > 3
+    assert signals == expected
+
+
+def test_stream_falls_back_to_rest_and_reconnects(live_sandbox, rows, polled_signals, monkeypatch):
+    drop = 650
+    signals = run_stream(live_sandbox, monkeypatch, rows, [
+        lambda clock: SteppedFeed(clock, range(START, drop), fail=True),
+        # 断线后 REST 轮询判定了第 drop 根, 重连后从下一根收盘开始推送
+        lambda clock: SteppedFeed(clock, range(drop + 1, BARS - 1)),
+    ])
+    assert signals == since(polled_signals, rows[START - 1][0])
+
+
+def test_stream_gap_is_backfilled_from_rest(live_sandbox, rows, polled_signals, monkeypatch):
+    gap = range(600, 610)  # 漏推的收盘K线
+    indices = [k for k in range(START, BARS - 1) if k not in gap]
+    signals = run_stream(live_sandbox, monkeypatch, rows, [lambda clock: SteppedFeed(clock, indices)])
+
+    store = live_sandbox.get_monitor(SYMBOL).store
+    times = [c[0] for c in store.candles]
+    assert times == [rows[k][0] for k in range(BARS - 1 - len(times), BARS - 1)]
+    # 缺口内的K线只被回补、不逐根判定; 其余K线的信号与轮询一致
+    skipped = {rows[k][0] for k in gap}
+    assert signals == {k: v for k, v in since(polled_signals, rows[START - 1][0]).items()
+                       if k[0] not in skipped}
@@ -0,0 +1,36 @@
+"""
+流式回测: 任意块大小的分块回测与整表 run_backtest 结果一致
+"""
+import pytest
+
+import manual_fvg_v9_1_killzones as v91
+from conftest import synthetic_ohlc
+from streaming_backtest import run_backtest_streaming
+
+CHUNK_SIZES = [1, 7, 251, 1000, 100_000]
+
+
+def full_run(path, params=None):
+    return v91.run_backtest(v91.load_features(path, use_cache=False), params=params)
+
+
+@pytest.mark.parametrize('chunk_bars', CHUNK_SIZES)
+def test_bundled_streaming_matches_full_run(bundled_path, chunk_bars, capsys):
+    ref_trades, ref_capital = full_run(bundled_path)
+    trades, capital = run_backtest_streaming(bundled_path, chunk_bars)
+    assert capital == ref_capital
+    assert trades.equals(ref_trades)
+
+
+@pytest.mark.parametrize('chunk_bars', [3, 97, 500])
+@pytest.mark.parametrize('atr_multiplier', [1.0, 0.1])
+@pytest.mark.parametrize('seed', range(3))
+def test_synthetic_streaming_matches_full_run(tmp_path, seed, atr_multiplier, chunk_bars, capsys):
+    path = str(tmp_path / f"synthetic_{seed}.csv")
+    synthetic_ohlc(2500, seed, nan_frac=0.005).to_csv(path)
+    params = {'atr_multiplier': atr_multiplier}
+
+    ref_trades, ref_capital = full_run(path, params)
+    trades, capital = run_backtest_streaming(path, chunk_bars, params=params)
+    assert capital == ref_capital
+    assert trades.equals(ref_trades)
@@ -0,0 +1,141 @@
+"""
+Telegram 推送器: 429 按 retry_after 等待, 4xx 时合并消息逐条 / 纯文本降级重发,
+outbox 日志只追加且重启后按顺序补发, 队列已满的消息在腾出空间后补入队列
+"""
+import json
+import threading
+
+from telegram_notifier import MESSAGE_SEPARATOR, TelegramNotifier
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self.payload = payload or {}
+        self.text = json.dumps(self.payload)
+
+    def json(self):
+        return self.payload
+
+
+class FakeSession:
+    """记录每次请求; reply(payload) -> FakeResponse 决定返回 (默认 200)"""
+
+    def __init__(self, reply=None):
+        self.reply = reply or (lambda payload: FakeResponse(200))
+        self.posts = []
+
+    def post(self, url, json=None, timeout=None):
+        self.posts.append(dict(json))
+        return self.reply(json)
+
+
+def make_notifier(tmp_path, session, **kwargs):
+    kwargs.setdefault('coalesce_window', 0.0)
+    notifier = TelegramNotifier("token", "chat", outbox_file=str(tmp_path / "outbox.jsonl"), **kwargs)
+    notifier.session = session
+    return notifier
+
+
+def record_waits(notifier):
+    """记录重试等待的秒数, 实际只等 10ms"""
+    waits = []
+    wait = notifier.stop_event.wait
+
+    def fake_wait(seconds=None):
+        waits.append(seconds)
+        return wait(0.01)
+
+    notifier.stop_event.wait = fake_wait
+    return waits
+
+
+def outbox_records(tmp_path):
+    path = tmp_path / "outbox.jsonl"
+    if not path.exists():
+        return []
+    return [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+
+
+def test_rate_limit_waits_retry_after(tmp_path):
+    replies = iter([FakeResponse(429, {'parameters': {'retry_after': 7}}), FakeResponse(200)])
+    session = FakeSession(lambda payload: next(replies))
+    notifier = make_notifier(tmp_path, session)
+    waits = record_waits(notifier)
+
+    notifier.send("signal")
+    assert notifier.flush(timeout=5)
+    notifier.stop()
+    assert waits == [7]
+    assert [p['text'] for p in session.posts] == ["signal", "signal"]
+    assert outbox_records(tmp_path) == []
+
+
+def test_rejected_batch_is_split_then_sent_as_plain_text(tmp_path):
+    good, bad = "<b>ok</b>", "<b>broken & tag</b>"
+
+    def reply(payload):
+        if MESSAGE_SEPARATOR in payload['text']:
+            return FakeResponse(400, {'description': "message is too long"})
+        if payload['text'] == bad and payload.get('parse_mode') == "HTML":
+            return FakeResponse(400, {'description': "can't parse entities"})
+        return FakeResponse(200)
+
+    session = FakeSession(reply)
+    notifier = make_notifier(tmp_path, session, coalesce_window=0.5)
+    notifier.send(good)
+    notifier.send(bad)
+    assert notifier.flush(timeout=5)
+    notifier.stop()
+
+    assert [(p['text'], p.get('parse_mode')) for p in session.posts] == [
+        (good + MESSAGE_SEPARATOR + bad, "HTML"),
+        (good, "HTML"),
+        (bad, "HTML"),
+        (bad, None),
+    ]
+
+
+def test_undelivered_messages_are_replayed_in_order(tmp_path):
+    down = FakeSession(lambda payload: FakeResponse(502))
+    first = make_notifier(tmp_path, down)
+    record_waits(first)
+    for k in range(3):
+        first.send(f"msg {k}")
+    assert not first.flush(timeout=0.3)
+    first.stop(timeout=0)
+
+    # send 只追加 add 行; 进程崩溃留下的半行在重放时跳过
+    assert [(r['op'], r['text']) for r in outbox_records(tmp_path)] == [('add', f"msg {k}") for k in range(3)]
+    with open(tmp_path / "outbox.jsonl", 'a', encoding='utf-8') as f:
+        f.write('{"op": "add", "id": "x", "te')
+
+    up = FakeSession()
+    second = make_notifier(tmp_path, up, coalesce_window=0.3)
+    second.start()
+    assert second.flush(timeout=5)
+    second.stop()
+    assert [p['text'] for p in up.posts] == [MESSAGE_SEPARATOR.join(f"msg {k}" for k in range(3))]
+    assert not (tmp_path / "outbox.jsonl").exists()
+
+
+def test_full_queue_backlog_is_delivered_without_restart(tmp_path):
+    release = threading.Event()
+
+    def reply(payload):
+        release.wait(5)
+        return FakeResponse(200)
+
+    session = FakeSession(reply)
+    notifier = make_notifier(tmp_path, session, max_queue=1)
+    texts = [f"msg {k}" for k in range(6)]
+    for text in texts:
+        notifier.send(text)
+    assert notifier.backlog
+
+    release.set()
+    assert notifier.flush(timeout=5)
+    notifier.stop()
+    assert [p['text'] for p in session.posts] == texts
+    assert not notifier.backlog
+    assert outbox_records(tmp_path) == []
@@ -0,0 +1,90 @@
+"""
+交易库迁移: 旧 trade_history.json 损坏 / 含无效记录时不阻止启动, 有效记录迁移后统计不变
+"""
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+import live_fvg_monitor as live
+import reference_v91 as ref
+from trade_store import TradeStore
+
+
+def closed(time, kind, result):
+    entry, sl, tp = (100, 90, 120) if kind == 'LONG' else (100, 110, 80)
+    return {'symbol': 'X', 'time': time, 'type': kind, 'entry': entry, 'sl': sl, 'tp': tp,
+            'status': 'CLOSED', 'result': result}
+
+
+@pytest.fixture
+def clock():
+    now = {'t': datetime(2025, 3, 2, 12, tzinfo=timezone.utc)}
+    live.set_clock(lambda: now['t'])
+    yield now
+    live.set_clock(None)
+
+
+def test_corrupt_legacy_json_is_kept(tmp_path, clock):
+    legacy = tmp_path / "trade_history.json"
+    legacy.write_text('[{"symbol": "X", "time": ', encoding='utf-8')
+
+    manager = live.LocalRiskManager(str(tmp_path / "trades.db"), str(legacy))
+    try:
+        assert manager.load_history() == []
+        assert manager.calculate_stats() == {'daily_loss': 0, 'consecutive_loss': 0}
+        assert legacy.exists()
+    finally:
+        manager.store.close()
+
+
+def test_legacy_json_migrates_with_same_counters(tmp_path, clock):
+    history = [
+        closed('2025-03-01T08:00:00+00:00', 'LONG', 'WIN'),
+        closed('2025-03-02T08:00:00+00:00', 'LONG', 'LOSS'),
+        closed('2025-03-02T09:00:00+00:00', 'SHORT', 'BE'),
+        closed('2025-03-02T10:00:00+00:00', 'SHORT', 'LOSS'),
+    ]
+    legacy = tmp_path / "trade_history.json"
+    legacy.write_text(json.dumps(history), encoding='utf-8')
+
+    manager = live.LocalRiskManager(str(tmp_path / "trades.db"), str(legacy))
+    try:
+        assert manager.calculate_stats() == ref.calculate_stats(history, clock['t'])
+        assert not legacy.exists()
+    finally:
+        manager.store.close()
+
+
+def test_invalid_legacy_rows_are_skipped(tmp_path, caplog):
+    valid = [closed('2025-03-01T08:00:00+00:00', 'LONG', 'WIN'),
+             closed('2025-03-02T10:00:00+00:00', 'SHORT', 'LOSS')]
+    no_time = closed('2025-03-01T09:00:00+00:00', 'LONG', 'LOSS')
+    del no_time['time']
+    null_entry = {**closed('2025-03-01T10:00:00+00:00', 'LONG', 'LOSS'), 'entry': None}
+    bad_sl = {**closed('2025-03-01T11:00:00+00:00', 'LONG', 'LOSS'), 'sl': 'n/a'}
+    legacy = tmp_path / "trade_history.json"
+    legacy.write_text(json.dumps([valid[0], no_time, null_entry, ['LONG'], bad_sl, valid[1]]),
+                      encoding='utf-8')
+
+    store = TradeStore(str(tmp_path / "trades.db"), str(legacy))
+    try:
+        assert store.all_trades() == valid
+        assert not legacy.exists()
+        assert (tmp_path / "trade_history.json.migrated").exists()
+        skipped = [r.getMessage() for r in caplog.records if r.levelname == 'WARNING']
+        assert [m.split('条')[0] for m in skipped] == [f"⚠️ 跳过第 {k} " for k in (2, 3, 4, 5)]
+    finally:
+        store.close()
+
+
+def test_non_list_legacy_json_is_kept(tmp_path):
+    legacy = tmp_path / "trade_history.json"
+    legacy.write_text('{"time": "2025-03-01T08:00:00+00:00"}', encoding='utf-8')
+
+    store = TradeStore(str(tmp_path / "trades.db"), str(legacy))
+    try:
+        assert store.all_trades() == []
+        assert legacy.exists()
+    finally:
+        store.close()
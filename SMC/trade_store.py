@@ -0,0 +1,222 @@
+"""
+SQLite Trade Store (SMC V9.1 Live)
+替代 trade_history.json 的本地交易记录库:
+1. 每次扫描只查询需要的行 (OPEN 持仓 / 今日亏损 / 最近战绩), 不再整文件读写
+2. status / 时间 索引, 历史增长不拖慢扫描
+3. 每次写入为一个事务 (WAL 模式), 崩溃不会写坏记录
+4. 首次打开时自动从旧 trade_history.json 迁移 (迁移后改名为 .migrated)
+5. 每笔持仓记录最后评估到的K线 (last_bar_ms) 与保本状态, 按K线路径续算不重复扫描
+"""
+import json
+import logging
+import os
+import sqlite3
+from datetime import datetime
+
+SCHEMA_VERSION = 2
+
+# 与旧 JSON 记录一致的字段
+TRADE_FIELDS = ['symbol', 'time', 'type', 'entry', 'sl', 'tp', 'status', 'result',
+                'close_price', 'close_time']
+# trades 表中 NOT NULL 的字段 (旧记录缺少其一时无法导入)
+REQUIRED_FIELDS = ['time', 'type', 'entry', 'sl', 'tp', 'status', 'result']
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS trades (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    symbol      TEXT,
+    time        TEXT NOT NULL,
+    time_ms     INTEGER,
+    type        TEXT NOT NULL,
+    entry       REAL NOT NULL,
+    sl          REAL NOT NULL,
+    tp          REAL NOT NULL,
+    status      TEXT NOT NULL,
+    result      TEXT NOT NULL,
+    close_price REAL,
+    close_time  TEXT,
+    last_bar_ms INTEGER,
+    be_active   INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_trades_status ON trades (status, symbol);
+CREATE INDEX IF NOT EXISTS idx_trades_time ON trades (time_ms);
+CREATE INDEX IF NOT EXISTS idx_trades_result_time ON trades (result, time_ms);
+"""
+
+
+def _invalid_reason(trade):
+    """旧 JSON 记录无法导入的原因 (可导入时为 None)"""
+    if not isinstance(trade, dict):
+        return f"不是对象: {type(trade).__name__}"
+    missing = [k for k in REQUIRED_FIELDS if trade.get(k) is None]
+    if missing:
+        return f"缺少字段 {', '.join(missing)}"
+    for k in ('entry', 'sl', 'tp'):
+        try:
+            float(trade[k])
+        except (TypeError, ValueError):
+            return f"{k} 不是数值: {trade[k]!r}"
+    return None
+
+
+def _time_ms(value):
+    """ISO 时间字符串 -> 毫秒时间戳 (无法解析时为 None)"""
+    try:
+        return int(datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp() * 1000)
+    except (TypeError, ValueError):
+        return None
+
+
+class TradeStore:
+    """本地交易记录库 (单文件 SQLite)"""
+
+    def __init__(self, path, legacy_json=None):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.executescript(_SCHEMA)
+            self._upgrade()
+            self.conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        if legacy_json:
+            self.migrate_json(legacy_json)
+
+    def close(self):
+        self.conn.close()
+
+    def _upgrade(self):
+        """旧版本库补齐新增列"""
+        columns = {r['name'] for r in self.conn.execute("PRAGMA table_info(trades)")}
+        if 'last_bar_ms' not in columns:
+            self.conn.execute("ALTER TABLE trades ADD COLUMN last_bar_ms INTEGER")
+        if 'be_active' not in columns:
+            self.conn.execute("ALTER TABLE trades ADD COLUMN be_active INTEGER NOT NULL DEFAULT 0")
+
+    # ========== 迁移 ==========
+
+    def migrate_json(self, json_path):
+        """
+        把旧 trade_history.json 导入空库 (单事务), 成功后改名为 .migrated; 返回导入条数
+        缺少必填字段 / 价格非数值的记录记录日志后跳过, 不阻止其余记录导入
+        """
+        if not os.path.exists(json_path):
+            return 0
+        if self.conn.execute("SELECT 1 FROM trades LIMIT 1").fetchone():
+            logging.warning(f"⚠️ 交易库非空, 跳过 JSON 迁移: {json_path}")
+            return 0
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                history = json.load(f)
+        except (ValueError, OSError) as e:
+            # 损坏 / 写了一半的旧文件: 保留原文件, 以空库继续运行
+            logging.error(f"❌ 读取 {json_path} 失败, 跳过迁移: {e}")
+            return 0
+        if not isinstance(history, list):
+            logging.error(f"❌ {json_path} 不是交易记录列表, 跳过迁移")
+            return 0
+
+        imported = 0
+        with self.conn:
+            for k, trade in enumerate(history):
+                reason = _invalid_reason(trade)
+                if reason is not None:
+                    logging.warning(f"⚠️ 跳过第 {k + 1} 条旧交易记录 ({reason})")
+                    continue
+                self._insert(trade)
+                imported += 1
+        os.replace(json_path, json_path + ".migrated")
+        skipped = len(history) - imported
+        logging.info(f"📦 已从 {json_path} 迁移 {imported} 条交易记录"
+                     + (f" (跳过 {skipped} 条无效记录)" if skipped else ""))
+        return imported
+
+    # ========== 写入 ==========
+
+    def _insert(self, trade):
+        row = [trade.get(k) for k in TRADE_FIELDS]
+        cur = self.conn.execute(
+            f"INSERT INTO trades ({', '.join(TRADE_FIELDS)}, time_ms) "
+            f"VALUES ({', '.join('?' * len(TRADE_FIELDS))}, ?)",
+            row + [_time_ms(trade.get('time'))]
+        )
+        return cur.lastrowid
+
+    def add_trade(self, trade):
+        """新增一条记录, 返回 id"""
+        with self.conn:
+            return self._insert(trade)
+
+    def close_trades(self, updates):
+        """批量平仓 [(id, result, close_price, close_time, last_bar_ms), ...], 单事务"""
+        if not updates:
+            return
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE trades SET status='CLOSED', result=?, close_price=?, close_time=?, last_bar_ms=? "
+                "WHERE id=? AND status='OPEN'",
+                [(result, price, t, bar_ms, trade_id) for trade_id, result, price, t, bar_ms in updates]
+            )
+
+    def update_progress(self, updates):
+        """记录持仓的评估进度 [(id, last_bar_ms, be_active), ...], 单事务"""
+        if not updates:
+            return
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE trades SET last_bar_ms=?, be_active=? WHERE id=? AND status='OPEN'",
+                [(bar_ms, int(be), trade_id) for trade_id, bar_ms, be in updates]
+            )
+
+    def replace_all(self, history):
+        """整表替换 (兼容旧 save_history 接口), 单事务"""
+        with self.conn:
+            self.conn.execute("DELETE FROM trades")
+            for trade in history:
+                self._insert(trade)
+
+    # ========== 查询 ==========
+
+    def open_trades(self, symbol=None, default_symbol=None):
+        """OPEN 状态的交易 (指定 symbol 时只返回该标的; 旧记录无 symbol 时视为 default_symbol)"""
+        rows = self.conn.execute(
+            "SELECT * FROM trades WHERE status='OPEN' ORDER BY id"
+        ).fetchall()
+        trades = [dict(r) for r in rows]
+        if symbol is not None:
+            trades = [t for t in trades if (t['symbol'] or default_symbol) == symbol]
+        return trades
+
+    def loss_times_since(self, start_ms):
+        """信号时间不早于 start_ms 的亏损交易的信号时间 (毫秒)"""
+        rows = self.conn.execute(
+            "SELECT time_ms FROM trades WHERE result='LOSS' AND time_ms >= ?", (start_ms,)
+        ).fetchall()
+        return [r[0] for r in rows]
+
+    def iter_recent(self, batch=64):
+        """从最新向旧逐条产出 (id, result) (分批读取, 调用方可提前停止)"""
+        last_id = None
+        while True:
+            if last_id is None:
+                rows = self.conn.execute(
+                    "SELECT id, result FROM trades ORDER BY id DESC LIMIT ?", (batch,)
+                ).fetchall()
+            else:
+                rows = self.conn.execute(
+                    "SELECT id, result FROM trades WHERE id < ? ORDER BY id DESC LIMIT ?",
+                    (last_id, batch)
+                ).fetchall()
+            if not rows:
+                return
+            for r in rows:
+                yield r['id'], r['result']
+            last_id = rows[-1]['id']
+
+    def all_trades(self):
+        """全部记录 (旧 JSON 格式的 dict 列表, 按写入顺序)"""
+        rows = self.conn.execute(
+            f"SELECT {', '.join(TRADE_FIELDS)} FROM trades ORDER BY id"
+        ).fetchall()
+        return [{k: r[k] for k in TRADE_FIELDS if r[k] is not None} for r in rows]